@@ -1,12 +1,31 @@
 import streamlit as st
+import asyncio
+import hashlib
+import json
 import os
+import threading
+import time
+import uuid
 from dotenv import load_dotenv
-from utils import extract_text_from_pdf, extract_text_from_url, analyze_cv
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+import hedging
+import metrics
 import utils
+from batch import API_KEY_ENV
+from cache import make_key
+from ratelimit import request_context
+from result import AnalysisResult, is_error
 
 # Load environment variables
 load_dotenv()
 
+# Prometheus / OpenMetrics scrape endpoint (only if CV_MATCHER_METRICS_PORT is set)
+metrics.start_server()
+
+# Provider SDKs load on first use; CV_MATCHER_PREWARM=gemini,claude (or all)
+# loads them in the background instead so the first analysis does not wait
+utils.prewarm()
+
 # Page Config
 st.set_page_config(
     page_title="CV Matcher",
@@ -15,6 +34,10 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
+# Identifies this browser session to the shared rate limiter
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
 # Custom CSS for "Pierre-Louis" Playful Dashboard Look
 st.markdown("""
     <style>
@@ -332,196 +355,316 @@ with col2:
             job_text_input = st.text_area("Paste Job Description", height=150, placeholder="Paste description...", label_visibility="collapsed")
             job_url = None
 
-# Analysis Button (Full Width)
-st.markdown("<br>", unsafe_allow_html=True) # Add some spacing
-# Button is placed directly to span the full width of the container
-if st.button("CHECK MY CV", use_container_width=True, type="primary"):
-    if not uploaded_cv:
-        st.error("Please upload your CV.")
-    elif (job_input_type == "URL" and not job_url) or (job_input_type == "Text" and not job_text_input):
-        st.error("Please provide the job details.")
+# Result Rendering
+# Each section is drawn from a (possibly partial) AnalysisResult, so it can be
+# redrawn as soon as the fields it depends on arrive from the stream.
+def render_score_card(result):
+    score = result.match_score or 0
+    score_color = "#28a745" if score >= 80 else "#ffc107" if score >= 50 else "#dc3545"
+    
+    # Likelihood Badge
+    likelihood = result.response_likelihood or 'Unknown'
+    like_color = "#28a745" if likelihood == "High" else "#ffc107" if likelihood == "Moderate" else "#dc3545"
+    
+    st.markdown(f"""
+        <div class="metric-card">
+            <h2 style="margin:0; color: {score_color}; font-size: 3em;">{score}%</h2>
+            <p style="margin:0; color: #666; font-weight: 600;">Match Score</p>
+            <div style="margin-top: 10px; padding: 5px 10px; background-color: {like_color}20; color: {like_color}; border-radius: 20px; display: inline-block; font-weight: bold; font-size: 0.9em;">
+                {likelihood} Chance
+            </div>
+        </div>
+    """, unsafe_allow_html=True)
+
+def render_heading(result):
+    likelihood = result.response_likelihood or 'Unknown'
+    st.subheader(result.job_title or 'Unknown Role')
+    st.caption(f"Level: {result.job_level or 'Unknown'}")
+    st.write(f"**{likelihood} chance of a response.** Here's what would move the needle.")
+
+def render_breakdown(result):
+    # Component Scores
+    st.markdown("##### Score Breakdown")
+    cs = result.component_scores
+    sc1, sc2, sc3 = st.columns(3)
+    with sc1:
+        st.metric("Skills", f"{cs.skills}%")
+    with sc2:
+        st.metric("Experience", f"{cs.experience}%")
+    with sc3:
+        st.metric("Keywords", f"{cs.keywords}%" if cs.keywords is not None else "…")
+
+def render_priority_fixes(result):
+    # Priority Fixes
+    st.subheader("Top Priority Fixes")
+    st.caption("These 3 changes would have the biggest impact. Focus here first.")
+    for i, fix in enumerate(result.priority_fixes):
+        st.info(f"**{i+1}.** {fix}")
+        
+    st.divider()
+
+def render_ats_keywords(result):
+    # ATS Keywords Side-by-Side
+    st.subheader("ATS Keyword Gap Analysis")
+    st.caption("Missing keywords that actually matter.")
+    
+    missing_ats = result.ats_keywords.missing if result.ats_keywords else ()
+    
+    if missing_ats:
+        st.markdown(f"""
+        <div class="notepad-container">
+            <div class="teacher-note">Pay attention to these!</div>
+            <div class="notepad-header">⚠️ Missing from CV</div>
+            <ul style="color: #4b5563; list-style-type: circle; padding-left: 20px;">
+                {''.join([f'<li style="margin-bottom: 5px;">{kw.capitalize()}</li>' for kw in missing_ats])}
+            </ul>
+        </div>
+        """, unsafe_allow_html=True)
     else:
-        with st.spinner("Analysing... (This might take a few seconds)"):
-            # 1. Extract CV Text
-            cv_text = extract_text_from_pdf(uploaded_cv)
-            
-            # 2. Extract Job Text
-            if job_input_type == "URL":
-                job_text = extract_text_from_url(job_url)
-            else:
-                job_text = job_text_input
-                
-            # 3. Analyze
-            if ai_provider == "Gemini (Google)":
-                result = analyze_cv(cv_text, job_text, api_key)
-            else:
-                result = utils.analyze_cv_claude(cv_text, job_text, api_key)
+        st.success("Great job! No major ATS keywords missing.")
+
+def render_red_flags(result):
+    # Red Flags Section (Enhanced)
+    red_flags = result.red_flags
+    if red_flags:
+        st.markdown("<br>", unsafe_allow_html=True)
+        st.markdown("""
+        <div style="background-color: #fee2e2; border: 1px solid #ef4444; border-radius: 8px; padding: 20px; box-shadow: 0 4px 6px rgba(0,0,0,0.1);">
+            <h3 style="color: #b91c1c; margin-top: 0; display: flex; align-items: center; gap: 10px;">
+                🚩 Recruiter Red Flags
+            </h3>
+            <p style="color: #7f1d1d; font-size: 0.9em; margin-bottom: 15px;">
+                These are common warning signs that might cause a recruiter to hesitate.
+            </p>
+            <ul style="color: #991b1b; padding-left: 20px;">
+        """ + "".join([f"<li style='margin-bottom: 8px;'>{flag}</li>" for flag in red_flags]) + """
+            </ul>
+        </div>
+        """, unsafe_allow_html=True)
+
+def render_skills(result):
+    col_a, col_b = st.columns(2)
+    with col_a:
+        st.markdown("### Hard Skills")
+        if result.hard_skills.missing:
+            st.markdown("**Missing**")
+            for skill in result.hard_skills.missing:
+                st.markdown(f"- <span style='color:#dc3545'>{skill}</span>", unsafe_allow_html=True)
+        
+        st.markdown("**Present**")
+        for skill in result.hard_skills.present:
+            st.markdown(f"- <span style='color:#28a745'>{skill}</span>", unsafe_allow_html=True)
             
-            if "error" in result:
-                st.error(f"Analysis failed: {result['error']}")
-            else:
-                # Display Results
-                st.divider()
-                
-                # Top Section: Score & Title
-                c1, c2 = st.columns([1, 2])
-                with c1:
-                    score = result.get('match_score', 0)
-                    score_color = "#28a745" if score >= 80 else "#ffc107" if score >= 50 else "#dc3545"
-                    
-                    # Likelihood Badge
-                    likelihood = result.get('response_likelihood', 'Unknown')
-                    like_color = "#28a745" if likelihood == "High" else "#ffc107" if likelihood == "Moderate" else "#dc3545"
-                    
-                    st.markdown(f"""
-                        <div class="metric-card">
-                            <h2 style="margin:0; color: {score_color}; font-size: 3em;">{score}%</h2>
-                            <p style="margin:0; color: #666; font-weight: 600;">Match Score</p>
-                            <div style="margin-top: 10px; padding: 5px 10px; background-color: {like_color}20; color: {like_color}; border-radius: 20px; display: inline-block; font-weight: bold; font-size: 0.9em;">
-                                {likelihood} Chance
-                            </div>
-                        </div>
-                    """, unsafe_allow_html=True)
-                with c2:
-                    st.subheader(result.get('job_title', 'Unknown Role'))
-                    st.caption(f"Level: {result.get('job_level', 'Unknown')}")
-                    st.write(f"**{likelihood} chance of a response.** Here's what would move the needle.")
-                    
-                    # Component Scores
-                    st.markdown("##### Score Breakdown")
-                    cs = result.get('component_scores', {})
-                    sc1, sc2, sc3 = st.columns(3)
-                    with sc1:
-                        st.metric("Skills", f"{cs.get('skills', 0)}%")
-                    with sc2:
-                        st.metric("Experience", f"{cs.get('experience', 0)}%")
-                    with sc3:
-                        st.metric("Keywords", f"{cs.get('keywords', 0)}%")
-
-                # Tabs for Deep Dive
-                tab1, tab2, tab3, tab4 = st.tabs(["What to Fix First", "What's Missing", "Strengthen These", "Copy-Paste Phrases"])
-                
-                with tab1:
-                    # Priority Fixes
-                    st.subheader("Top Priority Fixes")
-                    st.caption("These 3 changes would have the biggest impact. Focus here first.")
-                    for i, fix in enumerate(result.get('priority_fixes', [])):
-                        st.info(f"**{i+1}.** {fix}")
-                        
-                    st.divider()
-                    
-                    # ATS Keywords Side-by-Side
-                    st.subheader("ATS Keyword Gap Analysis")
-                    st.caption("Missing keywords that actually matter.")
-                    
-                    missing_ats = result.get('ats_keywords', {}).get('missing', [])
-                    
-                    if missing_ats:
-                        st.markdown(f"""
-                        <div class="notepad-container">
-                            <div class="teacher-note">Pay attention to these!</div>
-                            <div class="notepad-header">⚠️ Missing from CV</div>
-                            <ul style="color: #4b5563; list-style-type: circle; padding-left: 20px;">
-                                {''.join([f'<li style="margin-bottom: 5px;">{kw.capitalize()}</li>' for kw in missing_ats])}
-                            </ul>
-                        </div>
-                        """, unsafe_allow_html=True)
-                    else:
-                        st.success("Great job! No major ATS keywords missing.")
-
-                    # Red Flags Section (Enhanced)
-                    red_flags = result.get('red_flags', [])
-                    if red_flags:
-                        st.markdown("<br>", unsafe_allow_html=True)
-                        st.markdown("""
-                        <div style="background-color: #fee2e2; border: 1px solid #ef4444; border-radius: 8px; padding: 20px; box-shadow: 0 4px 6px rgba(0,0,0,0.1);">
-                            <h3 style="color: #b91c1c; margin-top: 0; display: flex; align-items: center; gap: 10px;">
-                                🚩 Recruiter Red Flags
-                            </h3>
-                            <p style="color: #7f1d1d; font-size: 0.9em; margin-bottom: 15px;">
-                                These are common warning signs that might cause a recruiter to hesitate.
-                            </p>
-                            <ul style="color: #991b1b; padding-left: 20px;">
-                        """ + "".join([f"<li style='margin-bottom: 8px;'>{flag}</li>" for flag in red_flags]) + """
-                            </ul>
-                        </div>
-                        """, unsafe_allow_html=True)
-
-                with tab2:
-                    col_a, col_b = st.columns(2)
-                    with col_a:
-                        st.markdown("### Hard Skills")
-                        if result.get('hard_skills', {}).get('missing', []):
-                            st.markdown("**Missing**")
-                            for skill in result.get('hard_skills', {}).get('missing', []):
-                                st.markdown(f"- <span style='color:#dc3545'>{skill}</span>", unsafe_allow_html=True)
-                        
-                        st.markdown("**Present**")
-                        for skill in result.get('hard_skills', {}).get('present', []):
-                            st.markdown(f"- <span style='color:#28a745'>{skill}</span>", unsafe_allow_html=True)
-                            
-                    with col_b:
-                        st.markdown("### Soft Skills")
-                        if result.get('soft_skills', {}).get('missing', []):
-                            st.markdown("**Missing**")
-                            for skill in result.get('soft_skills', {}).get('missing', []):
-                                st.markdown(f"- <span style='color:#dc3545'>{skill}</span>", unsafe_allow_html=True)
-
-                        st.markdown("**Present**")
-                        for skill in result.get('soft_skills', {}).get('present', []):
-                            st.markdown(f"- <span style='color:#28a745'>{skill}</span>", unsafe_allow_html=True)
-
-                with tab3:
-                    st.subheader("Quantification Score")
-                    st.caption("Recruiters look for numbers to understand the scale of your impact.")
-                    
-                    q_score = result.get('quantification_analysis', {}).get('score', 0)
-                    st.progress(q_score / 100, text=f"{q_score}/100")
-                    
-                    st.markdown("**Analysis:**")
-                    for item in result.get('quantification_analysis', {}).get('feedback', []):
-                        st.info(item)
-
-                with tab4:
-                    st.subheader("Culture Signals")
-                    st.write(result.get('cultural_fit', 'No specific details found.'))
-                    
-                    st.divider()
-                    
-                    st.subheader("Ready-to-Use Phrases")
-                    st.caption("Professional phrasing you can adapt for your CV.")
-                    for phrase in result.get('suggested_phrases', []):
-                        with st.expander(f"{phrase.get('context', 'General')}"):
-                            st.markdown(f"_{phrase.get('suggestion', '')}_")
-
-                # Export Button
-                st.divider()
-                report_text = f"""
+    with col_b:
+        st.markdown("### Soft Skills")
+        if result.soft_skills.missing:
+            st.markdown("**Missing**")
+            for skill in result.soft_skills.missing:
+                st.markdown(f"- <span style='color:#dc3545'>{skill}</span>", unsafe_allow_html=True)
+
+        st.markdown("**Present**")
+        for skill in result.soft_skills.present:
+            st.markdown(f"- <span style='color:#28a745'>{skill}</span>", unsafe_allow_html=True)
+
+def render_quantification(result):
+    st.subheader("Quantification Score")
+    st.caption("Recruiters look for numbers to understand the scale of your impact.")
+    
+    q_score = result.quantification_analysis.score
+    st.progress(q_score / 100, text=f"{q_score}/100")
+    
+    st.markdown("**Analysis:**")
+    for item in result.quantification_analysis.feedback:
+        st.info(item)
+
+def render_culture(result):
+    st.subheader("Culture Signals")
+    st.write(result.cultural_fit or 'No specific details found.')
+    
+    st.divider()
+
+def render_phrases(result):
+    st.subheader("Ready-to-Use Phrases")
+    st.caption("Professional phrasing you can adapt for your CV.")
+    for phrase in result.suggested_phrases:
+        with st.expander(phrase.context or 'General'):
+            st.markdown(f"_{phrase.suggestion}_")
+
+def build_report(result):
+    return f"""
 CV Matcher Report
 =================
-Job Title: {result.get('job_title')}
-Match Score: {result.get('match_score')}%
-Response Likelihood: {result.get('response_likelihood')}
+Job Title: {result.job_title}
+Match Score: {result.match_score}%
+Response Likelihood: {result.response_likelihood}
 
 ---
 PRIORITY FIXES
-{chr(10).join(['- ' + f for f in result.get('priority_fixes', [])])}
+{chr(10).join(['- ' + f for f in result.priority_fixes])}
 
 ---
 ATS MISSING KEYWORDS
-{', '.join(result.get('ats_keywords', {}).get('missing', []))}
+{', '.join(result.ats_keywords.missing if result.ats_keywords else ())}
 
 ---
 SUGGESTED PHRASES
-{chr(10).join([f"- {p.get('context')}: {p.get('suggestion')}" for p in result.get('suggested_phrases', [])])}
+{chr(10).join([f"- {p.context}: {p.suggestion}" for p in result.suggested_phrases])}
 """
-                st.download_button(
-                    label="📥 Download Report (No Signup Required)",
-                    data=report_text,
-                    file_name="cv_analysis_report.txt",
-                    mime="text/plain",
-                    help="Your report. No watermark. No signup. Just take it."
-                )
+
+def render_export(result):
+    # Export Button
+    st.divider()
+    st.download_button(
+        label="📥 Download Report (No Signup Required)",
+        data=build_report(result),
+        file_name="cv_analysis_report.txt",
+        mime="text/plain",
+        help="Your report. No watermark. No signup. Just take it."
+    )
+    st.download_button(
+        label="Download Data (JSON)",
+        data=json.dumps(result.to_dict(), ensure_ascii=False, indent=1),
+        file_name="cv_analysis.json",
+        mime="application/json",
+        help="The full analysis, for spreadsheets or your own tools."
+    )
+
+# Section name -> (renderer, result fields it depends on)
+RESULT_SECTIONS = {
+    "score": (render_score_card, {"match_score", "response_likelihood"}),
+    "heading": (render_heading, {"job_title", "job_level", "response_likelihood"}),
+    "breakdown": (render_breakdown, {"component_scores"}),
+    "fixes": (render_priority_fixes, {"priority_fixes"}),
+    "ats": (render_ats_keywords, {"ats_keywords"}),
+    "flags": (render_red_flags, {"red_flags"}),
+    "skills": (render_skills, {"hard_skills", "soft_skills"}),
+    "quantification": (render_quantification, {"quantification_analysis"}),
+    "culture": (render_culture, {"cultural_fit"}),
+    "phrases": (render_phrases, {"suggested_phrases"}),
+}
+
+def result_layout():
+    """Lays out empty slots for every result section and returns them by name."""
+    st.divider()
+    slots = {}
+    
+    # Top Section: Score & Title
+    c1, c2 = st.columns([1, 2])
+    with c1:
+        slots["score"] = st.empty()
+    with c2:
+        slots["heading"] = st.empty()
+        slots["breakdown"] = st.empty()
+
+    # Tabs for Deep Dive
+    tab1, tab2, tab3, tab4 = st.tabs(["What to Fix First", "What's Missing", "Strengthen These", "Copy-Paste Phrases"])
+    with tab1:
+        slots["fixes"] = st.empty()
+        slots["ats"] = st.empty()
+        slots["flags"] = st.empty()
+    with tab2:
+        slots["skills"] = st.empty()
+    with tab3:
+        slots["quantification"] = st.empty()
+    with tab4:
+        slots["culture"] = st.empty()
+        slots["phrases"] = st.empty()
+    
+    slots["export"] = st.empty()
+    return slots
+
+def render_sections(slots, result, changed=None):
+    """Redraws the sections that depend on the changed field (all sections if None)."""
+    for name, (render, fields) in RESULT_SECTIONS.items():
+        if changed is None or changed in fields:
+            with slots[name].container():
+                render(result)
+
+@st.fragment
+def render_results(result):
+    """The finished result; runs as a fragment so widgets in it only rerun this section."""
+    slots = result_layout()
+    render_sections(slots, result)
+    with slots["export"].container():
+        render_export(result)
+
+def input_fingerprint(uploaded_cv, job_url, job_text, provider):
+    """Identifies the inputs a result was produced from."""
+    return make_key(hashlib.sha256(uploaded_cv.getvalue()).hexdigest(), job_url, job_text, provider)
+
+# Analysis Button (Full Width)
+st.markdown("<br>", unsafe_allow_html=True) # Add some spacing
+# Button is placed directly to span the full width of the container
+if st.button("CHECK MY CV", use_container_width=True, type="primary"):
+    if not uploaded_cv:
+        st.error("Please upload your CV.")
+    elif (job_input_type == "URL" and not job_url) or (job_input_type == "Text" and not job_text_input):
+        st.error("Please provide the job details.")
+    else:
+        provider = "gemini" if ai_provider == "Gemini (Google)" else "claude"
+        fingerprint = input_fingerprint(uploaded_cv, job_url, job_text_input, provider)
+        stored = st.session_state.get("analysis")
+        
+        # Same CV, job and provider as the result on screen: nothing to re-run
+        if stored is None or stored["fingerprint"] != fingerprint:
+            with metrics.request_log(provider=provider, session_id=st.session_state.session_id,
+                                     source="url" if job_input_type == "URL" else "text") as request_log:
+                with st.spinner("Reading your CV and the job spec..."):
+                    # Extract CV and job text concurrently
+                    pdf, job_text = asyncio.run(utils.ingest(
+                        uploaded_cv,
+                        job_url=job_url if job_input_type == "URL" else None,
+                        job_text=job_text_input,
+                    ))
+            
+                # Shared API keys are rate limited; show queue position instead of failing
+                queue_notice = st.empty()
+                script_run_ctx = get_script_run_ctx()
+                def show_queue_position(position):
+                    # Called from worker threads too (section calls, hedged attempts); they need
+                    # this script run attached to draw anything
+                    add_script_run_ctx(threading.current_thread(), script_run_ctx)
+                    queue_notice.info(f"Lots of people are checking their CVs right now. You're number {position} in the queue...")
+            
+                live = st.empty()
+                with st.spinner("Analysing... (This might take a few seconds)"), \
+                        request_context(st.session_state.session_id, on_wait=show_queue_position):
+                    # Render each section as soon as its part of the answer has arrived
+                    slots = None
+                    fields = {}
+                    result = None
+                    started = time.perf_counter()
+                    # With CV_MATCHER_HEDGE set and both keys configured, a slow provider is hedged
+                    backup = hedging.other_provider(provider)
+                    api_keys = {provider: api_key, backup: os.getenv(API_KEY_ENV[backup])}
+                    for field, value in hedging.analysis_stream(pdf["text"], job_text, provider, api_keys):
+                        queue_notice.empty()
+                        if "first_field_seconds" not in request_log:
+                            request_log["first_field_seconds"] = round(time.perf_counter() - started, 4)
+                        if field is None:
+                            result = value
+                            break
+                        if slots is None:
+                            with live.container():
+                                slots = result_layout()
+                        fields[field] = value
+                        render_sections(slots, AnalysisResult.from_dict(fields), changed=field)
+                # The finished result is drawn from session state below
+                live.empty()
+                
+                if is_error(result):
+                    request_log["error"] = result["error"]
+                    st.error(f"Analysis failed: {result['error']}")
+                else:
+                    st.session_state.analysis = {"fingerprint": fingerprint, "result": result}
+
+# Results survive reruns (downloads, sidebar changes, ...) without calling the LLM again
+if "analysis" in st.session_state:
+    analysis = st.session_state.analysis
+    if uploaded_cv and analysis["fingerprint"] != input_fingerprint(
+            uploaded_cv, job_url, job_text_input, "gemini" if ai_provider == "Gemini (Google)" else "claude"):
+        st.info("These results are for your previous CV or job spec. Click CHECK MY CV to update them.")
+    render_results(analysis["result"])
 
 # Trust Footer (Integrated)
 st.markdown("""
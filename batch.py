@@ -0,0 +1,192 @@
+"""Batch runner: analyse many CV / job pairs from a JSONL manifest.
+
+Each manifest line is a JSON object describing one pair:
+
+    {"id": "alice-acme", "cv": "cvs/alice.pdf", "job_url": "https://..."}
+    {"cv_text": "...", "job_text": "...", "provider": "claude"}
+
+Missing fields fall back to the command-line defaults, so one CV can be run
+against hundreds of jobs (--cv) or many CVs against one job (--job-url /
+--job-text). Results are appended to the output JSONL as they complete, and
+re-running with the same output file skips pairs that already succeeded.
+
+    python batch.py manifest.jsonl -o results.jsonl --concurrency 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+from dotenv import load_dotenv
+
+import hedging
+import metrics
+import utils
+from cache import make_key
+from result import is_error
+
+API_KEY_ENV = {
+    "gemini": "GOOGLE_API_KEY",
+    "claude": "ANTHROPIC_API_KEY",
+}
+
+
+def load_manifest(path, defaults):
+    """Reads the manifest and fills in defaults; every pair gets a stable id."""
+    pairs = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            row = dict(defaults)
+            row.update({k: v for k, v in json.loads(line).items() if v is not None})
+            if not (row.get("cv") or row.get("cv_text")):
+                raise ValueError(f"{path}:{line_no}: no CV given")
+            if not (row.get("job_url") or row.get("job_text")):
+                raise ValueError(f"{path}:{line_no}: no job given")
+            if "id" not in row:
+                row["id"] = make_key(row.get("cv"), row.get("cv_text"), row.get("job_url"),
+                                     row.get("job_text"), row["provider"])[:16]
+            pairs.append(row)
+    return pairs
+
+
+def completed_ids(path):
+    """Ids of pairs that already have a successful result in the output file."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A partially written last line from an interrupted run
+                continue
+            if record.get("status") == "ok":
+                done.add(record["id"])
+    return done
+
+
+async def _analyse_pair(row, api_keys, hedge=False):
+    """Extracts both sides of a pair concurrently and runs the analysis."""
+    if row.get("cv_text"):
+        cv_future = asyncio.sleep(0, result=row["cv_text"])
+    else:
+        cv_future = utils.extract_pdf_async(row["cv"])
+    if row.get("job_text"):
+        job_future = asyncio.sleep(0, result=row["job_text"])
+    else:
+        job_future = utils.extract_text_from_url_async(row["job_url"])
+
+    cv, job_text = await asyncio.gather(cv_future, job_future)
+    cv_text = cv if isinstance(cv, str) else cv["text"]
+    if isinstance(cv, dict) and cv.get("error"):
+        return {"error": cv["text"]}
+    if job_text.startswith("Error fetching URL:"):
+        return {"error": job_text}
+
+    provider = row["provider"]
+    if hedge:
+        return await hedging.analyze_hedged(cv_text, job_text, api_keys, primary=provider)
+    return await asyncio.to_thread(utils.PROVIDERS[provider], cv_text, job_text, api_keys[provider])
+
+
+async def _run_with_retries(row, api_keys, retries, backoff, hedge=False):
+    started = time.perf_counter()
+    attempt = 0
+    with metrics.request_log(provider=row["provider"], pair_id=row["id"], hedged=hedge) as log:
+        while True:
+            attempt += 1
+            try:
+                result = await _analyse_pair(row, api_keys, hedge)
+            except Exception as e:
+                result = {"error": str(e)}
+            if not is_error(result) or attempt > retries:
+                break
+            # Exponential backoff with jitter before the next attempt
+            await asyncio.sleep(backoff * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5))
+        log["retries"] = attempt - 1
+        if is_error(result):
+            log["error"] = result["error"]
+
+    return {
+        "id": row["id"],
+        "status": "error" if is_error(result) else "ok",
+        "attempts": attempt,
+        "seconds": round(time.perf_counter() - started, 3),
+        "input": {k: row.get(k) for k in ("cv", "job_url", "provider") if row.get(k)},
+        "result": result if is_error(result) else result.to_dict(),
+    }
+
+
+async def run_batch(pairs, output_path, api_keys, concurrency=4, retries=2, backoff=2.0, hedge=False):
+    """Runs pairs with bounded concurrency, appending each result as it finishes."""
+    semaphore = asyncio.Semaphore(concurrency)
+    counts = {"ok": 0, "error": 0}
+
+    with open(output_path, "a", encoding="utf-8") as out:
+        async def worker(row):
+            async with semaphore:
+                record = await _run_with_retries(row, api_keys, retries, backoff, hedge)
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            counts[record["status"]] += 1
+            print(f"[{counts['ok'] + counts['error']}/{len(pairs)}] {record['id']}: "
+                  f"{record['status']} ({record['seconds']}s)", file=sys.stderr)
+
+        await asyncio.gather(*(worker(row) for row in pairs))
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse CV / job pairs from a JSONL manifest.")
+    parser.add_argument("manifest", help="JSONL file, one pair per line")
+    parser.add_argument("-o", "--output", default="results.jsonl", help="JSONL file results are appended to")
+    parser.add_argument("--provider", choices=sorted(utils.PROVIDERS), default="gemini")
+    parser.add_argument("--cv", help="Default CV PDF for lines without one")
+    parser.add_argument("--job-url", help="Default job URL for lines without a job")
+    parser.add_argument("--job-text", help="Default job description for lines without a job")
+    parser.add_argument("--concurrency", type=int, default=4, help="Pairs analysed at the same time")
+    parser.add_argument("--retries", type=int, default=2, help="Extra attempts for a failed pair")
+    parser.add_argument("--backoff", type=float, default=2.0, help="Base seconds between retries")
+    parser.add_argument("--hedge", action="store_true",
+                        help="Also ask the other provider when the first is slow; first valid answer wins")
+    parser.add_argument("--no-resume", action="store_true", help="Redo pairs already in the output file")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    metrics.start_server()
+
+    defaults = {"provider": args.provider}
+    for field in ("cv", "job_url", "job_text"):
+        if getattr(args, field):
+            defaults[field] = getattr(args, field)
+    pairs = load_manifest(args.manifest, defaults)
+
+    if not args.no_resume:
+        done = completed_ids(args.output)
+        skipped = sum(1 for row in pairs if row["id"] in done)
+        pairs = [row for row in pairs if row["id"] not in done]
+        if skipped:
+            print(f"Resuming: {skipped} pairs already done", file=sys.stderr)
+
+    api_keys = {provider: os.getenv(env) for provider, env in API_KEY_ENV.items()}
+    missing = {row["provider"] for row in pairs if not api_keys.get(row["provider"])}
+    if missing:
+        parser.error("missing API key for " + ", ".join(f"{p} ({API_KEY_ENV[p]})" for p in sorted(missing)))
+
+    counts = asyncio.run(run_batch(pairs, args.output, api_keys, args.concurrency, args.retries,
+                                   args.backoff, args.hedge))
+    print(f"Done: {counts['ok']} ok, {counts['error']} failed", file=sys.stderr)
+    if args.hedge:
+        print(f"Hedging: {json.dumps(hedging.hedging_stats())}", file=sys.stderr)
+    return 0 if counts["error"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""A local stand-in for the Anthropic Messages API with configurable latency.
+
+Serves POST /v1/messages (plain and streamed) with a canned, schema-valid
+analysis and realistic usage numbers. Point the app at it with
+ANTHROPIC_BASE_URL=http://127.0.0.1:<port>.
+
+    python -m benchmarks.fake_llm --port 8787 --latency 2.0 --jitter 0.5
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SAMPLE_RESULT = {
+    "match_score": 72,
+    "match_explanation": "Strong technical overlap, but limited evidence of stakeholder management.",
+    "response_likelihood": "Moderate",
+    "component_scores": {"skills": 78, "experience": 65},
+    "job_title": "Senior Data Engineer",
+    "job_level": "Senior",
+    "hard_skills": {"present": ["Python", "SQL", "Spark"], "missing": ["Kubernetes", "Terraform"]},
+    "soft_skills": {"present": ["Mentoring"], "missing": ["Stakeholder management"]},
+    "quantification_analysis": {
+        "score": 60,
+        "feedback": ["Quantify pipeline volumes", "Add cost savings", "State team sizes"],
+    },
+    "red_flags": [],
+    "cultural_fit": "Collaborative, fast-paced environment.",
+    "priority_fixes": ["Add Kubernetes experience", "Show stakeholder work", "Quantify impact"],
+    "suggested_phrases": [
+        {"context": "For the Experience section", "suggestion": "Built Spark pipelines processing 2TB/day..."},
+    ],
+}
+
+
+class FakeLLMServer:
+    """Threaded fake provider server; latency is drawn per request."""
+
+    def __init__(self, host="127.0.0.1", port=0, latency=1.0, jitter=0.0, stream_chunk=40):
+        self.latency = latency
+        self.jitter = jitter
+        self.stream_chunk = stream_chunk
+        self.requests = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                with server._lock:
+                    server.requests += 1
+                if request.get("stream"):
+                    server._stream(self, request)
+                else:
+                    server._respond(self, request)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://{host}:{self.httpd.server_address[1]}"
+        self._thread = None
+
+    def _delay(self):
+        return max(0.0, random.gauss(self.latency, self.jitter) if self.jitter else self.latency)
+
+    @staticmethod
+    def _usage(request):
+        text = json.dumps(request.get("messages", []))
+        system = json.dumps(request.get("system", ""))
+        return {
+            "input_tokens": len(text) // 4,
+            "cache_read_input_tokens": len(system) // 4,
+            "cache_creation_input_tokens": 0,
+            "output_tokens": len(json.dumps(SAMPLE_RESULT)) // 4,
+        }
+
+    def _respond(self, handler, request):
+        time.sleep(self._delay())
+        body = json.dumps({
+            "id": "msg_fake",
+            "type": "message",
+            "role": "assistant",
+            "model": request.get("model", "fake"),
+            "content": [{"type": "text", "text": json.dumps(SAMPLE_RESULT)}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": self._usage(request),
+        }).encode()
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def _stream(self, handler, request):
+        # Spread the latency over the stream: a short time to first token, then chunks
+        total = self._delay()
+        text = json.dumps(SAMPLE_RESULT)
+        chunks = [text[i:i + self.stream_chunk] for i in range(0, len(text), self.stream_chunk)]
+        usage = self._usage(request)
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.send_header("Connection", "close")
+        handler.end_headers()
+
+        def event(name, data):
+            handler.wfile.write(f"event: {name}\ndata: {json.dumps(data)}\n\n".encode())
+            handler.wfile.flush()
+
+        time.sleep(total * 0.1)
+        event("message_start", {"type": "message_start", "message": {
+            "id": "msg_fake", "type": "message", "role": "assistant", "model": request.get("model", "fake"),
+            "content": [], "stop_reason": None, "stop_sequence": None,
+            "usage": dict(usage, output_tokens=1),
+        }})
+        event("content_block_start", {"type": "content_block_start", "index": 0,
+                                      "content_block": {"type": "text", "text": ""}})
+        for chunk in chunks:
+            time.sleep(total * 0.9 / len(chunks))
+            event("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                          "delta": {"type": "text_delta", "text": chunk}})
+        event("content_block_stop", {"type": "content_block_stop", "index": 0})
+        event("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                "usage": {"output_tokens": usage["output_tokens"]}})
+        event("message_stop", {"type": "message_stop"})
+        handler.close_connection = True
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake Anthropic Messages API.")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency", type=float, default=1.0, help="Mean seconds per response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Standard deviation of the latency")
+    args = parser.parse_args()
+    server = FakeLLMServer(port=args.port, latency=args.latency, jitter=args.jitter)
+    print(f"Fake LLM listening on {server.url}")
+    server.httpd.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Generates the benchmark fixtures: CV PDFs of 1-20 pages and job pages of varying size.
+
+The files are committed under benchmarks/fixtures/; re-run this script only
+to change them (output is deterministic):
+
+    python -m benchmarks.fixtures
+"""
+import json
+import os
+import random
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+CV_PAGES = (1, 2, 5, 10, 20)
+JOB_PAGES = {"small": 5, "medium": 100, "large": 1000}
+
+ROLES = ["Data Engineer", "Product Manager", "Software Engineer", "Marketing Lead", "Analyst"]
+SKILLS = ["Python", "SQL", "Spark", "AWS", "Kubernetes", "Tableau", "Excel", "Stakeholder management",
+          "Agile", "CI/CD", "Terraform", "React", "Machine learning", "Budgeting", "SEO"]
+VERBS = ["Led", "Built", "Designed", "Delivered", "Reduced", "Increased", "Migrated", "Launched", "Owned"]
+
+# Lines per PDF page at 12pt on A4 / Letter
+LINES_PER_PAGE = 45
+
+
+def _pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(pages):
+    """Builds a minimal text PDF; pages is a list of lists of lines."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(len(pages)))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>")
+    font_id = 3 + 2 * len(pages)
+    for i, lines in enumerate(pages):
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * i} 0 R "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> >>"
+        )
+        body = "BT /F1 10 Tf 14 TL 50 760 Td " + " ".join(f"({_pdf_escape(line)}) '" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(body)} >>\nstream\n{body}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out = "%PDF-1.4\n"
+    offsets = []
+    for i, obj in enumerate(objects):
+        offsets.append(len(out))
+        out += f"{i + 1} 0 obj\n{obj}\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n"
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    return out.encode("latin-1")
+
+
+def cv_lines(rng, n_pages):
+    lines = []
+    for page in range(n_pages):
+        lines.append(f"Jane Doe - Curriculum Vitae - Page {page + 1} of {n_pages}")
+        while len(lines) < (page + 1) * LINES_PER_PAGE:
+            role = rng.choice(ROLES)
+            lines.append(f"{role}, Company {rng.randint(1, 99)} ({rng.randint(2005, 2024)} - present)")
+            for _ in range(rng.randint(3, 6)):
+                lines.append(f"- {rng.choice(VERBS)} {rng.choice(SKILLS)} work for {rng.randint(2, 50)} "
+                             f"teams, improving throughput by {rng.randint(5, 80)}%")
+    return [lines[i:i + LINES_PER_PAGE] for i in range(0, len(lines), LINES_PER_PAGE)][:n_pages]
+
+
+def job_html(rng, n_blocks, structured=True):
+    nav = "".join(f"<li><a href='/c/{i}'>Category {i}</a></li>" for i in range(40))
+    description = "".join(
+        f"<p>You will use {rng.choice(SKILLS)} and {rng.choice(SKILLS)} to {rng.choice(VERBS).lower()} "
+        f"products used by {rng.randint(1, 900)}k customers.</p>"
+        for _ in range(n_blocks)
+    )
+    requirements = "".join(f"<li>{s}</li>" for s in SKILLS)
+    similar = "".join(f"<li>{rng.choice(ROLES)} - Company {i}</li>" for i in range(n_blocks))
+    posting = {
+        "@context": "https://schema.org",
+        "@type": "JobPosting",
+        "title": "Senior Data Engineer",
+        "description": f"<h3>About the role</h3>{description}<h3>Requirements</h3><ul>{requirements}</ul>",
+        "hiringOrganization": {"@type": "Organization", "name": "Acme Ltd"},
+        "jobLocation": {"@type": "Place", "address": {"addressLocality": "London"}},
+    }
+    # Job boards without structured data only have the page itself
+    structured_data = f'<script type="application/ld+json">{json.dumps(posting)}</script>' if structured else ""
+    return f"""<!DOCTYPE html><html><head><title>Senior Data Engineer - Acme</title>
+<style>body {{ font-family: sans-serif; }}</style>
+<script>window.tracking = {{"id": 1}};</script>
+{structured_data}
+</head><body>
+<div class="cookie-banner">We use cookies. Accept all cookies</div>
+<nav><ul>{nav}</ul></nav>
+<main><h1>Senior Data Engineer</h1><h2>Acme Ltd - London</h2>
+<h3>About the role</h3>{description}
+<h3>Requirements</h3><ul>{requirements}</ul></main>
+<aside><h3>Similar jobs</h3><ul>{similar}</ul></aside>
+<footer>Privacy Policy | Terms of Service | (c) Jobs Inc. All rights reserved</footer>
+</body></html>"""
+
+
+def cv_path(pages):
+    return os.path.join(FIXTURES_DIR, f"cv_{pages:02d}p.pdf")
+
+
+def job_path(size, structured=True):
+    return os.path.join(FIXTURES_DIR, f"job_{size}.html" if structured else f"job_{size}_plain.html")
+
+
+def generate():
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    rng = random.Random(42)
+    for pages in CV_PAGES:
+        with open(cv_path(pages), "wb") as f:
+            f.write(make_pdf(cv_lines(rng, pages)))
+    for size, blocks in JOB_PAGES.items():
+        for structured in (True, False):
+            with open(job_path(size, structured), "w", encoding="utf-8") as f:
+                f.write(job_html(random.Random(blocks), blocks, structured))
+
+
+if __name__ == "__main__":
+    generate()
+    print(f"Fixtures written to {FIXTURES_DIR}")
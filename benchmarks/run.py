@@ -0,0 +1,324 @@
+"""Offline benchmark suite for the analysis pipeline.
+
+Measures import time, PDF extraction, job-page HTML parsing, prompt assembly,
+response parsing and end-to-end analysis latency / throughput under concurrency
+against a local fake LLM (no API keys or network needed). Results are
+written as JSON so runs can be compared:
+
+    python -m benchmarks.run --output before.json
+    python -m benchmarks.run --output after.json --compare before.json
+"""
+import os
+
+# Benchmarks must never hit a shared cache or a real rate limit
+os.environ["CV_MATCHER_CACHE_PATH"] = ""
+os.environ.setdefault("CV_MATCHER_CLAUDE_RPM", "1000000")
+os.environ.setdefault("CV_MATCHER_CLAUDE_TPM", "1000000000")
+
+import argparse
+import contextlib
+import datetime
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import utils
+from benchmarks import fixtures
+from benchmarks.fake_llm import SAMPLE_RESULT, FakeLLMServer
+from cache import PDF_TEXT_CACHE, RESULT_CACHE
+from compaction import compact_inputs
+from jobpage import extract_job_text
+from result import is_error
+from streaming import IncrementalJSONParser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def summarise(samples, wall=None):
+    """Latency percentiles in milliseconds (plus throughput if wall time is given)."""
+    ordered = sorted(samples)
+
+    def pct(p):
+        return ordered[min(int(len(ordered) * p), len(ordered) - 1)] * 1000
+
+    summary = {
+        "n": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": pct(0.50),
+        "p90_ms": pct(0.90),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "min_ms": ordered[0] * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+    if wall:
+        summary["throughput_rps"] = len(ordered) / wall
+    return summary
+
+
+def measure(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return summarise(samples)
+
+
+def _import_seconds(statement):
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", statement], check=True, cwd=ROOT,
+                   env=dict(os.environ, CV_MATCHER_PREWARM=""), stderr=subprocess.DEVNULL)
+    return time.perf_counter() - started
+
+
+def bench_import(repeat):
+    """Cold interpreter start + import, with lazy SDKs and with everything loaded up front."""
+    repeat = min(repeat, 5)
+    eager = "import utils, " + ", ".join(name for names in utils.LAZY_MODULES.values() for name in names)
+    return {
+        "import.baseline": summarise([_import_seconds("pass") for _ in range(repeat)]),
+        "import.utils": summarise([_import_seconds("import utils") for _ in range(repeat)]),
+        "import.utils_eager": summarise([_import_seconds(eager) for _ in range(repeat)]),
+    }
+
+
+def bench_pdf(repeat):
+    results = {}
+    for pages in fixtures.CV_PAGES:
+        with open(fixtures.cv_path(pages), "rb") as f:
+            data = f.read()
+
+        def cold():
+            PDF_TEXT_CACHE.clear()
+            utils.extract_pdf(data)
+
+        results[f"pdf.extract.{pages:02d}p"] = measure(cold, repeat)
+        results[f"pdf.cached.{pages:02d}p"] = measure(lambda: utils.extract_pdf(data), repeat)
+    return results
+
+
+def bench_html(repeat):
+    results = {}
+    for size in fixtures.JOB_PAGES:
+        for structured, suffix in ((True, ""), (False, "_plain")):
+            with open(fixtures.job_path(size, structured), "rb") as f:
+                html = f.read()
+            results[f"html.parse.{size}{suffix}"] = measure(lambda: extract_job_text(html), repeat)
+    return results
+
+
+def _texts():
+    with open(fixtures.cv_path(5), "rb") as f:
+        cv_text = utils.extract_pdf(f.read())["text"]
+    with open(fixtures.job_path("medium"), "rb") as f:
+        job_text = extract_job_text(f.read())[0]
+    return cv_text, job_text
+
+
+def bench_prompt(repeat):
+    cv_text, job_text = _texts()
+
+    def assemble():
+        cv, job, _ = compact_inputs(cv_text, job_text)
+        utils.ANALYSIS_PROMPT_TEMPLATE.format(cv_text=cv, job_text=job)
+
+    return {"prompt.assemble": measure(assemble, repeat)}
+
+
+def bench_parse(repeat):
+    text = "Here is the analysis:\n" + json.dumps(SAMPLE_RESULT, indent=2)
+    chunks = [text[i:i + 40] for i in range(0, len(text), 40)]
+
+    def incremental():
+        parser = IncrementalJSONParser()
+        for chunk in chunks:
+            parser.feed(chunk)
+
+    return {
+        "parse.full": measure(lambda: utils._parse_result("bench", text), repeat),
+        "parse.incremental": measure(incremental, repeat),
+    }
+
+
+def bench_end_to_end(requests, concurrency_levels, latency, jitter):
+    cv_text, job_text = _texts()
+    server = FakeLLMServer(latency=latency, jitter=jitter).start()
+    os.environ["ANTHROPIC_BASE_URL"] = server.url
+    results = {}
+    counter = [0]
+
+    def unique_cv():
+        # A distinct CV per request so the result cache never answers
+        counter[0] += 1
+        return f"{cv_text}\nRef {counter[0]}"
+
+    def blocking(cv):
+        started = time.perf_counter()
+        result = utils.analyze_cv_claude(cv, job_text, "bench-key")
+        if is_error(result):
+            raise RuntimeError(result["error"])
+        return time.perf_counter() - started, None
+
+    def streaming(cv):
+        started = time.perf_counter()
+        first = None
+        for field, value in utils.analyze_cv_claude_stream(cv, job_text, "bench-key"):
+            if field is None and is_error(value):
+                raise RuntimeError(value["error"])
+            if first is None:
+                first = time.perf_counter() - started
+        return time.perf_counter() - started, first
+
+    try:
+        for mode, call in (("blocking", blocking), ("streaming", streaming)):
+            for concurrency in concurrency_levels:
+                RESULT_CACHE.clear()
+                cvs = [unique_cv() for _ in range(requests)]
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                    timings = list(pool.map(call, cvs))
+                wall = time.perf_counter() - started
+                name = f"e2e.{mode}.c{concurrency}"
+                results[name] = summarise([t[0] for t in timings], wall)
+                if mode == "streaming":
+                    results[name + ".first_field"] = summarise([t[1] for t in timings])
+    finally:
+        server.stop()
+    return results
+
+
+def bench_service(requests, concurrency_levels, latency, jitter, workers):
+    """Load-tests the HTTP service: submit, then follow the job's event stream to the result.
+
+    Uses its own API key, so its provider client talks to this run's fake server.
+    """
+    import urllib.request
+
+    import service
+
+    cv_text, job_text = _texts()
+    fake = FakeLLMServer(latency=latency, jitter=jitter).start()
+    os.environ["ANTHROPIC_BASE_URL"] = fake.url
+    server = service.serve(port=0, workers=workers, queue_size=max(concurrency_levels) * 2)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    results = {}
+    counter = [0]
+
+    def one(_):
+        counter[0] += 1
+        body = json.dumps({"cv_text": f"{cv_text}\nRef service {counter[0]}", "job_text": job_text,
+                           "provider": "claude", "api_key": "bench-service-key"}).encode()
+        started = time.perf_counter()
+        request = urllib.request.Request(f"{base}/v1/analyses", data=body,
+                                         headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request) as response:
+            job = json.load(response)
+        with urllib.request.urlopen(base + job["events"]) as events:
+            event = None
+            for line in events:
+                if line.startswith(b"event: "):
+                    event = line[7:].strip()
+                elif line.startswith(b"data: ") and event == b"error":
+                    raise RuntimeError(f"Job {job['id']} failed: {line[6:].decode().strip()}")
+                elif event == b"result":
+                    break
+        return time.perf_counter() - started
+
+    try:
+        for concurrency in concurrency_levels:
+            RESULT_CACHE.clear()
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                timings = list(pool.map(one, range(requests)))
+            results[f"service.w{workers}.c{concurrency}"] = summarise(timings, time.perf_counter() - started)
+    finally:
+        server.shutdown()
+        server.server_close()
+        fake.stop()
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def compare(current, baseline):
+    """Prints p50 / p95 change per benchmark against a previous results file."""
+    print(f"{'benchmark':36} {'p50 before':>11} {'p50 after':>10} {'change':>8}   {'p95 change':>10}")
+    for name, stats in current["results"].items():
+        old = baseline["results"].get(name)
+        if not old:
+            continue
+        p50 = (stats["p50_ms"] / old["p50_ms"] - 1) * 100 if old["p50_ms"] else 0.0
+        p95 = (stats["p95_ms"] / old["p95_ms"] - 1) * 100 if old["p95_ms"] else 0.0
+        print(f"{name:36} {old['p50_ms']:11.2f} {stats['p50_ms']:10.2f} {p50:+7.1f}%   {p95:+9.1f}%")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the CV analysis pipeline offline.")
+    parser.add_argument("--output", default=os.path.join("benchmarks", "results", "latest.json"))
+    parser.add_argument("--compare", help="Previous results file to compare against")
+    parser.add_argument("--repeat", type=int, default=20, help="Iterations per micro-benchmark")
+    parser.add_argument("--requests", type=int, default=32, help="End-to-end requests per concurrency level")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrency levels")
+    parser.add_argument("--latency", type=float, default=0.5, help="Fake LLM mean latency (seconds)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Fake LLM latency standard deviation")
+    parser.add_argument("--skip-e2e", action="store_true", help="Only run the micro-benchmarks")
+    parser.add_argument("--service-workers", type=int, default=0,
+                        help="Also load-test the HTTP service with this many workers")
+    args = parser.parse_args(argv)
+
+    results = {}
+    # The pipeline's own progress prints go to stderr so stdout is just the report
+    with contextlib.redirect_stdout(sys.stderr):
+        for name, bench in (("import", bench_import), ("pdf", bench_pdf), ("html", bench_html), ("prompt", bench_prompt), ("parse", bench_parse)):
+            print(f"Running {name} benchmarks...")
+            results.update(bench(args.repeat))
+        if not args.skip_e2e:
+            print("Running end-to-end benchmarks...")
+            levels = [int(c) for c in args.concurrency.split(",")]
+            results.update(bench_end_to_end(args.requests, levels, args.latency, args.jitter))
+            if args.service_workers:
+                print("Running HTTP service benchmarks...")
+                results.update(bench_service(args.requests, levels, args.latency, args.jitter, args.service_workers))
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    for name, stats in results.items():
+        extra = f"  {stats['throughput_rps']:.1f} req/s" if "throughput_rps" in stats else ""
+        print(f"{name:36} p50 {stats['p50_ms']:9.2f} ms  p95 {stats['p95_ms']:9.2f} ms{extra}")
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
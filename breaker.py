@@ -0,0 +1,72 @@
+import threading
+import time
+
+# Errors caused by the caller's key rather than the target
+CALLER_ERRORS = ("auth", "quota")
+
+
+def classify_error(error):
+    """Buckets a provider exception into 'auth', 'not_found', 'quota', 'overloaded' or 'error'."""
+    text = f"{type(error).__name__}: {error}".lower()
+    if ("401" in text or "403" in text or "unauthenticated" in text or "permissiondenied" in text
+            or "permission denied" in text or "authentication" in text or "api key not valid" in text
+            or "invalid api key" in text or "invalid x-api-key" in text):
+        return "auth"
+    if "404" in text or "notfound" in text or "not found" in text or "is not supported" in text:
+        return "not_found"
+    if "429" in text or "quota" in text or "resourceexhausted" in text or "rate limit" in text:
+        return "quota"
+    if "529" in text or "503" in text or "overloaded" in text or "unavailable" in text:
+        return "overloaded"
+    return "error"
+
+
+class CircuitBreaker:
+    """Remembers failing targets (e.g. (API key, model) pairs) so later requests skip them.
+
+    A deprecated / unknown model stays open for a long time, an overloaded
+    model for a short cool-down, and transient errors only open the circuit
+    after a few consecutive failures. Once the cool-down passes the target
+    is tried again. Auth and quota errors are the caller's (a bad key, a
+    spent allowance) and never open it.
+    """
+
+    def __init__(self, failure_threshold=3, cooldown_seconds=60, not_found_cooldown_seconds=6 * 3600,
+                 overloaded_cooldown_seconds=30):
+        self.failure_threshold = failure_threshold
+        self.cooldowns = {
+            "error": cooldown_seconds,
+            "not_found": not_found_cooldown_seconds,
+            "overloaded": overloaded_cooldown_seconds,
+        }
+        self._failures = {}
+        self._open_until = {}
+        self._lock = threading.Lock()
+
+    def allow(self, name):
+        """True if the circuit for name is closed (or its cool-down has passed)."""
+        with self._lock:
+            return self._open_until.get(name, 0) <= time.time()
+
+    def record_success(self, name):
+        with self._lock:
+            self._failures.pop(name, None)
+            self._open_until.pop(name, None)
+
+    def record_failure(self, name, error):
+        """Counts a failure and opens the circuit when the kind of error warrants it."""
+        kind = classify_error(error)
+        if kind in CALLER_ERRORS:
+            return kind
+        with self._lock:
+            count = self._failures.get(name, 0) + 1
+            self._failures[name] = count
+            if kind != "error" or count >= self.failure_threshold:
+                self._open_until[name] = time.time() + self.cooldowns[kind]
+        return kind
+
+    def state(self):
+        """Returns {name: seconds until retry} for every open circuit."""
+        now = time.time()
+        with self._lock:
+            return {name: round(until - now, 1) for name, until in self._open_until.items() if until > now}
@@ -0,0 +1,241 @@
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Default location of the shared on-disk cache. Point every Streamlit
+# session / replica at the same file to share results between them.
+# Set CV_MATCHER_CACHE_PATH to an empty string to disable the disk tier.
+DEFAULT_CACHE_PATH = os.getenv(
+    "CV_MATCHER_CACHE_PATH",
+    os.path.join(os.path.expanduser("~"), ".cv_matcher", "cache.sqlite3"),
+)
+
+
+def make_key(*parts):
+    """Builds a stable content hash from any JSON-serialisable parts."""
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def normalise_text(text):
+    """Collapses whitespace so trivial formatting changes still hit the cache."""
+    return " ".join((text or "").split())
+
+
+class ResultCache:
+    """Two-tier cache: an in-process LRU in front of a shared SQLite store.
+
+    Values are stored as JSON so every hit returns a fresh copy that callers
+    are free to mutate.
+    """
+
+    def __init__(self, namespace="analysis", path=DEFAULT_CACHE_PATH,
+                 max_memory_items=256, ttl_seconds=7 * 24 * 3600,
+                 max_disk_bytes=50 * 1024 * 1024):
+        self.namespace = namespace
+        self.path = path
+        self.max_memory_items = max_memory_items
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_bytes = max_disk_bytes
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+        if self.path:
+            try:
+                self._init_db()
+            except Exception as e:
+                # The memory tier still works without a writable disk location
+                print(f"Disk cache disabled ({self.path}): {e}")
+                self.path = None
+
+    # -- SQLite tier -------------------------------------------------------
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """Connection that commits on success and is always closed.
+
+        sqlite3's own context manager only commits; the connection would stay
+        open until garbage collection.
+        """
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS entries (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (namespace, accessed)")
+
+    def _disk_get(self, key):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, created FROM entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+            if row is None:
+                return None
+            value, created = row
+            if self.ttl_seconds and now - created > self.ttl_seconds:
+                conn.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (self.namespace, key))
+                return None
+            conn.execute(
+                "UPDATE entries SET accessed = ? WHERE namespace = ? AND key = ?",
+                (now, self.namespace, key),
+            )
+            return value
+
+    def _disk_set(self, key, value):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, size, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (self.namespace, key, value, len(value), now, now),
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        # Drop expired entries first, then least recently used until under budget
+        if self.ttl_seconds:
+            cur = conn.execute(
+                "DELETE FROM entries WHERE namespace = ? AND created < ?",
+                (self.namespace, now - self.ttl_seconds),
+            )
+            self._count_evictions(max(cur.rowcount, 0))
+
+        if not self.max_disk_bytes:
+            return
+        total = conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries WHERE namespace = ?", (self.namespace,)
+        ).fetchone()[0]
+        if total <= self.max_disk_bytes:
+            return
+        rows = conn.execute(
+            "SELECT key, size FROM entries WHERE namespace = ? ORDER BY accessed ASC", (self.namespace,)
+        ).fetchall()
+        evicted = 0
+        for key, size in rows:
+            if total <= self.max_disk_bytes:
+                break
+            conn.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (self.namespace, key))
+            total -= size
+            evicted += 1
+        self._count_evictions(evicted)
+
+    def _count_evictions(self, count):
+        with self._lock:
+            self._stats["evictions"] += count
+
+    # -- Public API --------------------------------------------------------
+
+    def get(self, key):
+        """Returns the cached value for key, or None on a miss."""
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                expires, raw = value
+                if not expires or expires > time.time():
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return json.loads(raw)
+                del self._memory[key]
+
+        raw = None
+        if self.path:
+            try:
+                raw = self._disk_get(key)
+            except Exception as e:
+                print(f"Disk cache read failed: {e}")
+
+        with self._lock:
+            if raw is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["disk_hits"] += 1
+            self._remember(key, raw)
+        return json.loads(raw)
+
+    def set(self, key, value):
+        """Stores a JSON-serialisable value in both tiers."""
+        raw = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._remember(key, raw)
+            self._stats["writes"] += 1
+        if self.path:
+            try:
+                self._disk_set(key, raw)
+            except Exception as e:
+                print(f"Disk cache write failed: {e}")
+
+    def _remember(self, key, raw):
+        expires = time.time() + self.ttl_seconds if self.ttl_seconds else 0
+        self._memory[key] = (expires, raw)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def clear(self):
+        """Empties both tiers for this namespace."""
+        with self._lock:
+            self._memory.clear()
+        if self.path:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM entries WHERE namespace = ?", (self.namespace,))
+
+    def stats(self):
+        """Returns hit/miss counters plus current tier sizes."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_items"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        if self.path:
+            try:
+                with self._connect() as conn:
+                    count, size = conn.execute(
+                        "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries WHERE namespace = ?",
+                        (self.namespace,),
+                    ).fetchone()
+                stats["disk_items"] = count
+                stats["disk_bytes"] = size
+            except Exception:
+                pass
+        return stats
+
+
+# Shared result cache for analyze_cv / analyze_cv_claude
+RESULT_CACHE = ResultCache("analysis")
+
+# Extracted CV text keyed by a hash of the uploaded PDF bytes
+PDF_TEXT_CACHE = ResultCache("pdf_text", max_memory_items=64)
+
+# Raw job pages with their HTTP validators (see fetch.py)
+HTTP_CACHE = ResultCache("http", max_memory_items=64, max_disk_bytes=200 * 1024 * 1024)
+
+# Cleaned job text keyed by canonical URL; postings rarely change within the hour
+URL_TEXT_CACHE = ResultCache("url_text", ttl_seconds=3600)
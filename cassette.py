@@ -0,0 +1,205 @@
+import json
+import os
+import random
+import threading
+import time
+
+from cache import make_key
+
+# Record provider calls to this JSON-lines file, or replay them from it
+CASSETTE_PATH = os.getenv("CV_MATCHER_CASSETTE", "")
+CASSETTE_MODE = os.getenv("CV_MATCHER_CASSETTE_MODE", "replay")
+
+# Replayed latency: "recorded" (the matched call's own), "sampled" (drawn from
+# every call recorded with the same system prompt) or "none"
+CASSETTE_LATENCY = os.getenv("CV_MATCHER_CASSETTE_LATENCY", "recorded")
+CASSETTE_LATENCY_SCALE = float(os.getenv("CV_MATCHER_CASSETTE_LATENCY_SCALE", "1"))
+
+# "exact" only replays calls with the same model, prompts and output limit;
+# "any" falls back to a random call recorded with the same system prompt,
+# so inputs never seen while recording can still be replayed
+CASSETTE_MATCH = os.getenv("CV_MATCHER_CASSETTE_MATCH", "any")
+
+# Pieces a replayed stream is cut into when the recording has no chunk count
+DEFAULT_STREAM_CHUNKS = 20
+
+
+class CassetteMiss(LookupError):
+    """No recorded call matches a replayed request."""
+
+
+class Cassette:
+    """Records provider calls (response text, token usage, latency) and replays them.
+
+    Calls are matched on a hash of provider, model, system prompt, user prompt
+    and output limit; prompts themselves are not stored. Responses are, and
+    they quote the CV, so treat cassette files like the CVs they came from.
+    """
+
+    def __init__(self, path, mode=CASSETTE_MODE, latency=CASSETTE_LATENCY, match=CASSETTE_MATCH,
+                 latency_scale=CASSETTE_LATENCY_SCALE):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.match = match
+        self.latency_scale = latency_scale
+        self._entries = None
+        self._by_key = {}
+        self._by_system = {}
+        self._lock = threading.Lock()
+        self._rng = random.Random()
+        self._stats = {"recorded": 0, "replayed": 0, "fallback": 0, "missed": 0}
+
+    @property
+    def replaying(self):
+        return self.mode == "replay"
+
+    @staticmethod
+    def _key(provider, model, system, prompt, max_tokens):
+        return make_key(provider, model, system, prompt, max_tokens)
+
+    # -- Storage -------------------------------------------------------------
+
+    def _load(self):
+        if self._entries is not None:
+            return
+        self._entries = []
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self._entries.append(json.loads(line))
+        except FileNotFoundError:
+            print(f"Cassette {self.path} not found; nothing to replay")
+        for entry in self._entries:
+            self._by_key.setdefault(entry["key"], []).append(entry)
+            self._by_system.setdefault((entry["provider"], entry["system"]), []).append(entry)
+        print(f"Loaded {len(self._entries)} recorded calls from {self.path}")
+
+    def _append(self, entry):
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+            self._stats["recorded"] += 1
+
+    def models(self, provider):
+        """Models recorded for a provider, most used first (replay stands in for model discovery)."""
+        with self._lock:
+            self._load()
+            counts = {}
+            for entry in self._entries:
+                if entry["provider"] == provider:
+                    counts[entry["model"]] = counts.get(entry["model"], 0) + 1
+        return sorted(counts, key=counts.get, reverse=True)
+
+    # -- Replay --------------------------------------------------------------
+
+    def _lookup(self, provider, model, system, prompt, max_tokens):
+        key = self._key(provider, model, system, prompt, max_tokens)
+        system_key = make_key(system)
+        with self._lock:
+            self._load()
+            matches = self._by_key.get(key)
+            similar = self._by_system.get((provider, system_key), [])
+            if matches:
+                self._stats["replayed"] += 1
+                entry = self._rng.choice(matches)
+            elif self.match == "any" and similar:
+                self._stats["fallback"] += 1
+                entry = self._rng.choice(similar)
+            else:
+                self._stats["missed"] += 1
+                raise CassetteMiss(f"No recorded {provider} call for model {model} (key {key[:12]})")
+            if self.latency == "sampled" and similar:
+                latency = self._rng.choice(similar)
+            else:
+                latency = entry
+        if self.latency == "none":
+            return entry, 0.0, 0.0
+        return entry, latency["latency"] * self.latency_scale, latency.get("first_token", latency["latency"]) * self.latency_scale
+
+    # -- Calls ---------------------------------------------------------------
+
+    def call(self, provider, model, system, prompt, max_tokens, send):
+        """Runs send() -> (text, usage), recording it, or replays a recorded call instead."""
+        if self.replaying:
+            entry, latency, _ = self._lookup(provider, model, system, prompt, max_tokens)
+            time.sleep(latency)
+            return entry["text"], dict(entry["usage"])
+
+        started = time.perf_counter()
+        text, usage = send()
+        latency = time.perf_counter() - started
+        self._append({
+            "provider": provider,
+            "model": model,
+            "key": self._key(provider, model, system, prompt, max_tokens),
+            "system": make_key(system),
+            "text": text,
+            "usage": usage,
+            "latency": round(latency, 4),
+            "recorded": time.time(),
+        })
+        return text, usage
+
+    def stream(self, provider, model, system, prompt, max_tokens, send):
+        """Streaming counterpart of call: yields text chunks and returns the usage.
+
+        send() must be a generator yielding text chunks and returning the usage.
+        Replayed streams wait for the recorded time to first token and spread
+        the remaining chunks over the rest of the recorded latency.
+        """
+        if self.replaying:
+            entry, latency, first_token = self._lookup(provider, model, system, prompt, max_tokens)
+            text = entry["text"]
+            count = max(1, min(entry.get("chunks", DEFAULT_STREAM_CHUNKS), len(text)))
+            # An empty (refused) completion is a valid recording: it replays as no chunks
+            size = max(1, -(-len(text) // count))
+            time.sleep(first_token)
+            gap = max(latency - first_token, 0.0) / count
+            for i in range(0, len(text), size):
+                if i:
+                    time.sleep(gap)
+                yield text[i:i + size]
+            return dict(entry["usage"])
+
+        started = time.perf_counter()
+        first_token = None
+        parts = []
+        chunks = send()
+        while True:
+            try:
+                chunk = next(chunks)
+            except StopIteration as stop:
+                usage = stop.value
+                break
+            if first_token is None:
+                first_token = time.perf_counter() - started
+            parts.append(chunk)
+            yield chunk
+        latency = time.perf_counter() - started
+        self._append({
+            "provider": provider,
+            "model": model,
+            "key": self._key(provider, model, system, prompt, max_tokens),
+            "system": make_key(system),
+            "text": "".join(parts),
+            "usage": usage,
+            "latency": round(latency, 4),
+            "first_token": round(first_token if first_token is not None else latency, 4),
+            "chunks": len(parts),
+            "recorded": time.time(),
+        })
+        return usage
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+
+CASSETTE = Cassette(CASSETTE_PATH) if CASSETTE_PATH else None
@@ -0,0 +1,101 @@
+import os
+import threading
+import time
+
+from cache import make_key
+
+# Point the Gemini SDK at a local stand-in of the API (the Anthropic SDK
+# already honours ANTHROPIC_BASE_URL)
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
+
+# Clients unused for this long are closed and dropped
+CLIENT_IDLE_SECONDS = int(os.getenv("CV_MATCHER_CLIENT_IDLE_SECONDS", "900"))
+
+
+def _close(client):
+    try:
+        if hasattr(client, "close"):
+            client.close()
+        elif hasattr(client, "clients"):
+            # Gemini client manager: close each underlying service client
+            for service in client.clients.values():
+                service.transport.close()
+    except Exception as e:
+        print(f"Closing idle client failed: {e}")
+
+
+class ClientRegistry:
+    """Long-lived provider clients keyed by (provider, API key hash).
+
+    Clients keep their HTTP/gRPC connections warm between analyses and are
+    shared by every Streamlit session using the same key. Entries idle for
+    longer than idle_seconds are closed on the next lookup.
+    """
+
+    def __init__(self, idle_seconds=CLIENT_IDLE_SECONDS):
+        self.idle_seconds = idle_seconds
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._stats = {"created": 0, "reused": 0, "evicted": 0}
+
+    def get(self, provider, api_key, factory):
+        """Returns the client for (provider, api_key), creating it with factory(api_key) if needed."""
+        key = (provider, make_key(api_key))
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = {"client": factory(api_key), "last_used": now}
+                self._stats["created"] += 1
+            else:
+                self._stats["reused"] += 1
+            entry["last_used"] = now
+            return entry["client"]
+
+    def _evict_idle(self, now):
+        for key, entry in list(self._entries.items()):
+            if now - entry["last_used"] > self.idle_seconds:
+                del self._entries[key]
+                self._stats["evicted"] += 1
+                _close(entry["client"])
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, live=len(self._entries))
+
+
+REGISTRY = ClientRegistry()
+_gemini_services_lock = threading.Lock()
+
+
+def _make_gemini_manager(api_key):
+    # A private client manager per key, so sessions with different keys never
+    # race on the SDK's process-wide genai.configure()
+    from google.generativeai import client as genai_client
+
+    manager = genai_client._ClientManager()
+    options = {"api_key": api_key}
+    if GEMINI_API_ENDPOINT:
+        options["client_options"] = {"api_endpoint": GEMINI_API_ENDPOINT}
+        options["transport"] = "rest"
+    manager.configure(**options)
+    return manager
+
+
+def _make_anthropic_client(api_key):
+    import anthropic
+
+    return anthropic.Anthropic(api_key=api_key)
+
+
+def anthropic_client(api_key):
+    """Shared Anthropic client for this key."""
+    return REGISTRY.get("claude", api_key, _make_anthropic_client)
+
+
+def gemini_service(api_key, name):
+    """Shared Gemini service client ("generative", "model", ...) for this key."""
+    manager = REGISTRY.get("gemini", api_key, _make_gemini_manager)
+    with _gemini_services_lock:
+        return manager.get_default_client(name)
@@ -0,0 +1,209 @@
+import os
+import re
+
+# Per-side token budgets for the prompt (CV / job text)
+CV_TOKEN_BUDGET = int(os.getenv("CV_MATCHER_CV_TOKEN_BUDGET", "6000"))
+JOB_TOKEN_BUDGET = int(os.getenv("CV_MATCHER_JOB_TOKEN_BUDGET", "4000"))
+
+# Headings after which job pages only list other postings or footers
+TRAILER_RE = re.compile(
+    r"^(similar jobs|people also viewed|more jobs|jobs you may like|recommended jobs|related jobs|"
+    r"other jobs|explore (more|similar)|similar searches|people also searched)",
+    re.IGNORECASE,
+)
+
+# Words that mark the body of a job description
+CORE_RE = re.compile(
+    r"responsibilit|requirement|qualification|experience|skills?\b|you will|you'll|about (the|this) (role|job|position)|"
+    r"what you|we are looking|we're looking|the role|job description|duties|must have|nice to have|"
+    r"benefits|salary|knowledge of|proficien|degree",
+    re.IGNORECASE,
+)
+
+# Lines of at most this many words (or starting with a bullet) under a core
+# heading are list items, each worth a little to the core
+LIST_ITEM_WORDS = 6
+LIST_ITEM_SCORE = 0.5
+BULLET_RE = re.compile(r"^[-•*·–▪◦]\s")
+
+
+def estimate_tokens(text):
+    """Rough token count without a tokenizer (about 4 characters or 0.75 words per token)."""
+    if not text:
+        return 0
+    return int(round(max(len(text) / 4.0, len(text.split()) * 1.33)))
+
+
+# "Page 2 of 3" style counters, dropped wherever they appear
+PAGE_NUMBER_RE = re.compile(r"^(page\s*\d{1,3}(\s*(of|/)\s*\d{1,3})?|\d{1,3}\s*(of|/)\s*\d{1,3})$", re.IGNORECASE)
+# The same counter at the end of a header line ("J. Smith - CV - Page 2 of 3"); the rest of
+# the line is then an exact repeat
+PAGE_COUNTER_RE = re.compile(r"[\s\-–|·,]*\bpage\s*\d{1,3}\s*(of|/)\s*\d{1,3}\s*$", re.IGNORECASE)
+
+# Lines at the top and bottom of a page that can be a running header or footer
+PAGE_EDGE_LINES = 2
+
+# CV lines this short are kept even when repeated
+SHORT_REPEAT_WORDS = 3
+
+
+def _line_key(line):
+    return " ".join(line.lower().split())
+
+
+def _masked(key):
+    return re.sub(r"\d+", "#", key)
+
+
+def _running_lines(pages):
+    """(edge, key) of lines at the top or bottom of most pages (running headers and footers).
+
+    Digits are ignored only for this comparison, so "J. Smith - CV - 2" on
+    every page counts as one header; a line is only ever dropped at the
+    same edge of a page.
+    """
+    if len(pages) < 2:
+        return set()
+    counts = {}
+    for page in pages:
+        lines = [_masked(line) for line in (_line_key(line) for line in page) if line]
+        edges = {("top", key) for key in lines[:PAGE_EDGE_LINES]}
+        edges |= {("bottom", key) for key in lines[-PAGE_EDGE_LINES:]}
+        for edge in edges:
+            counts[edge] = counts.get(edge, 0) + 1
+    return {edge for edge, count in counts.items() if count > len(pages) / 2}
+
+
+def clean_lines(text, drop_repeats=False):
+    """Collapses whitespace and drops blank and repeated lines.
+
+    Only exact repeats, page counters and running page headers/footers
+    (pages are separated by form feeds, see utils.extract_pdf) are dropped;
+    lines that differ in a date or figure are always kept. Short lines are
+    kept even when repeated unless drop_repeats is set (job pages, where
+    they are menus). Page chrome is removed when the page is scraped (see
+    jobpage.py), never here, so pasted job text keeps every line.
+    """
+    pages = [page.splitlines() for page in (text or "").split("\f")]
+    running = _running_lines(pages)
+    seen = set()
+    seen_running = set()
+    lines = []
+    for page in pages:
+        page = [line for line in (" ".join(line.split()) for line in page) if line]
+        for i, line in enumerate(page):
+            if PAGE_NUMBER_RE.match(line):
+                continue
+            header = PAGE_COUNTER_RE.sub("", line)
+            counted, line = header != line, header or line
+            key = _line_key(line)
+            edge = ("top" if i < PAGE_EDGE_LINES else "bottom" if i >= len(page) - PAGE_EDGE_LINES else None,
+                    _masked(key))
+            if edge in running:
+                # The first copy of a running header is kept (it is often the name)
+                if edge in seen_running:
+                    continue
+                seen_running.add(edge)
+            # Short lines repeat legitimately in a CV (the same job title at two
+            # employers); on job pages repeated menus are chrome
+            if key in seen and (drop_repeats or counted or len(line.split()) > SHORT_REPEAT_WORDS):
+                continue
+            seen.add(key)
+            lines.append(line)
+    return lines
+
+
+def job_core(lines):
+    """Keeps the contiguous block of lines that looks most like the job description.
+
+    Each line scores positively for length and description vocabulary and
+    negatively when it is a short menu-style fragment; the best-scoring run
+    (maximum subarray) is the core. Short lines under a core heading
+    ("Requirements" followed by one skill per line) are list items, not
+    menus, and the core always runs to the end of the last such section.
+    Anything after a "similar jobs" style heading is dropped first, and a
+    few lines above the core are kept for the title.
+    """
+    for i, line in enumerate(lines):
+        if i > 0 and TRAILER_RE.match(line):
+            lines = lines[:i]
+            break
+
+    # Pasted descriptions are already the core; only scraped pages need trimming
+    if len(lines) < 15:
+        return lines
+
+    best_sum, best = float("-inf"), (0, len(lines))
+    running, start = 0.0, 0
+    in_list, core_end = False, 0
+    for i, line in enumerate(lines):
+        words = len(line.split())
+        short = words <= LIST_ITEM_WORDS or BULLET_RE.match(line)
+        if short and CORE_RE.search(line):
+            # A core heading: the short lines below it are its list
+            in_list = True
+        elif not short:
+            in_list = False
+        if in_list:
+            score = 3.0 if CORE_RE.search(line) else LIST_ITEM_SCORE
+            core_end = i + 1
+        else:
+            score = min(words, 40) / 8.0 - 1.0
+            if CORE_RE.search(line):
+                score += 3.0
+        if running <= 0:
+            running, start = 0.0, i
+        running += score
+        if running > best_sum:
+            best_sum, best = running, (start, i + 1)
+
+    # The job title and company usually sit just above the first long paragraph
+    return lines[max(best[0] - 3, 0):max(best[1], core_end)]
+
+
+def fit_budget(lines, budget):
+    """Keeps leading lines until the token budget is spent."""
+    kept = []
+    used = 0
+    for line in lines:
+        cost = estimate_tokens(line) + 1
+        if used + cost > budget:
+            remaining = budget - used
+            if remaining > 20:
+                # Cut the last line on a word boundary rather than dropping it whole
+                words = line.split()[:int(remaining / 1.33)]
+                kept.append(" ".join(words) + " …")
+            break
+        kept.append(line)
+        used += cost
+    return kept
+
+
+def compact_cv(text, budget=CV_TOKEN_BUDGET):
+    """Removes repeated page headers / blank lines and trims the CV to budget."""
+    return "\n".join(fit_budget(clean_lines(text), budget))
+
+
+def compact_job(text, budget=JOB_TOKEN_BUDGET):
+    """Drops repeated menu lines, keeps the job-description core and trims it to budget."""
+    return "\n".join(fit_budget(job_core(clean_lines(text, drop_repeats=True)), budget))
+
+
+def compact_inputs(cv_text, job_text, cv_budget=CV_TOKEN_BUDGET, job_budget=JOB_TOKEN_BUDGET):
+    """Compacts both sides of the prompt.
+
+    Returns (cv_text, job_text, stats) where stats reports estimated tokens
+    before and after and the tokens saved.
+    """
+    compact_cv_text = compact_cv(cv_text, cv_budget)
+    compact_job_text = compact_job(job_text, job_budget)
+    before = estimate_tokens(cv_text) + estimate_tokens(job_text)
+    after = estimate_tokens(compact_cv_text) + estimate_tokens(compact_job_text)
+    stats = {
+        "cv_tokens": estimate_tokens(compact_cv_text),
+        "job_tokens": estimate_tokens(compact_job_text),
+        "tokens_before": before,
+        "tokens_after": after,
+        "tokens_saved": max(before - after, 0),
+    }
+    return compact_cv_text, compact_job_text, stats
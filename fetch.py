@@ -0,0 +1,174 @@
+import base64
+import email.utils
+import ipaddress
+import socket
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+from cache import HTTP_CACHE
+
+# Query parameters of known click trackers (plus utm_*). Generic names such as
+# "ref", "src", "from" or "sid" are kept: some job boards use them to pick the posting
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "gbraid", "wbraid", "dclid", "msclkid", "yclid", "twclid", "ttclid", "li_fat_id",
+    "mc_cid", "mc_eid", "_hsenc", "_hsmi", "trk", "trkinfo", "trackingid", "lipi",
+}
+
+USER_AGENT = "Mozilla/5.0 (compatible; CVMatcher/1.0)"
+
+# Redirects followed by hand when every hop has to be checked (public_only)
+MAX_REDIRECTS = 5
+
+
+class UnsafeURL(ValueError):
+    """A URL the server must not fetch for a caller (not http(s), or an internal address)."""
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def canonical_url(url):
+    """Normalises a URL so the same posting shared with different tracking tags maps to one key."""
+    parts = urlsplit(url.strip())
+    query = [
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in TRACKING_PARAMS and not k.lower().startswith("utm_")
+    ]
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, urlencode(sorted(query)), ""))
+
+
+def check_public_url(url):
+    """Raises UnsafeURL unless url is http(s) and every address its host resolves to is public.
+
+    Loopback, private, link-local (cloud metadata) and other non-global
+    addresses are refused, so callers cannot make the server reach its own
+    network.
+    """
+    parts = urlsplit(url.strip())
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise UnsafeURL(f"Only http(s) URLs can be fetched: {url!r}")
+    try:
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        infos = socket.getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM)
+    except (OSError, ValueError) as e:
+        raise UnsafeURL(f"Cannot resolve {parts.hostname}: {e}")
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%")[0])
+        if getattr(address, "ipv4_mapped", None):
+            address = address.ipv4_mapped
+        if not address.is_global:
+            raise UnsafeURL(f"{parts.hostname} resolves to a non-public address ({address})")
+
+
+def get_session():
+    """Returns the process-wide pooled requests.Session (keep-alive across calls)."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            # Imported here so processes that never fetch a URL do not pay for requests
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+
+            session = requests.Session()
+            retry = Retry(total=2, backoff_factor=0.3, status_forcelist=(502, 503, 504), allowed_methods=("GET",))
+            adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=retry)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers["User-Agent"] = USER_AGENT
+            _session = session
+        return _session
+
+
+def _cache_control(headers):
+    directives = {}
+    for item in headers.get("Cache-Control", "").split(","):
+        name, _, value = item.strip().partition("=")
+        if name:
+            directives[name.lower()] = value.strip('"')
+    return directives
+
+
+def _fresh_until(headers, now):
+    """Works out how long a response may be served without revalidation."""
+    directives = _cache_control(headers)
+    if "no-cache" in directives or ("must-revalidate" in directives and "max-age" not in directives):
+        return now
+    if "max-age" in directives:
+        try:
+            return now + int(directives["max-age"]) - int(headers.get("Age", 0) or 0)
+        except ValueError:
+            return now
+    expires = headers.get("Expires")
+    if expires:
+        # Invalid dates such as "0" or "-1" mean already expired
+        return email.utils.parsedate_to_datetime(expires).timestamp() if _is_http_date(expires) else now
+    last_modified = headers.get("Last-Modified")
+    if last_modified and _is_http_date(last_modified):
+        # Heuristic freshness: 10% of the document's age, capped at a day
+        age = now - email.utils.parsedate_to_datetime(last_modified).timestamp()
+        return now + min(max(age, 0) * 0.1, 24 * 3600)
+    return now
+
+
+def _is_http_date(value):
+    return email.utils.parsedate_tz(value) is not None
+
+
+def _get(url, headers, timeout, public_only):
+    if not public_only:
+        return get_session().get(url, headers=headers, timeout=timeout)
+    # Each redirect target is checked too; a public page may redirect inwards
+    for _ in range(MAX_REDIRECTS + 1):
+        check_public_url(url)
+        response = get_session().get(url, headers=headers, timeout=timeout, allow_redirects=False)
+        if not response.is_redirect:
+            return response
+        url = urljoin(url, response.headers["Location"])
+    raise UnsafeURL(f"More than {MAX_REDIRECTS} redirects")
+
+
+def fetch_url(url, timeout=10, public_only=False):
+    """GETs url through the pooled session, honouring ETag / Last-Modified / Cache-Control.
+
+    Returns the response body as bytes. Fresh responses are served from the
+    on-disk HTTP cache without touching the network; stale ones are
+    revalidated with a conditional GET. With public_only (URLs from remote
+    callers) the URL and every redirect must pass check_public_url.
+    """
+    key = canonical_url(url)
+    now = time.time()
+    entry = HTTP_CACHE.get(key)
+    if entry is not None and entry["fresh_until"] > now:
+        return base64.b64decode(entry["body"])
+
+    headers = {}
+    if entry is not None:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    response = _get(url, headers, timeout, public_only)
+
+    if response.status_code == 304 and entry is not None:
+        entry["fresh_until"] = _fresh_until(response.headers, now)
+        HTTP_CACHE.set(key, entry)
+        return base64.b64decode(entry["body"])
+
+    response.raise_for_status()
+
+    directives = _cache_control(response.headers)
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    fresh_until = _fresh_until(response.headers, now)
+    if "no-store" not in directives and (etag or last_modified or fresh_until > now):
+        HTTP_CACHE.set(key, {
+            "body": base64.b64encode(response.content).decode("ascii"),
+            "etag": etag,
+            "last_modified": last_modified,
+            "fresh_until": fresh_until,
+        })
+    return response.content
@@ -0,0 +1,225 @@
+import asyncio
+import contextvars
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+import utils
+from result import AnalysisResult
+
+# Seconds to wait for the primary provider before firing the backup. When
+# enough latencies have been observed the primary's rolling p95 is used
+# instead, if it is shorter.
+HEDGE_DELAY_SECONDS = float(os.getenv("CV_MATCHER_HEDGE_DELAY", "10"))
+
+# Hedge the app's and the service's analyses too (batch.py has --hedge)
+HEDGE_INTERACTIVE = os.getenv("CV_MATCHER_HEDGE", "0") != "0"
+
+# Number of recent latencies kept per provider for the p95
+LATENCY_WINDOW = 200
+MIN_SAMPLES_FOR_P95 = 20
+
+_latencies = {}
+_stats = {}
+_lock = threading.Lock()
+
+
+def is_valid_result(result):
+    """A response counts as an answer if it parsed into a result with a score."""
+    return isinstance(result, AnalysisResult) and result.match_score is not None
+
+
+def other_provider(provider):
+    return "claude" if provider == "gemini" else "gemini"
+
+
+def _provider_stats(provider):
+    return _stats.setdefault(provider, {
+        "requests": 0, "hedged": 0, "attempts": 0, "wins": 0, "failures": 0, "cancelled": 0,
+    })
+
+
+def _record_latency(provider, seconds):
+    with _lock:
+        _latencies.setdefault(provider, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+
+def p95(provider):
+    """Rolling p95 latency of successful calls, or None without enough samples."""
+    with _lock:
+        samples = sorted(_latencies.get(provider, ()))
+    if len(samples) < MIN_SAMPLES_FOR_P95:
+        return None
+    return samples[min(int(len(samples) * 0.95), len(samples) - 1)]
+
+
+def hedge_delay(provider, configured=None):
+    """Delay before hedging: the configured delay, tightened to the observed p95."""
+    delay = HEDGE_DELAY_SECONDS if configured is None else configured
+    observed = p95(provider)
+    return min(delay, observed) if observed is not None else delay
+
+
+class _Attempt:
+    """One provider's streamed analysis, read on its own thread into a shared queue.
+
+    cancel() makes the thread stop reading and close the stream at its next
+    chunk, which closes the provider's HTTP response instead of letting the
+    losing call run to the end.
+    """
+
+    def __init__(self, provider, cv_text, job_text, api_key, events):
+        self.provider = provider
+        self.started = time.perf_counter()
+        self._cancelled = threading.Event()
+        self._stream = utils.STREAMING_PROVIDERS[provider](cv_text, job_text, api_key)
+        # Rate-limit caller and request log follow the attempt onto its thread
+        context = contextvars.copy_context()
+        threading.Thread(target=context.run, args=(self._run, events), name=f"hedge-{provider}", daemon=True).start()
+
+    def _run(self, events):
+        try:
+            for field, value in self._stream:
+                if self._cancelled.is_set():
+                    return
+                events.put((self, field, value))
+                if field is None:
+                    return
+        except Exception as e:
+            events.put((self, None, {"error": f"{self.provider} failed: {e}"}))
+        finally:
+            self._stream.close()
+
+    def cancel(self):
+        self._cancelled.set()
+
+
+def _race(cv_text, job_text, api_keys, primary, delay, commit_on_field):
+    """(field, value) of the winning provider, then (None, result).
+
+    With commit_on_field the first provider to stream a field wins (its
+    fields are already on screen, so it is never swapped out); otherwise the
+    first valid result does.
+    """
+    backup = other_provider(primary)
+    can_hedge = bool(api_keys.get(backup))
+    events = queue.Queue()
+
+    with _lock:
+        _provider_stats(primary)["requests"] += 1
+        _provider_stats(primary)["attempts"] += 1
+
+    attempts = [_Attempt(primary, cv_text, job_text, api_keys[primary], events)]
+    winner = None
+    hedged = False
+    last_result = None
+    deadline = time.monotonic() + hedge_delay(primary, delay) if can_hedge else None
+
+    try:
+        while attempts:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                attempt, field, value = events.get(timeout=timeout)
+            except queue.Empty:
+                attempt, field, value = None, None, None
+            if attempt is not None and attempt not in attempts:
+                # Late output of a cancelled attempt
+                continue
+
+            if field is not None:
+                if winner is None and commit_on_field:
+                    winner, deadline = attempt, None
+                    for other in attempts:
+                        if other is not winner:
+                            other.cancel()
+                            with _lock:
+                                _provider_stats(other.provider)["cancelled"] += 1
+                    attempts = [winner]
+                if attempt is winner:
+                    yield field, value
+                continue
+
+            if attempt is not None:
+                attempts.remove(attempt)
+                if is_valid_result(value):
+                    _record_latency(attempt.provider, time.perf_counter() - attempt.started)
+                    with _lock:
+                        _provider_stats(attempt.provider)["wins"] += 1
+                    yield None, value
+                    return
+                last_result = value
+                with _lock:
+                    _provider_stats(attempt.provider)["failures"] += 1
+                if attempt is winner:
+                    break
+
+            # Fire the backup once: the primary is slow (timeout) or has already failed
+            if can_hedge and not hedged and winner is None:
+                hedged = True
+                deadline = None
+                with _lock:
+                    _provider_stats(primary)["hedged"] += 1
+                    _provider_stats(backup)["attempts"] += 1
+                print(f"Hedging {primary} request with {backup}")
+                attempts.append(_Attempt(backup, cv_text, job_text, api_keys[backup], events))
+    finally:
+        # Stop the loser (or both, if the caller stopped reading)
+        for attempt in attempts:
+            attempt.cancel()
+            with _lock:
+                _provider_stats(attempt.provider)["cancelled"] += 1
+
+    yield None, last_result if last_result is not None else {"error": "No provider returned a result"}
+
+
+def stream_hedged(cv_text, job_text, api_keys, primary="gemini", delay=None):
+    """Streaming protocol of utils.analyze_cv_stream, hedged across both providers.
+
+    The primary starts alone; if it has streamed nothing after the hedge
+    delay, or it fails first, the other provider is asked too. The first
+    one to stream a field wins and the other's stream is closed. api_keys
+    maps provider name to key; without a key for the other provider this is
+    a plain stream from the primary.
+    """
+    return _race(cv_text, job_text, api_keys, primary, delay, commit_on_field=True)
+
+
+def analysis_stream(cv_text, job_text, provider, api_keys):
+    """The analysis stream interactive callers (app.py, service.py) read.
+
+    Hedged when CV_MATCHER_HEDGE is set and there is a key for the other
+    provider, else the provider's own stream.
+    """
+    if HEDGE_INTERACTIVE and api_keys.get(other_provider(provider)):
+        return stream_hedged(cv_text, job_text, api_keys, primary=provider)
+    return utils.STREAMING_PROVIDERS[provider](cv_text, job_text, api_keys[provider])
+
+
+def _final(events):
+    for field, value in events:
+        if field is None:
+            return value
+
+
+async def analyze_hedged(cv_text, job_text, api_keys, primary="gemini", delay=None):
+    """Asks the primary provider and, if it is slow or fails, the other one too.
+
+    api_keys maps provider name to key; without a key for the other provider
+    this is a plain call to the primary. The first response that parses into
+    a valid result wins and the other provider's stream is closed. If
+    neither produces a valid result the last error is returned.
+    """
+    return await asyncio.to_thread(_final, _race(cv_text, job_text, api_keys, primary, delay, commit_on_field=False))
+
+
+def hedging_stats():
+    """Per-provider counts plus hedge rate (as primary) and win rate (per attempt)."""
+    with _lock:
+        stats = {provider: dict(counts) for provider, counts in _stats.items()}
+    for provider, counts in stats.items():
+        counts["hedge_rate"] = counts["hedged"] / counts["requests"] if counts["requests"] else 0.0
+        counts["win_rate"] = counts["wins"] / counts["attempts"] if counts["attempts"] else 0.0
+        counts["p95_seconds"] = p95(provider)
+    return stats
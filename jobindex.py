@@ -0,0 +1,272 @@
+import contextlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import deque
+
+import numpy as np
+
+from cache import DEFAULT_CACHE_PATH, make_key, normalise_text
+from compaction import CORE_RE, clean_lines, job_core
+
+# MinHash signature length and LSH banding (BANDS * ROWS == NUM_PERM). With
+# 16 bands of 8 rows, pairs above ~0.7 Jaccard almost always share a bucket.
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+
+# Word n-grams compared between job texts
+SHINGLE_SIZE = 3
+
+# Estimated Jaccard similarity above which two job texts are the same posting
+DUPLICATE_THRESHOLD = float(os.getenv("CV_MATCHER_JOB_DUPLICATE_THRESHOLD", "0.9"))
+
+# Texts with fewer shingles are too short to fingerprint reliably
+MIN_SHINGLES = 20
+
+# Most recent canonical postings kept in the index
+MAX_JOBS = int(os.getenv("CV_MATCHER_JOB_INDEX_SIZE", "20000"))
+
+WORD_RE = re.compile(r"\w+")
+
+# Sections about the employer rather than the role; one company's postings
+# share them word for word, so they are left out of the fingerprint
+EMPLOYER_RE = re.compile(
+    r"about (us|the company|our company|the team)|who we are|our (story|mission|values|culture)|benefits|perks|"
+    r"what we offer|why join|equal opportunit|diversity|inclusion|how to apply|application process",
+    re.IGNORECASE,
+)
+
+# Lines this short (without a full stop) are section headings
+HEADING_WORDS = 6
+
+TITLE_LABEL_RE = re.compile(r"^(?:job title|title|position|role)\s*:\s*(.+)$", re.IGNORECASE)
+
+# Largest prime below 2**32; (a * x + b) % PRIME stays within uint64
+_PRIME = np.uint64(4294967291)
+_rng = np.random.RandomState(1)
+_A = _rng.randint(1, 2**32 - 1, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.randint(0, 2**32 - 1, size=NUM_PERM, dtype=np.uint64)
+
+
+def shingles(text):
+    """Hashed word n-grams of a text (case and punctuation ignored)."""
+    words = WORD_RE.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return np.array([zlib.crc32(" ".join(words).encode())], dtype=np.uint64) if words else np.array([], np.uint64)
+    grams = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+    return np.fromiter((zlib.crc32(g.encode()) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+def minhash(hashes):
+    """MinHash signature (NUM_PERM uint32 values) of a set of shingle hashes."""
+    permuted = (_A[:, None] * hashes[None, :] + _B[:, None]) % _PRIME
+    return permuted.min(axis=1).astype(np.uint32)
+
+
+def job_title(lines):
+    """Normalised title of a posting: a "Job title:" line, else its first short line."""
+    for line in lines[:10]:
+        match = TITLE_LABEL_RE.match(line)
+        if match:
+            return " ".join(WORD_RE.findall(match.group(1).lower()))
+    for line in lines[:5]:
+        if len(line.split()) <= 12:
+            return " ".join(WORD_RE.findall(line.lower()))
+    return ""
+
+
+def role_text(lines):
+    """The role-specific part of a posting: its core without the employer sections."""
+    kept = []
+    employer = False
+    for line in job_core(lines):
+        if len(line.split()) <= HEADING_WORDS and not line.endswith("."):
+            if EMPLOYER_RE.search(line):
+                employer = True
+            elif CORE_RE.search(line):
+                employer = False
+        if not employer:
+            kept.append(line)
+    return "\n".join(kept)
+
+
+def similarity(signature_a, signature_b):
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    return float(np.mean(signature_a == signature_b))
+
+
+class JobIndex:
+    """Near-duplicate index of job texts (MinHash + LSH banding).
+
+    The first text seen for a posting becomes canonical; later texts with
+    the same title whose role text (see role_text) is estimated to be above
+    the threshold similar map to it, so reposts under other URLs can reuse
+    the canonical posting's cached analyses. Canonical texts are persisted
+    next to the result cache and reloaded on first use.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, threshold=DUPLICATE_THRESHOLD, max_jobs=MAX_JOBS):
+        self.path = path
+        self.threshold = threshold
+        self.max_jobs = max_jobs
+        self._signatures = {}
+        self._texts = {}
+        self._titles = {}
+        self._order = deque()
+        # Exact id of a near-duplicate text -> its canonical id
+        self._aliases = {}
+        self._buckets = [{} for _ in range(BANDS)]
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._stats = {"new": 0, "exact": 0, "near": 0, "skipped": 0}
+
+    # -- SQLite persistence ------------------------------------------------
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """Connection that commits on success and is always closed (see cache.ResultCache._connect)."""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _load(self):
+        self._loaded = True
+        if not self.path:
+            return
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with self._connect() as conn:
+                conn.execute(
+                    """CREATE TABLE IF NOT EXISTS job_roles (
+                        id TEXT PRIMARY KEY,
+                        signature BLOB NOT NULL,
+                        text TEXT NOT NULL,
+                        created REAL NOT NULL
+                    )"""
+                )
+                rows = conn.execute(
+                    "SELECT id, signature, text FROM job_roles ORDER BY created DESC LIMIT ?", (self.max_jobs,)
+                ).fetchall()
+        except Exception as e:
+            print(f"Job index persistence disabled ({self.path}): {e}")
+            self.path = None
+            return
+        for job_id, signature, text in reversed(rows):
+            self._insert(job_id, np.frombuffer(signature, dtype=np.uint32), text)
+
+    def _persist(self, job_id, signature, text):
+        if not self.path:
+            return
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO job_roles (id, signature, text, created) VALUES (?, ?, ?, ?)",
+                    (job_id, signature.tobytes(), text, time.time()),
+                )
+                if self._stats["new"] % 100 == 0:
+                    conn.execute(
+                        "DELETE FROM job_roles WHERE id NOT IN "
+                        "(SELECT id FROM job_roles ORDER BY created DESC LIMIT ?)",
+                        (self.max_jobs,),
+                    )
+        except Exception as e:
+            print(f"Job index write failed: {e}")
+
+    # -- Index -------------------------------------------------------------
+
+    @staticmethod
+    def _bands(signature):
+        return [signature[i * ROWS:(i + 1) * ROWS].tobytes() for i in range(BANDS)]
+
+    def _insert(self, job_id, signature, text):
+        self._signatures[job_id] = signature
+        self._texts[job_id] = text
+        self._titles[job_id] = job_title(clean_lines(text, drop_repeats=True))
+        self._order.append(job_id)
+        for bucket, band in zip(self._buckets, self._bands(signature)):
+            bucket.setdefault(band, set()).add(job_id)
+        while len(self._order) > self.max_jobs:
+            self._remove(self._order.popleft())
+
+    def _remove(self, job_id):
+        signature = self._signatures.pop(job_id)
+        self._texts.pop(job_id, None)
+        self._titles.pop(job_id, None)
+        for bucket, band in zip(self._buckets, self._bands(signature)):
+            ids = bucket.get(band)
+            if ids is not None:
+                ids.discard(job_id)
+                if not ids:
+                    del bucket[band]
+
+    def _nearest(self, signature, title):
+        candidates = set()
+        for bucket, band in zip(self._buckets, self._bands(signature)):
+            candidates.update(bucket.get(band, ()))
+        best, best_score = None, 0.0
+        for job_id in candidates:
+            # Different roles at one employer can share most of their text
+            if self._titles.get(job_id) != title:
+                continue
+            score = similarity(signature, self._signatures[job_id])
+            if score > best_score:
+                best, best_score = job_id, score
+        return best, best_score
+
+    def canonical(self, text):
+        """Returns (job_id, canonical_text, similarity) for a job text.
+
+        Near-duplicates of an indexed posting get that posting's id and text;
+        anything else is added as a new canonical posting. Texts without a
+        title or too short to fingerprint come back unchanged with a None id.
+        """
+        job_id = make_key(normalise_text(text))[:16]
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            if job_id in self._texts:
+                self._stats["exact"] += 1
+                return job_id, self._texts[job_id], 1.0
+            alias = self._aliases.get(job_id)
+            if alias is not None and alias[0] in self._texts:
+                self._stats["near"] += 1
+                return alias[0], self._texts[alias[0]], alias[1]
+
+        lines = clean_lines(text, drop_repeats=True)
+        title = job_title(lines)
+        hashes = shingles(role_text(lines))
+        if not title or len(hashes) < MIN_SHINGLES:
+            with self._lock:
+                self._stats["skipped"] += 1
+            return None, text, 0.0
+        signature = minhash(hashes)
+
+        with self._lock:
+            match, score = self._nearest(signature, title)
+            if match is not None and score >= self.threshold:
+                self._stats["near"] += 1
+                if len(self._aliases) >= self.max_jobs:
+                    self._aliases.clear()
+                self._aliases[job_id] = (match, score)
+                return match, self._texts[match], score
+            self._insert(job_id, signature, text)
+            self._stats["new"] += 1
+        self._persist(job_id, signature, text)
+        return job_id, text, 1.0
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, jobs=len(self._signatures))
+
+
+JOB_INDEX = JobIndex()
@@ -0,0 +1,260 @@
+import html
+import json
+import re
+
+from schema import load_json
+
+# Structured postings shorter than this are usually stubs; the page text is used instead
+MIN_POSTING_CHARS = 200
+
+JSONLD_RE = re.compile(
+    rb"<script\b[^>]*\btype\s*=\s*[\"']?application/ld\+json[^>]*>(.*?)</script\s*>", re.I | re.S
+)
+MICRODATA_RE = re.compile(rb"itemtype\s*=\s*[\"']?https?://schema\.org/JobPosting", re.I)
+
+LIST_ITEM_RE = re.compile(r"<\s*li\b[^>]*>", re.I)
+BLOCK_TAG_RE = re.compile(r"<\s*/?\s*(?:br|p|div|ul|ol|h[1-6]|tr|section)\b[^>]*>", re.I)
+TAG_RE = re.compile(r"<[^>]+>")
+
+# (JobPosting property, label); the description goes in unlabelled
+POSTING_FIELDS = [
+    ("title", "Job title"),
+    ("hiringOrganization", "Company"),
+    ("jobLocation", "Location"),
+    ("jobLocationType", "Location type"),
+    ("applicantLocationRequirements", "Applicants from"),
+    ("employmentType", "Employment type"),
+    ("baseSalary", "Salary"),
+    ("description", None),
+    ("responsibilities", "Responsibilities"),
+    ("qualifications", "Qualifications"),
+    ("skills", "Skills"),
+    ("experienceRequirements", "Experience"),
+    ("educationRequirements", "Education"),
+]
+
+ADDRESS_KEYS = ("streetAddress", "addressLocality", "addressRegion", "postalCode", "addressCountry")
+
+# Page furniture that is never part of the job description
+NOISE_TAGS = ["script", "style", "noscript", "template", "svg", "iframe"]
+CHROME_TAGS = ["nav", "header", "footer", "aside"]
+# Whole class / id tokens of page chrome ("cookie-banner", "related-jobs", but
+# not "job-related-skills")
+CHROME_TOKEN_RE = re.compile(
+    r"(?:[a-z]+[-_])?(?:cookies?|consent|gdpr|banner|newsletter|similar|related|recommend(?:ed|ations?)?)"
+    r"(?:[-_](?:banner|bar|notice|jobs|posts|links|wrapper|container|modal|popup))?",
+    re.I,
+)
+
+# Whole short lines of page chrome left in a scraped page ("Accept all cookies",
+# "Sign in", "Privacy Policy | Terms of Service"); a line is only dropped when
+# every "|"-separated part of it is one of these
+CHROME_LINE_RE = re.compile(
+    r"(accept (all )?cookies|we use cookies\b.*|cookie (settings|preferences|policy)|manage (cookie )?preferences|"
+    r"privacy( policy)?|terms( of (use|service))?( and conditions)?|(©|\(c\)|copyright)\b.*|all rights reserved|"
+    r"skip to (main )?content|sign (in|up|out)|log (in|out)|join now|create (an )?account|"
+    r"share( this( job)?)?|save( this)? job|apply now|report( this)? job|back to (search|results)|"
+    r"show more|see more|show less|download (the|our) app|follow us|get job alerts|set (a |job )?alert)[.!]?",
+    re.I,
+)
+CHROME_LINE_CHARS = 120
+
+_backend = None
+
+
+def _lines(text):
+    lines = (" ".join(line.split()) for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def fragment_text(value):
+    """Plain text of an HTML fragment, such as a JSON-LD description."""
+    # Descriptions are often entity-escaped HTML ("&lt;p&gt;...")
+    text = html.unescape(str(value))
+    text = LIST_ITEM_RE.sub("\n- ", text)
+    text = BLOCK_TAG_RE.sub("\n", text)
+    text = html.unescape(TAG_RE.sub("", text))
+    return _lines(text)
+
+
+def _value_text(value):
+    if value is None or isinstance(value, bool):
+        return ""
+    if isinstance(value, (int, float)):
+        return str(value)
+    if isinstance(value, list):
+        return "\n".join(text for text in (_value_text(item) for item in value) if text)
+    if isinstance(value, dict):
+        if "address" in value:
+            return _value_text(value["address"])
+        if any(key in value for key in ADDRESS_KEYS):
+            return ", ".join(text for text in (_value_text(value.get(key)) for key in ADDRESS_KEYS) if text)
+        if "currency" in value or "unitText" in value:
+            # MonetaryAmount, possibly wrapping a QuantitativeValue
+            amount = value.get("value")
+            if isinstance(amount, dict):
+                unit = amount.get("unitText", "")
+                if amount.get("minValue") is not None and amount.get("maxValue") is not None:
+                    amount = f"{amount['minValue']}-{amount['maxValue']}"
+                else:
+                    amount = amount.get("value", "")
+            else:
+                unit = value.get("unitText", "")
+            return " ".join(str(part) for part in (value.get("currency", ""), amount, unit and f"per {unit.lower()}") if part)
+        if value.get("monthsOfExperience"):
+            return f"{value['monthsOfExperience']} months"
+        for key in ("name", "credentialCategory", "description"):
+            if value.get(key):
+                return _value_text(value[key])
+        return ""
+    return fragment_text(value)
+
+
+def posting_text(posting):
+    """Readable job text built from a schema.org JobPosting dict."""
+    lines = []
+    for key, label in POSTING_FIELDS:
+        text = _value_text(posting.get(key))
+        if not text:
+            continue
+        if label is None:
+            lines.append(text)
+        elif "\n" in text:
+            lines.append(f"{label}:\n{text}")
+        else:
+            lines.append(f"{label}: {text}")
+    return "\n".join(lines)
+
+
+def _is_job_posting(item):
+    kind = item.get("@type")
+    return kind == "JobPosting" or (isinstance(kind, list) and "JobPosting" in kind)
+
+
+def _iter_postings(data):
+    if isinstance(data, list):
+        for item in data:
+            yield from _iter_postings(item)
+    elif isinstance(data, dict):
+        if _is_job_posting(data):
+            yield data
+        elif "@graph" in data:
+            yield from _iter_postings(data["@graph"])
+        elif isinstance(data.get("mainEntity"), (dict, list)):
+            yield from _iter_postings(data["mainEntity"])
+
+
+def json_ld_postings(content):
+    """JobPosting objects from the JSON-LD blocks of a page, found without parsing the HTML."""
+    postings = []
+    for block in JSONLD_RE.findall(content):
+        raw = block.decode("utf-8", "replace").strip()
+        try:
+            data = json.loads(raw, strict=False)
+        except ValueError:
+            # Trailing commas, HTML comments or CDATA wrappers around the object
+            try:
+                data = load_json(raw)[0]
+            except ValueError:
+                continue
+        postings.extend(_iter_postings(data))
+    return postings
+
+
+def _parser_backend():
+    """lxml when it happens to be installed (it is not a requirement), else the stdlib parser."""
+    global _backend
+    if _backend is None:
+        try:
+            import lxml  # noqa: F401
+            _backend = "lxml"
+        except ImportError:
+            _backend = "html.parser"
+    return _backend
+
+
+def _microdata_posting(soup):
+    root = soup.find(attrs={"itemtype": re.compile(r"schema\.org/JobPosting", re.I)})
+    if root is None:
+        return None
+    posting = {}
+    for element in root.find_all(attrs={"itemprop": True}):
+        # Properties of nested items (the organisation's own name, ...) belong to them
+        scope = element.find_parent(attrs={"itemscope": True})
+        if scope is not None and scope is not root:
+            continue
+        name = element["itemprop"]
+        if name in posting:
+            continue
+        if element.has_attr("itemscope"):
+            value = element.get_text(" ", strip=True)
+        else:
+            value = element.get("content") or element.get_text("\n")
+        posting[name] = value
+    return posting
+
+
+def _is_chrome_line(line):
+    if len(line) > CHROME_LINE_CHARS:
+        return False
+    parts = [part.strip() for part in re.split(r"[|·•]", line)]
+    return all(not part or CHROME_LINE_RE.fullmatch(part) for part in parts)
+
+
+def _strip_chrome_lines(text):
+    return "\n".join(line for line in text.splitlines() if not _is_chrome_line(line))
+
+
+def _is_chrome(tag):
+    tokens = list(tag.get("class") or ())
+    if tag.get("id"):
+        tokens.append(tag["id"])
+    return any(CHROME_TOKEN_RE.fullmatch(token) for token in tokens)
+
+
+def _main_content(soup):
+    for tag in soup(NOISE_TAGS):
+        tag.decompose()
+    main = soup.find("main") or soup.find(attrs={"role": "main"}) or soup.find("article")
+    if main is not None:
+        text = _lines(main.get_text("\n"))
+        if len(text) >= MIN_POSTING_CHARS:
+            return text
+    body = soup.body or soup
+    page_text = _lines(body.get_text("\n"))
+    # No usable main element: drop site chrome and keep the rest of the page
+    for tag in body.find_all(CHROME_TAGS) + body.find_all(_is_chrome):
+        if not tag.decomposed:
+            tag.decompose()
+    text = _lines(body.get_text("\n"))
+    # Stripping took the posting with it; the whole page is better than nothing
+    return text if len(text) >= MIN_POSTING_CHARS else page_text
+
+
+def extract_job_text(content):
+    """Turns a job page into readable job text.
+
+    Returns (text, source) where source says where the text came from:
+    "json-ld" or "microdata" (schema.org JobPosting) or "html" (main
+    content of the page).
+    """
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+
+    # Fast path: the structured posting, found with a regex over the raw bytes
+    for posting in json_ld_postings(content):
+        text = posting_text(posting)
+        if len(text) >= MIN_POSTING_CHARS:
+            return text, "json-ld"
+
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(content, _parser_backend())
+
+    if MICRODATA_RE.search(content):
+        posting = _microdata_posting(soup)
+        if posting:
+            text = posting_text(posting)
+            if len(text) >= MIN_POSTING_CHARS:
+                return text, "microdata"
+
+    return _strip_chrome_lines(_main_content(soup)), "html"
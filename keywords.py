@@ -0,0 +1,373 @@
+import re
+from collections import Counter
+
+import numpy as np
+
+# Tokens keep the punctuation used in tech names: C++, C#, Node.js, CI/CD
+TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9+#./-]*[a-z0-9+#]|[a-z0-9]", re.I)
+
+# "you'll", "we're", "team's": the fragment after the apostrophe is not a word
+CONTRACTION_RE = re.compile(r"['’](?:ll|re|ve|s|d|m|t)\b", re.I)
+
+STOP_WORDS = frozenset("""
+a about above across after again against all also am an and any are as at be because been before being
+below between both but by can could did do does doing down during each either etc few for from further had
+has have having he her here hers him his how i if in into is it its itself just may me might more most must
+my no nor not of off on once only or other our ours out over own per same shall she should so some such
+than that the their theirs them then there these they this those through to too under until up upon us
+very was we well were what when where which while who whom why will with within without would you your
+yours
+""".split())
+
+# Words every job ad uses; they say nothing about the candidate's fit
+GENERIC_TERMS = frozenset("""
+ability able apply applicant applicants application benefit benefits candidate candidates company day days
+description duty duties end employee employer employment environment equal excellent experience experienced
+good great help ideal including job join key knowledge least looking new offer opportunity opportunities
+plus position preferred provide range related required requirement requirements responsibility
+responsibilities role salary skill skills strong successful team teams time work working world year years
+""".split())
+
+# Surface forms mapped onto one canonical term so "JS" in the ad matches "JavaScript" in the CV
+SYNONYMS = {
+    "js": "javascript",
+    "ts": "typescript",
+    "py": "python",
+    "k8s": "kubernetes",
+    "postgres": "postgresql",
+    "psql": "postgresql",
+    "golang": "go",
+    "nodejs": "node.js",
+    "node": "node.js",
+    "reactjs": "react",
+    "react.js": "react",
+    "vuejs": "vue",
+    "vue.js": "vue",
+    "ml": "machine learning",
+    "ai": "artificial intelligence",
+    "nlp": "natural language processing",
+    "aws": "amazon web services",
+    "gcp": "google cloud platform",
+    "ci/cd": "continuous integration",
+    "cicd": "continuous integration",
+    "ux": "user experience",
+    "ui": "user interface",
+    "seo": "search engine optimisation",
+    "optimization": "optimisation",
+    "crm": "customer relationship management",
+    "b2b": "business to business",
+    "kpi": "key performance indicator",
+    "pm": "project management",
+}
+
+# Skills recognised wherever they appear in the ad
+SKILL_TERMS = """
+python, java, javascript, typescript, go, rust, ruby, php, scala, kotlin, swift, c, c++, c#, r, matlab,
+sas, bash, sql, nosql, postgresql, mysql, oracle, mongodb, redis, elasticsearch, cassandra, dynamodb, kafka,
+spark, hadoop, airflow, dbt, snowflake, databricks, bigquery, redshift, tableau, power bi, looker, excel, etl,
+data warehousing, data modelling, data analysis, data engineering, data science, statistics, pandas, numpy,
+pytorch, tensorflow, scikit-learn, keras, docker, kubernetes, terraform, ansible, linux, git, jenkins, github,
+gitlab, devops, microservices, graphql, rest, api, apis, azure, react, angular, vue, django, flask, fastapi, spring,
+html, css, sass, figma, deep learning, computer vision, agile, scrum, kanban, jira, confluence, testing,
+automation, security, networking, stakeholder management, product management, people management, budgeting,
+forecasting, financial modelling, accounting, auditing, negotiation, leadership, mentoring, coaching,
+communication, presentation, salesforce, hubspot, copywriting, analytics
+"""
+# Words ads use around skills: verbs, adjectives, adverbs and vague nouns
+NON_SKILL_TERMS = frozenset("""
+build built building develop design deliver drive ensure lead manage support use create maintain own
+collaborate partner hit grow scale ship solve improve define shape bring make take get run thrive enjoy
+love want need like feel know learn understand write contribute champion closely comfortable familiarity
+familiar nice bonus proven solid deep hands passionate motivated driven exciting innovative dynamic growing
+fast paced best modern high quality large small various multiple complex across highly ideally preferably
+hybrid remote office based full part permanent contract hour hours week month today e.g i.e etc
+ltd limited inc llc plc gmbh
+apache microsoft amazon google adobe
+""".split())
+
+# Nouns that only make a skill as part of a phrase ("data pipelines", "product analytics")
+VAGUE_TERMS = frozenset("""
+data business product customer customers technical technology system systems tool tools process processes
+solution solutions platform platforms service services stack code software
+""".split())
+
+# Lines about pay and perks; never a skill the CV should mention
+BENEFIT_LINE_RE = re.compile(
+    r"holiday|annual leave|vacation|pension|401k|insurance|bonus|perks|wellbeing|wellness|gym|parental leave|"
+    r"maternity|paternity|share options|equity|salary|compensation|discount|cycle to work|free (lunch|food|snacks)",
+    re.I,
+)
+
+# Section headings: requirement lists count as skills, benefit sections are skipped
+HEADING_WORDS = 6
+REQUIREMENT_HEADING_RE = re.compile(
+    r"requirement|qualification|skills|must have|nice to have|what you('ll)? (need|bring)|you have|about you|"
+    r"essential|desirable|tech stack|technolog|experience",
+    re.I,
+)
+BENEFIT_HEADING_RE = re.compile(r"benefit|perks|what we offer|why join|compensation|rewards", re.I)
+OTHER_HEADING_RE = re.compile(
+    r"responsibilit|duties|about (us|the)|who we are|what you('ll)? do|the role|your role|day to day|"
+    r"our (team|company|mission)|how to apply|location",
+    re.I,
+)
+
+MAX_NGRAM = 3
+
+
+def stem(token):
+    """Light suffix stripping; tokens with digits or symbols are left alone."""
+    if len(token) <= 4 or not token.isalpha():
+        return token
+    for suffix, replacement in (("ies", "y"), ("ing", ""), ("ed", ""), ("es", ""), ("s", "")):
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            # "process", "analysis", "continuous" are not plurals
+            if suffix == "s" and token[-2] in "sui":
+                return token
+            return token[:-len(suffix)] + replacement
+    return token
+
+
+def _cased_tokens(text):
+    """Tokens as written, with trailing sentence punctuation and contractions removed."""
+    text = CONTRACTION_RE.sub("", text or "")
+    return [t.rstrip(".") for t in TOKEN_RE.findall(text) if t.rstrip(".")]
+
+
+def tokenize(text):
+    """Lower-cased word tokens with trailing sentence punctuation removed."""
+    return [t.lower() for t in _cased_tokens(text)]
+
+
+# Multi-word concepts become a single token so "ML" and "machine learning" match
+_CONCEPTS = {}
+for _value in set(SYNONYMS.values()):
+    if " " in _value:
+        _CONCEPTS[tuple(_value.split())] = _value.replace(" ", "_")
+_MAX_CONCEPT = max((len(k) for k in _CONCEPTS), default=1)
+
+
+def _canonical(token):
+    value = SYNONYMS.get(token, token)
+    return value.replace(" ", "_") if " " in value else stem(value)
+
+
+def normalise_tokens(tokens, spans=None):
+    """Applies synonyms, multi-word concepts and stemming.
+
+    If spans is a list, the (start, end) range of original tokens behind each
+    normalised token is appended to it.
+    """
+    out = []
+    i = 0
+    while i < len(tokens):
+        for n in range(min(_MAX_CONCEPT, len(tokens) - i), 1, -1):
+            concept = _CONCEPTS.get(tuple(tokens[i:i + n]))
+            if concept:
+                break
+        else:
+            n, concept = 1, _canonical(tokens[i])
+        out.append(concept)
+        if spans is not None:
+            spans.append((i, i + n))
+        i += n
+    return out
+
+_GENERIC_STEMS = frozenset(stem(t) for t in GENERIC_TERMS)
+_NON_SKILL_STEMS = frozenset(stem(t) for t in NON_SKILL_TERMS) | _GENERIC_STEMS | STOP_WORDS
+_VAGUE_STEMS = frozenset(stem(t) for t in VAGUE_TERMS)
+SKILLS = frozenset(
+    " ".join(normalise_tokens(tokenize(term)))
+    for term in [*SKILL_TERMS.split(","), *SYNONYMS, *SYNONYMS.values()]
+)
+
+
+# Tech names written with digits or symbols: S3, EC2, C++, C#, Node.js
+TECH_NAME_RE = re.compile(r"^[a-z]+\d|[+#]|[a-z]\.[a-z]")
+
+# Skill names that are also everyday words; they only count when capitalised ("Go", "Excel")
+AMBIGUOUS_SKILLS = frozenset("go rust swift spring rest excel r c".split())
+
+
+def _proper(tokens):
+    """Per token: capitalised mid-sentence, or an acronym (SQL, AWS) anywhere."""
+    flags = []
+    for i, token in enumerate(tokens):
+        acronym = len(token) > 1 and token.isupper()
+        flags.append(acronym or (i > 0 and token[0].isupper()))
+    return flags
+
+
+def _skill_like(term, proper, in_requirements):
+    """How an ad term can be a skill: "known" (a known skill, a tech name or
+    listed under a requirements heading), "proper" (only capitalised) or None.
+    """
+    if term in SKILLS:
+        return "known"
+    words = term.split()
+    if words[0] in _NON_SKILL_STEMS or words[-1] in _NON_SKILL_STEMS:
+        return None
+    if len(words) == 1 and words[0] in _VAGUE_STEMS:
+        return None
+    # Figures ("30k", "3+") are never skills
+    if not all(word[0].isalpha() for word in words):
+        return None
+    if any(len(word) > 4 and word.endswith("ly") for word in words):
+        return None
+    if in_requirements or any(TECH_NAME_RE.search(word) for word in words):
+        return "known"
+    return "proper" if proper else None
+
+
+def _ngrams(tokens, n):
+    return [" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1)]
+
+
+def _candidate_ngrams(tokens):
+    """(start, n, gram) for all 1..MAX_NGRAM grams that neither start nor end with a stop / generic word."""
+    grams = []
+    for n in range(1, MAX_NGRAM + 1):
+        for i in range(len(tokens) - n + 1):
+            first, last = tokens[i], tokens[i + n - 1]
+            if first in STOP_WORDS or last in STOP_WORDS:
+                continue
+            if first in _GENERIC_STEMS or last in _GENERIC_STEMS:
+                continue
+            if n == 1 and (len(first) < 2 or not any(c.isalpha() for c in first)):
+                continue
+            grams.append((i, n, " ".join(tokens[i:i + n])))
+    return grams
+
+
+def _ad_lines(job_text):
+    """(line, in_requirements) for the lines of an ad worth mining, skipping pay and perks."""
+    section = None
+    for line in (job_text or "").splitlines():
+        if not line.strip():
+            continue
+        if len(line.split()) <= HEADING_WORDS and not line.rstrip().endswith("."):
+            # Short lines under a requirements heading are usually the skills themselves,
+            # so only known headings change the section
+            if BENEFIT_HEADING_RE.search(line):
+                section = "benefits"
+            elif REQUIREMENT_HEADING_RE.search(line):
+                section = "requirements"
+            elif OTHER_HEADING_RE.search(line):
+                section = None
+        if section == "benefits" or BENEFIT_LINE_RE.search(line):
+            continue
+        yield line, section == "requirements"
+
+
+def extract_keywords(job_text, limit=30):
+    """Ranks the skill-like terms and phrases of a job ad by TF-IDF.
+
+    Candidates are known skills, tech names (C++, Node.js), capitalised
+    names and acronyms, and anything listed under a requirements heading;
+    verbs, adjectives and benefit lines are left out. Each line of the job
+    text is treated as a document, so a term repeated across the whole ad
+    scores on frequency while boilerplate that appears in every line is
+    damped. Returns [(normalised term, display form, weight)].
+    """
+    surface = {}
+    line_grams = []
+    known = set()
+    for line, in_requirements in _ad_lines(job_text):
+        cased = _cased_tokens(line)
+        raw = [token.lower() for token in cased]
+        proper = _proper(cased)
+        spans = []
+        norm = normalise_tokens(raw, spans)
+        grams = []
+        for i, n, gram in _candidate_ngrams(norm):
+            start, end = spans[i][0], spans[i + n - 1][1]
+            if gram in AMBIGUOUS_SKILLS and not cased[start][0].isupper():
+                continue
+            kind = _skill_like(gram, all(proper[start:end]), in_requirements)
+            if kind is None:
+                continue
+            if kind == "known":
+                known.add(gram)
+            grams.append(gram)
+            # Remember how a term was written in the ad, for display
+            surface.setdefault(gram, " ".join(raw[start:end]))
+        line_grams.append(grams)
+
+    all_grams = [g for grams in line_grams for g in grams]
+    if not all_grams:
+        return []
+
+    vocab, inverse = np.unique(np.array(all_grams, dtype=object), return_inverse=True)
+    tf = np.bincount(inverse, minlength=len(vocab)).astype(float)
+
+    # Document frequency: count each term once per line
+    line_ids = np.repeat(np.arange(len(line_grams)), [len(g) for g in line_grams])
+    pairs = np.unique(np.stack([line_ids, inverse]), axis=1)
+    df = np.bincount(pairs[1], minlength=len(vocab)).astype(float)
+
+    n_docs = float(len(line_grams))
+    idf = np.log((n_docs + 1.0) / (df + 1.0)) + 1.0
+    lengths = np.array([g.count(" ") + 1 for g in vocab])
+
+    # Multi-word phrases and names that are only capitalised (places, the
+    # company) count when they recur; single mentions are usually prose
+    weight = (1.0 + np.log(tf)) * idf * (1.0 + 0.5 * (lengths - 1))
+    skill = np.array([g in SKILLS for g in vocab], dtype=bool)
+    listed = np.array([g in known for g in vocab], dtype=bool)
+    weight[(lengths > 1) & (tf < 2) & ~skill] = 0.0
+    weight[~listed & (tf < 2)] = 0.0
+
+    order = np.argsort(-weight, kind="stable")
+    chosen = []
+    covered = Counter()
+    for idx in order:
+        if weight[idx] <= 0 or len(chosen) >= limit:
+            break
+        term = vocab[idx]
+        # Skip a term already explained by a higher-ranked phrase containing it
+        if covered[term] >= tf[idx]:
+            continue
+        chosen.append((term, surface.get(term, term), float(weight[idx])))
+        words = term.split()
+        for n in range(1, len(words)):
+            for sub in _ngrams(words, n):
+                covered[sub] += tf[idx]
+    return chosen
+
+
+def keyword_coverage(cv_text, job_text, limit=30, missing_limit=12):
+    """Computes keyword coverage of the CV against the job text.
+
+    Returns {"score": 0-100, "missing": [...], "matched": [...]} with missing
+    keywords ordered by importance.
+    """
+    keywords = extract_keywords(job_text, limit=limit)
+    if not keywords:
+        return {"score": 0, "missing": [], "matched": []}
+
+    cv_tokens = normalise_tokens(tokenize(cv_text))
+    cv_grams = set()
+    for n in range(1, MAX_NGRAM + 1):
+        cv_grams.update(_ngrams(cv_tokens, n))
+
+    terms = np.array([k[0] for k in keywords], dtype=object)
+    weights = np.array([k[2] for k in keywords])
+    present = np.isin(terms, np.array(sorted(cv_grams), dtype=object))
+
+    score = int(round(100.0 * weights[present].sum() / weights.sum())) if weights.sum() else 0
+    missing = [keywords[i][1] for i in np.flatnonzero(~present)][:missing_limit]
+    matched = [keywords[i][1] for i in np.flatnonzero(present)]
+    return {"score": score, "missing": missing, "matched": matched}
+
+
+def apply_keyword_analysis(result, cv_text, job_text):
+    """Fills the keyword score and ATS missing list of an analysis result locally."""
+    if not isinstance(result, dict) or "error" in result:
+        return result
+    coverage = keyword_coverage(cv_text, job_text)
+    component_scores = result.get("component_scores")
+    if not isinstance(component_scores, dict):
+        component_scores = result["component_scores"] = {}
+    component_scores["keywords"] = coverage["score"]
+    result["ats_keywords"] = {"missing": coverage["missing"], "matched": coverage["matched"]}
+    return result
@@ -0,0 +1,335 @@
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+
+# Port of the local /metrics endpoint; unset or empty keeps it off
+METRICS_PORT = os.getenv("CV_MATCHER_METRICS_PORT", "")
+METRICS_HOST = os.getenv("CV_MATCHER_METRICS_HOST", "127.0.0.1")
+
+# One JSON line per analysis request; set CV_MATCHER_JSON_LOGS=0 to silence them
+JSON_LOGS = os.getenv("CV_MATCHER_JSON_LOGS", "1") != "0"
+
+# Seconds; wide enough for a cached PDF hit and a slow model fallback chain
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+TEXT_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_metrics = []
+_current_request = contextvars.ContextVar("cv_matcher_request_log", default=None)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}_total{_labels(self.labelnames, key)} {_number(value)}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = {"buckets": [0] * len(self.buckets), "count": 0, "sum": 0.0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry["buckets"][i] += 1
+            entry["count"] += 1
+            entry["sum"] += value
+
+    def count(self, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            entry = self._values.get(key)
+            return entry["count"] if entry else 0
+
+    def samples(self):
+        with self._lock:
+            values = {key: dict(entry, buckets=list(entry["buckets"])) for key, entry in self._values.items()}
+        for key, entry in sorted(values.items()):
+            for bound, count in zip(self.buckets, entry["buckets"]):
+                labels = _labels(self.labelnames, key, [("le", _number(bound))])
+                yield f"{self.name}_bucket{labels} {count}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {entry['count']}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {_number(entry['sum'])}"
+
+
+STAGE_SECONDS = Histogram(
+    "cv_matcher_stage_seconds",
+    "Time spent in each pipeline stage (pdf_extract, url_fetch, html_clean, queue, ...).",
+    ["stage"],
+)
+STAGE_ERRORS = Counter(
+    "cv_matcher_stage_errors",
+    "Pipeline stages that raised.",
+    ["stage"],
+)
+PROVIDER_SECONDS = Histogram(
+    "cv_matcher_provider_seconds",
+    "Latency of each provider call, one observation per model attempt.",
+    ["provider", "model", "outcome"],
+)
+MODEL_ATTEMPTS = Counter(
+    "cv_matcher_model_attempts",
+    "Model attempts by outcome (ok, error, quota, not_found, invalid).",
+    ["provider", "model", "outcome"],
+)
+TOKENS = Counter(
+    "cv_matcher_tokens",
+    "Tokens used per provider (input, cached, cache_write, output).",
+    ["provider", "kind"],
+)
+PARSE_FAILURES = Counter(
+    "cv_matcher_parse_failures",
+    "Model responses that were not valid JSON.",
+    ["provider"],
+)
+RESPONSE_REPAIRS = Counter(
+    "cv_matcher_response_repairs",
+    "Model responses that needed fixing (syntax repaired, fields re-asked).",
+    ["provider", "kind"],
+)
+JOB_DEDUPE = Counter(
+    "cv_matcher_job_dedupe",
+    "Job texts by near-duplicate index outcome (new, duplicate, skipped).",
+    ["outcome"],
+)
+RESULT_CACHE_LOOKUPS = Counter(
+    "cv_matcher_result_cache_lookups",
+    "Analysis result cache lookups by outcome (hit, miss).",
+    ["provider", "outcome"],
+)
+REQUESTS = Counter(
+    "cv_matcher_requests",
+    "Analysis requests by provider and status.",
+    ["provider", "status"],
+)
+
+
+def _log():
+    return _current_request.get()
+
+
+def annotate(**fields):
+    """Adds fields to the JSON log line of the current request (if any)."""
+    log = _log()
+    if log is not None:
+        log.update(fields)
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Times a pipeline stage into STAGE_SECONDS and the current request log."""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        STAGE_SECONDS.observe(seconds, stage=name)
+        log = _log()
+        if log is not None:
+            stages = log.setdefault("stages", {})
+            stages[name] = round(stages.get(name, 0.0) + seconds, 4)
+
+
+def record_attempt(provider, model, outcome, seconds):
+    """Records one provider call (one model in the Gemini candidate loop)."""
+    PROVIDER_SECONDS.observe(seconds, provider=provider, model=model, outcome=outcome)
+    MODEL_ATTEMPTS.inc(provider=provider, model=model, outcome=outcome)
+    log = _log()
+    if log is not None:
+        log.setdefault("attempts", []).append({"model": model, "outcome": outcome, "seconds": round(seconds, 4)})
+
+
+def record_tokens(provider, usage):
+    """Counts the provider-neutral usage dict from utils.gemini_usage / claude_usage."""
+    for field, value in usage.items():
+        if value:
+            TOKENS.inc(value, provider=provider, kind=field[:-len("_tokens")])
+    log = _log()
+    if log is not None:
+        tokens = log.setdefault("tokens", {})
+        for field, value in usage.items():
+            tokens[field] = tokens.get(field, 0) + value
+
+
+def record_parse_failure(provider):
+    PARSE_FAILURES.inc(provider=provider)
+    annotate(parse_failed=True)
+
+
+def record_repair(provider, kind, fields=None):
+    RESPONSE_REPAIRS.inc(provider=provider, kind=kind)
+    log = _log()
+    if log is not None:
+        log.setdefault("repairs", []).append({"kind": kind, "fields": fields} if fields else {"kind": kind})
+
+
+def record_job_dedupe(job_id, duplicate, score):
+    outcome = "skipped" if job_id is None else "duplicate" if duplicate else "new"
+    JOB_DEDUPE.inc(outcome=outcome)
+    if job_id is not None:
+        annotate(job_id=job_id, job_duplicate=duplicate, job_similarity=round(score, 3))
+
+
+def record_cache_lookup(provider, hit):
+    outcome = "hit" if hit else "miss"
+    RESULT_CACHE_LOOKUPS.inc(provider=provider, outcome=outcome)
+    annotate(result_cache=outcome)
+
+
+@contextlib.contextmanager
+def request_log(**fields):
+    """Collects stage timings, model attempts and tokens for one analysis request.
+
+    Emits a single JSON log line when the block exits. Set log["error"] (or
+    raise) to mark the request as failed. Nested calls share the outer log.
+    """
+    if _log() is not None:
+        yield _log()
+        return
+
+    log = {"event": "analysis", "request_id": uuid.uuid4().hex[:12]}
+    log.update(fields)
+    token = _current_request.set(log)
+    started = time.perf_counter()
+    try:
+        yield log
+    except BaseException as e:
+        log.setdefault("error", str(e) or type(e).__name__)
+        raise
+    finally:
+        _current_request.reset(token)
+        log["seconds"] = round(time.perf_counter() - started, 4)
+        log["status"] = "error" if log.get("error") else "ok"
+        REQUESTS.inc(provider=log.get("provider", ""), status=log["status"])
+        if JSON_LOGS:
+            log["time"] = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime())
+            print(json.dumps(log, default=str), flush=True)
+
+
+def render(openmetrics=True):
+    """All metrics in the OpenMetrics (or classic Prometheus text) exposition format."""
+    lines = []
+    for metric in _metrics:
+        family = metric.name if openmetrics or metric.kind != "counter" else f"{metric.name}_total"
+        lines.append(f"# HELP {family} {metric.documentation}")
+        lines.append(f"# TYPE {family} {metric.kind}")
+        lines.extend(metric.samples())
+    if openmetrics:
+        lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+def _serve_metrics(handler):
+    if handler.path.split("?")[0] not in ("/metrics", "/"):
+        handler.send_error(404)
+        return
+    openmetrics = "application/openmetrics-text" in handler.headers.get("Accept", "")
+    body = render(openmetrics).encode("utf-8")
+    handler.send_response(200)
+    handler.send_header("Content-Type", OPENMETRICS_CONTENT_TYPE if openmetrics else TEXT_CONTENT_TYPE)
+    handler.send_header("Content-Length", str(len(body)))
+    handler.end_headers()
+    handler.wfile.write(body)
+
+
+_server = None
+# Set when binding failed, so reruns don't retry (and re-log) every time
+_server_error = None
+_server_lock = threading.Lock()
+
+
+def start_server(port=None, host=METRICS_HOST):
+    """Serves /metrics from a background thread; safe to call on every rerun.
+
+    Returns the server, or None when no port is configured or it could not bind.
+    """
+    global _server, _server_error
+    port = METRICS_PORT if port is None else port
+    if port in ("", None):
+        return None
+    with _server_lock:
+        if _server is None and _server_error is None:
+            # Only processes that actually export metrics load the HTTP server
+            from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+            class MetricsHandler(BaseHTTPRequestHandler):
+                do_GET = _serve_metrics
+
+                def log_message(self, *args):
+                    pass
+
+            try:
+                _server = ThreadingHTTPServer((host, int(port)), MetricsHandler)
+            except OSError as e:
+                # Another process (e.g. a second Streamlit worker) already serves this port
+                _server_error = e
+                print(f"Metrics endpoint not started on {host}:{port}: {e}")
+                return None
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+            print(f"Metrics available at http://{host}:{_server.server_address[1]}/metrics")
+        return _server
@@ -0,0 +1,203 @@
+import contextlib
+import contextvars
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+
+from breaker import classify_error
+from cache import make_key
+
+# Provider quotas per API key (requests and tokens per minute)
+LIMITS = {
+    "gemini": {
+        "rpm": int(os.getenv("CV_MATCHER_GEMINI_RPM", "15")),
+        "tpm": int(os.getenv("CV_MATCHER_GEMINI_TPM", "1000000")),
+    },
+    "claude": {
+        "rpm": int(os.getenv("CV_MATCHER_CLAUDE_RPM", "50")),
+        "tpm": int(os.getenv("CV_MATCHER_CLAUDE_TPM", "40000")),
+    },
+}
+
+# Longest a request waits in the queue before giving up
+QUEUE_TIMEOUT_SECONDS = float(os.getenv("CV_MATCHER_QUEUE_TIMEOUT", "180"))
+
+# Who is asking: set by the UI / service so the scheduler can be fair between sessions
+_request_context = contextvars.ContextVar("cv_matcher_request_context", default=None)
+
+
+class RateLimitTimeout(Exception):
+    """Raised when a request waited longer than its queue timeout."""
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at rate_per_minute."""
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(capacity or rate_per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Seconds until amount tokens are available (0 if they are now)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+
+class FairScheduler:
+    """Admits requests for one API key under its RPM / TPM budget, fairly across sessions.
+
+    Waiting requests are served round-robin by session, so one user firing a
+    burst cannot starve everyone else. While waiting, the caller's on_wait
+    callback receives its current queue position.
+    """
+
+    def __init__(self, rpm, tpm):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self._queues = OrderedDict()
+        self._cond = threading.Condition()
+
+    def _order(self):
+        # Interleave sessions: first ticket of every session, then the second, ...
+        order = []
+        queues = [list(q) for q in self._queues.values()]
+        depth = max((len(q) for q in queues), default=0)
+        for i in range(depth):
+            order.extend(q[i] for q in queues if i < len(q))
+        return order
+
+    def queue_length(self):
+        with self._cond:
+            return sum(len(q) for q in self._queues.values())
+
+    def acquire(self, session_id, tokens=0, on_wait=None, timeout=QUEUE_TIMEOUT_SECONDS):
+        """Blocks until this request may be sent."""
+        ticket = object()
+        deadline = time.monotonic() + timeout
+        last_position = None
+
+        with self._cond:
+            self._queues.setdefault(session_id, deque()).append(ticket)
+        try:
+            while True:
+                report = None
+                with self._cond:
+                    position = self._order().index(ticket) + 1
+                    wait = None
+                    if position == 1:
+                        wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+                        if wait == 0:
+                            self.requests.take(1)
+                            self.tokens.take(tokens)
+                            return
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise RateLimitTimeout(f"Still queued (position {position}) after {timeout:.0f}s")
+                    if on_wait and position != last_position:
+                        report = position
+                    else:
+                        self._cond.wait(min(wait if wait is not None else remaining, remaining))
+                if report is not None:
+                    # Outside the lock: a slow callback (a UI update) must not hold up other waiters
+                    last_position = report
+                    on_wait(report)
+        finally:
+            with self._cond:
+                queue = self._queues.get(session_id)
+                if queue is not None:
+                    queue.remove(ticket)
+                    if queue:
+                        # This session had its turn; the others go first next time
+                        self._queues.move_to_end(session_id)
+                    else:
+                        del self._queues[session_id]
+                self._cond.notify_all()
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def scheduler_for(provider, api_key):
+    """The shared scheduler for (provider, API key)."""
+    key = (provider, make_key(api_key))
+    with _schedulers_lock:
+        scheduler = _schedulers.get(key)
+        if scheduler is None:
+            limits = LIMITS[provider]
+            scheduler = _schedulers[key] = FairScheduler(limits["rpm"], limits["tpm"])
+        return scheduler
+
+
+@contextlib.contextmanager
+def request_context(session_id, on_wait=None):
+    """Tags provider calls made inside the block with a session id and queue callback."""
+    token = _request_context.set({"session_id": session_id, "on_wait": on_wait})
+    try:
+        yield
+    finally:
+        _request_context.reset(token)
+
+
+def throttle(provider, api_key, tokens):
+    """Waits for a slot for this key, honouring the current request context."""
+    context = _request_context.get() or {}
+    scheduler_for(provider, api_key).acquire(
+        context.get("session_id", "default"),
+        tokens=tokens,
+        on_wait=context.get("on_wait"),
+    )
+
+
+def _retry_after(error):
+    # Anthropic errors carry the HTTP response; honour its Retry-After header
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def with_backoff(call, retries=3, base_delay=1.0, max_delay=30.0, acquire=None):
+    """Runs call(), retrying 429 / quota errors with jittered exponential backoff.
+
+    acquire(), if given, is called before every retry, so retries wait for a
+    rate-limit slot like first attempts instead of bypassing the scheduler.
+    """
+    attempt = 0
+    while True:
+        if attempt and acquire is not None:
+            acquire()
+        try:
+            return call()
+        except Exception as e:
+            attempt += 1
+            if attempt > retries or classify_error(e) != "quota":
+                raise
+            retry_after = _retry_after(e)
+            if retry_after is not None:
+                # Never earlier than the provider asked for
+                delay = random.uniform(retry_after, retry_after * 1.25)
+            else:
+                delay = min(max_delay, base_delay * 2 ** (attempt - 1))
+                delay = random.uniform(delay / 2, delay * 1.5)
+            print(f"Rate limited, retrying in {delay:.1f}s: {e}")
+            time.sleep(delay)
@@ -0,0 +1,242 @@
+import json
+import zlib
+from dataclasses import astuple, dataclass, fields
+from typing import Optional, Tuple
+
+# Bump when the packed layout changes; older packed cache entries are then misses
+FORMAT_VERSION = 1
+
+
+def _slotted(cls):
+    """Rebuilds a dataclass with __slots__ (dataclass(slots=True) needs Python 3.10)."""
+    names = tuple(field.name for field in fields(cls))
+    body = {key: value for key, value in cls.__dict__.items()
+            if key not in names and key not in ("__dict__", "__weakref__")}
+
+    def __getstate__(self):
+        return [getattr(self, name) for name in names]
+
+    def __setstate__(self, state):
+        # Frozen instances cannot be restored through setattr (pickle, copy)
+        for name, value in zip(names, state):
+            object.__setattr__(self, name, value)
+
+    body.update(__slots__=names, __getstate__=__getstate__, __setstate__=__setstate__)
+    slotted = type(cls)(cls.__name__, cls.__bases__, body)
+    slotted.__qualname__ = cls.__qualname__
+    return slotted
+
+
+def _texts(value):
+    if value is None:
+        return ()
+    if isinstance(value, str):
+        return (value,)
+    return tuple(str(item) for item in value)
+
+
+@_slotted
+@dataclass(frozen=True)
+class ComponentScores:
+    skills: int = 0
+    experience: int = 0
+    # Keyword coverage is computed locally (keywords.py) after the model answers
+    keywords: Optional[int] = None
+
+    @classmethod
+    def from_dict(cls, data):
+        data = data or {}
+        return cls(data.get("skills", 0), data.get("experience", 0), data.get("keywords"))
+
+    def to_dict(self):
+        data = {"skills": self.skills, "experience": self.experience}
+        if self.keywords is not None:
+            data["keywords"] = self.keywords
+        return data
+
+
+@_slotted
+@dataclass(frozen=True)
+class SkillGap:
+    """Skills found in the CV and skills the job asks for that it lacks."""
+
+    present: Tuple[str, ...] = ()
+    missing: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_dict(cls, data):
+        data = data or {}
+        return cls(_texts(data.get("present")), _texts(data.get("missing")))
+
+    def to_dict(self):
+        return {"present": list(self.present), "missing": list(self.missing)}
+
+
+@_slotted
+@dataclass(frozen=True)
+class KeywordGap:
+    """ATS keywords of the job missing from / matched in the CV."""
+
+    missing: Tuple[str, ...] = ()
+    matched: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_dict(cls, data):
+        data = data or {}
+        return cls(_texts(data.get("missing")), _texts(data.get("matched")))
+
+    def to_dict(self):
+        return {"missing": list(self.missing), "matched": list(self.matched)}
+
+
+@_slotted
+@dataclass(frozen=True)
+class Quantification:
+    score: int = 0
+    feedback: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_dict(cls, data):
+        data = data or {}
+        return cls(data.get("score", 0), _texts(data.get("feedback")))
+
+    def to_dict(self):
+        return {"score": self.score, "feedback": list(self.feedback)}
+
+
+@_slotted
+@dataclass(frozen=True)
+class SuggestedPhrase:
+    context: str = ""
+    suggestion: str = ""
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(str(data.get("context") or ""), str(data.get("suggestion") or ""))
+
+    def to_dict(self):
+        return {"context": self.context, "suggestion": self.suggestion}
+
+
+@_slotted
+@dataclass(frozen=True)
+class AnalysisResult:
+    """A finished (or, while streaming, partial) CV analysis.
+
+    Built from the schema-validated dict the providers return; fields the
+    answer did not contain keep their empty defaults. to_dict() gives the
+    nested dict form used by the HTTP service and batch output, pack() the
+    compact positional form stored in the result cache.
+    """
+
+    match_score: Optional[int] = None
+    match_explanation: str = ""
+    response_likelihood: str = ""
+    component_scores: ComponentScores = ComponentScores()
+    job_title: str = ""
+    job_level: str = ""
+    hard_skills: SkillGap = SkillGap()
+    soft_skills: SkillGap = SkillGap()
+    quantification_analysis: Quantification = Quantification()
+    red_flags: Tuple[str, ...] = ()
+    cultural_fit: str = ""
+    priority_fixes: Tuple[str, ...] = ()
+    suggested_phrases: Tuple[SuggestedPhrase, ...] = ()
+    ats_keywords: Optional[KeywordGap] = None
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            match_score=data.get("match_score"),
+            match_explanation=data.get("match_explanation") or "",
+            response_likelihood=data.get("response_likelihood") or "",
+            component_scores=ComponentScores.from_dict(data.get("component_scores")),
+            job_title=data.get("job_title") or "",
+            job_level=data.get("job_level") or "",
+            hard_skills=SkillGap.from_dict(data.get("hard_skills")),
+            soft_skills=SkillGap.from_dict(data.get("soft_skills")),
+            quantification_analysis=Quantification.from_dict(data.get("quantification_analysis")),
+            red_flags=_texts(data.get("red_flags")),
+            cultural_fit=data.get("cultural_fit") or "",
+            priority_fixes=_texts(data.get("priority_fixes")),
+            suggested_phrases=tuple(
+                SuggestedPhrase.from_dict(phrase) for phrase in data.get("suggested_phrases") or ()
+                if isinstance(phrase, dict)
+            ),
+            ats_keywords=KeywordGap.from_dict(data["ats_keywords"]) if data.get("ats_keywords") else None,
+        )
+
+    def to_dict(self):
+        data = {
+            "match_score": self.match_score,
+            "match_explanation": self.match_explanation,
+            "response_likelihood": self.response_likelihood,
+            "component_scores": self.component_scores.to_dict(),
+            "job_title": self.job_title,
+            "job_level": self.job_level,
+            "hard_skills": self.hard_skills.to_dict(),
+            "soft_skills": self.soft_skills.to_dict(),
+            "quantification_analysis": self.quantification_analysis.to_dict(),
+            "red_flags": list(self.red_flags),
+            "cultural_fit": self.cultural_fit,
+            "priority_fixes": list(self.priority_fixes),
+            "suggested_phrases": [phrase.to_dict() for phrase in self.suggested_phrases],
+        }
+        if self.ats_keywords is not None:
+            data["ats_keywords"] = self.ats_keywords.to_dict()
+        return data
+
+    # -- Compact serialisation --------------------------------------------
+
+    def pack(self):
+        """Positional form (nested lists, no field names) for caches."""
+        return [FORMAT_VERSION, *astuple(self)]
+
+    @classmethod
+    def unpack(cls, data):
+        if not data or data[0] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported packed result version {data[0] if data else None!r}")
+        (_, score, explanation, likelihood, components, title, level, hard, soft, quantification,
+         red_flags, cultural_fit, fixes, phrases, ats) = data
+        return cls(
+            score, explanation, likelihood, ComponentScores(*components), title, level,
+            SkillGap(*map(tuple, hard)), SkillGap(*map(tuple, soft)),
+            Quantification(quantification[0], tuple(quantification[1])),
+            tuple(red_flags), cultural_fit, tuple(fixes),
+            tuple(SuggestedPhrase(*phrase) for phrase in phrases),
+            KeywordGap(*map(tuple, ats)) if ats else None,
+        )
+
+    @classmethod
+    def load(cls, data):
+        """Result from its packed form or from a dict (results cached before packing existed)."""
+        if isinstance(data, dict):
+            return cls.from_dict(data)
+        return cls.unpack(data)
+
+    def to_json(self):
+        return json.dumps(self.pack(), ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, text):
+        return cls.load(json.loads(text))
+
+    def to_bytes(self):
+        """zlib-compressed packed JSON, for exports and anything stored in bulk."""
+        return zlib.compress(self.to_json().encode("utf-8"))
+
+    @classmethod
+    def from_bytes(cls, data):
+        return cls.from_json(zlib.decompress(data).decode("utf-8"))
+
+
+def is_error(result):
+    """True for the {"error": ...} dicts the analysis functions return on failure."""
+    return isinstance(result, dict) and "error" in result
+
+
+def json_default(value):
+    """json.dumps default= hook that writes results in their dict form."""
+    if isinstance(value, AnalysisResult):
+        return value.to_dict()
+    return str(value)
@@ -0,0 +1,137 @@
+import os
+import re
+import threading
+from collections import deque
+
+# Latency a request should be answered within (seconds). Models whose rolling
+# p95 is above it are only tried after the ones that meet it.
+LATENCY_TARGET_SECONDS = float(os.getenv("CV_MATCHER_LATENCY_TARGET", "30"))
+
+# Most expensive model (relative cost, cheapest = 1) a request may start on;
+# pricier models are only used when cheaper answers fail validation
+MAX_START_COST = float(os.getenv("CV_MATCHER_ROUTE_MAX_COST", "100"))
+
+# Prompts up to this many input tokens start on the fast tier, longer ones on the strong tier
+SHORT_INPUT_TOKENS = int(os.getenv("CV_MATCHER_SHORT_INPUT_TOKENS", "6000"))
+
+# Output limit: room for the full result plus longer skill lists for longer inputs
+MIN_OUTPUT_TOKENS = 1024
+OUTPUT_TOKENS_BASE = 1536
+OUTPUT_TOKENS_PER_INPUT_TOKEN = 0.25
+
+# Number of recent latencies kept per model for the p95
+LATENCY_WINDOW = 100
+MIN_SAMPLES_FOR_P95 = 10
+
+# Relative cost per token, tier and output limit of the models we route between
+MODEL_PROFILES = {
+    "gemini-2.5-flash": {"cost": 1, "tier": "fast", "max_output_tokens": 8192},
+    "gemini-2.5-pro": {"cost": 12, "tier": "strong", "max_output_tokens": 8192},
+    "gemini-1.5-flash": {"cost": 1, "tier": "fast", "max_output_tokens": 8192},
+    "gemini-1.5-flash-001": {"cost": 1, "tier": "fast", "max_output_tokens": 8192},
+    "gemini-1.5-pro": {"cost": 17, "tier": "strong", "max_output_tokens": 8192},
+    "gemini-1.5-pro-001": {"cost": 17, "tier": "strong", "max_output_tokens": 8192},
+    "gemini-pro": {"cost": 5, "tier": "strong", "max_output_tokens": 2048},
+    "claude-3-haiku-20240307": {"cost": 1, "tier": "fast", "max_output_tokens": 4096},
+    "claude-3-5-sonnet-20240620": {"cost": 12, "tier": "strong", "max_output_tokens": 8192},
+}
+
+
+# Families of models found by discovery that are not listed above
+MODEL_FAMILIES = [
+    (re.compile(r"^gemini-\d+(\.\d+)?-flash"), {"cost": 1, "tier": "fast", "max_output_tokens": 8192}),
+    (re.compile(r"^gemini-\d+(\.\d+)?-pro"), {"cost": 12, "tier": "strong", "max_output_tokens": 8192}),
+    (re.compile(r"^claude-.*haiku"), {"cost": 1, "tier": "fast", "max_output_tokens": 4096}),
+    (re.compile(r"^claude-.*(sonnet|opus)"), {"cost": 12, "tier": "strong", "max_output_tokens": 8192}),
+]
+
+# Anything else discovery returns (gemma, aqa, learnlm, ...) is only tried after every known model
+UNKNOWN_PROFILE = {"cost": 10, "tier": None, "max_output_tokens": 4096, "unknown": True}
+
+
+def model_profile(name):
+    """Profile of a model; models found by discovery are placed by their family."""
+    short = name[len("models/"):] if name.startswith("models/") else name
+    profile = MODEL_PROFILES.get(short)
+    if profile is not None:
+        return profile
+    for pattern, profile in MODEL_FAMILIES:
+        if pattern.match(short):
+            return profile
+    return UNKNOWN_PROFILE
+
+
+def wanted_output_tokens(input_tokens):
+    """Output tokens a full answer to a request of input_tokens needs."""
+    return max(MIN_OUTPUT_TOKENS, OUTPUT_TOKENS_BASE + int(input_tokens * OUTPUT_TOKENS_PER_INPUT_TOKEN))
+
+
+def output_limit(name, input_tokens):
+    """Output token limit for a request of input_tokens on this model."""
+    return max(MIN_OUTPUT_TOKENS, min(wanted_output_tokens(input_tokens), model_profile(name)["max_output_tokens"]))
+
+
+class ModelRouter:
+    """Orders the models to try for a request.
+
+    Short prompts start on the fast tier and long ones on the strong tier,
+    within the start cost cap. Models that cannot fit the whole answer in
+    their output limit come after those that can. Within a tier, models
+    meeting the latency target come before slow ones (models without enough
+    samples count as meeting it), then the last model that worked for the
+    caller, then the cheapest, then the fastest timed one. What follows is
+    the escalation order: the rest of the starting tier, then the other
+    tier, then models above the cost cap, then models of unknown families.
+    """
+
+    def __init__(self, latency_target=LATENCY_TARGET_SECONDS, max_start_cost=MAX_START_COST,
+                 short_input_tokens=SHORT_INPUT_TOKENS):
+        self.latency_target = latency_target
+        self.max_start_cost = max_start_cost
+        self.short_input_tokens = short_input_tokens
+        self._latencies = {}
+        self._lock = threading.Lock()
+
+    def observe(self, model, seconds):
+        """Records the latency of a successful call."""
+        with self._lock:
+            self._latencies.setdefault(model, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+    def p95(self, model):
+        """Rolling p95 latency of a model, or None without enough samples."""
+        with self._lock:
+            samples = sorted(self._latencies.get(model, ()))
+        if len(samples) < MIN_SAMPLES_FOR_P95:
+            return None
+        return samples[min(int(len(samples) * 0.95), len(samples) - 1)]
+
+    def plan(self, models, input_tokens, working=None):
+        """[(model, max_output_tokens)] in the order to try them for this request.
+
+        models is the provider's candidate list; its order breaks ties.
+        working is the last model that answered for this caller, if known.
+        """
+        tier = "fast" if input_tokens <= self.short_input_tokens else "strong"
+        wanted = wanted_output_tokens(input_tokens)
+        ranked = []
+        for index, name in enumerate(models):
+            profile = model_profile(name)
+            latency = self.p95(name)
+            # Models we have not timed yet are assumed to meet the target
+            slow = latency is not None and latency > self.latency_target
+            startable = profile["cost"] <= self.max_start_cost
+            truncates = profile["max_output_tokens"] < wanted
+            timed = (0, latency) if latency is not None else (1, 0.0)
+            key = (profile.get("unknown", False), not startable, truncates, profile["tier"] != tier, slow,
+                   name != working, profile["cost"], timed, index)
+            ranked.append((key, name))
+        ranked.sort()
+        return [(name, output_limit(name, input_tokens)) for _, name in ranked]
+
+    def stats(self):
+        with self._lock:
+            counts = {name: len(samples) for name, samples in self._latencies.items()}
+        return {name: {"p95": self.p95(name), "samples": count} for name, count in counts.items()}
+
+
+ROUTER = ModelRouter()
@@ -0,0 +1,232 @@
+import json
+import re
+
+# Field types of the analysis result. A dict is a nested object, a
+# one-element list is a list of that type and a tuple is a set of allowed
+# values.
+SCORE = "score"
+TEXT = "text"
+TEXT_LIST = [TEXT]
+LIKELIHOOD = ("High", "Moderate", "Low")
+
+RESULT_SCHEMA = {
+    "match_score": SCORE,
+    "match_explanation": TEXT,
+    "response_likelihood": LIKELIHOOD,
+    "component_scores": {"skills": SCORE, "experience": SCORE},
+    "job_title": TEXT,
+    "job_level": TEXT,
+    "hard_skills": {"present": TEXT_LIST, "missing": TEXT_LIST},
+    "soft_skills": {"present": TEXT_LIST, "missing": TEXT_LIST},
+    "quantification_analysis": {"score": SCORE, "feedback": TEXT_LIST},
+    "red_flags": TEXT_LIST,
+    "cultural_fit": TEXT,
+    "priority_fixes": TEXT_LIST,
+    "suggested_phrases": [{"context": TEXT, "suggestion": TEXT}],
+}
+
+# Without these there is nothing to show, so the answer counts as failed
+REQUIRED_FIELDS = ("match_score",)
+
+# Assessment of one CV section against the job (map step of the sectioned analysis)
+SECTION_SCHEMA = {
+    "relevance": SCORE,
+    "hard_skills": TEXT_LIST,
+    "soft_skills": TEXT_LIST,
+    "strengths": TEXT_LIST,
+    "red_flags": TEXT_LIST,
+    "quantification_score": SCORE,
+    "quantification_feedback": TEXT_LIST,
+}
+SECTION_REQUIRED_FIELDS = ("relevance",)
+
+# Judgement fields the reduce step adds to the merged section findings
+REDUCE_SCHEMA = {
+    name: RESULT_SCHEMA[name]
+    for name in ("match_score", "match_explanation", "response_likelihood", "component_scores", "job_title",
+                 "job_level", "cultural_fit", "priority_fixes", "suggested_phrases")
+}
+REDUCE_SCHEMA.update(missing_hard_skills=TEXT_LIST, missing_soft_skills=TEXT_LIST)
+
+ENUM_ALIASES = {"medium": "Moderate", "med": "Moderate", "average": "Moderate"}
+
+NUMBER_RE = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+class SchemaError(ValueError):
+    """A value that cannot be coerced to its schema type."""
+
+
+def _coerce(value, spec):
+    if value is None:
+        raise SchemaError("missing")
+
+    if spec == SCORE:
+        if isinstance(value, bool):
+            raise SchemaError(f"not a score: {value!r}")
+        if isinstance(value, str):
+            # "85", "85%", "85/100"
+            match = NUMBER_RE.search(value)
+            if not match:
+                raise SchemaError(f"not a score: {value!r}")
+            value = float(match.group())
+        if not isinstance(value, (int, float)):
+            raise SchemaError(f"not a score: {value!r}")
+        return max(0, min(100, int(round(value))))
+
+    if spec == TEXT:
+        if isinstance(value, (dict, list)):
+            raise SchemaError(f"not text: {value!r}")
+        return str(value).strip()
+
+    if isinstance(spec, tuple):
+        text = str(value).strip().lower()
+        for word in re.findall(r"[a-z]+", text):
+            for allowed in spec:
+                if word == allowed.lower():
+                    return allowed
+            if word in ENUM_ALIASES:
+                return ENUM_ALIASES[word]
+        raise SchemaError(f"not one of {', '.join(spec)}: {value!r}")
+
+    if isinstance(spec, list):
+        if isinstance(value, (str, dict)):
+            value = [value]
+        if not isinstance(value, list):
+            raise SchemaError(f"not a list: {value!r}")
+        items = []
+        for item in value:
+            # A single bad item is dropped rather than failing the whole list
+            try:
+                items.append(_coerce(item, spec[0]))
+            except SchemaError:
+                continue
+        return items
+
+    if isinstance(spec, dict):
+        if not isinstance(value, dict):
+            raise SchemaError(f"not an object: {value!r}")
+        return {key: _coerce(value.get(key), sub_spec) for key, sub_spec in spec.items()}
+
+    raise TypeError(f"unknown schema type {spec!r}")
+
+
+def validate(data, fields=None, schema=RESULT_SCHEMA):
+    """Coerces data to a schema (RESULT_SCHEMA by default).
+
+    Returns (result, missing) where missing lists the top-level fields that
+    are absent or could not be coerced. Only the given fields are checked if
+    fields is set; otherwise fields outside the schema are kept as they are.
+    """
+    names = list(fields) if fields else list(schema)
+    result = {} if fields else {k: v for k, v in data.items() if k not in schema}
+    missing = []
+    for name in names:
+        try:
+            result[name] = _coerce(data.get(name), schema[name])
+        except SchemaError:
+            missing.append(name)
+    return result, missing
+
+
+def repair_json(text):
+    """Best-effort valid JSON for the first object in text.
+
+    Skips prose and code fences around the object, drops trailing commas and
+    closes output that was cut off (e.g. by max_output_tokens), keeping every
+    value that was complete.
+    """
+    start = text.find("{")
+    if start == -1:
+        raise ValueError("No JSON object in response")
+
+    out = []
+    stack = []
+    in_string = escape = string_is_key = False
+    expecting_key = False
+    # Length of out and open containers after the last complete value
+    cut = (0, ())
+    i = start
+    while i < len(text):
+        ch = text[i]
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+                if not string_is_key:
+                    cut = (len(out), tuple(stack))
+            i += 1
+            continue
+
+        if ch == '"':
+            in_string = True
+            string_is_key = expecting_key
+        elif ch in "{[":
+            stack.append(ch)
+            expecting_key = ch == "{"
+        elif ch in "}]":
+            if not stack:
+                break
+            stack.pop()
+            out.append(ch)
+            if not stack:
+                return "".join(out)
+            cut = (len(out), tuple(stack))
+            expecting_key = False
+            i += 1
+            continue
+        elif ch == ",":
+            # Drop trailing commas before a closing bracket
+            j = i + 1
+            while j < len(text) and text[j].isspace():
+                j += 1
+            if j < len(text) and text[j] in "}]":
+                i += 1
+                continue
+            cut = (len(out), tuple(stack))
+            expecting_key = stack[-1] == "{"
+        elif ch == ":":
+            expecting_key = False
+        out.append(ch)
+        i += 1
+
+    # Truncated: keep everything up to the last complete value and close what is open
+    length, open_containers = cut
+    closers = "".join("}" if c == "{" else "]" for c in reversed(open_containers))
+    repaired = "".join(out[:length]).rstrip().rstrip(",")
+    if repaired in ("", "{"):
+        return "{}"
+    return repaired + closers
+
+
+def load_json(text):
+    """Parses the JSON object in a model response.
+
+    Returns (data, repaired), where repaired says whether the text needed
+    fixing. Raises ValueError if no object can be recovered.
+    """
+    start = text.find("{")
+    end = text.rfind("}") + 1
+    if start != -1 and end > start:
+        try:
+            data = json.loads(text[start:end], strict=False)
+            if isinstance(data, dict):
+                return data, False
+        except ValueError:
+            pass
+    data = json.loads(repair_json(text), strict=False)
+    if not isinstance(data, dict):
+        raise ValueError("Response is not a JSON object")
+    return data, True
+
+
+def reask_prompt(missing):
+    """Follow-up instruction asking only for the given fields."""
+    return (
+        "\n\nYour previous answer was cut off or malformed for some fields. Respond with a JSON "
+        f"object containing ONLY these fields from the output format above: {', '.join(missing)}."
+    )
@@ -0,0 +1,160 @@
+import os
+import re
+
+import metrics
+from compaction import CV_TOKEN_BUDGET, clean_lines, estimate_tokens
+
+# CVs longer than this (estimated tokens, after cleaning) are assessed section
+# by section; 0 always uses the single-prompt analysis. Values below the CV
+# budget of the single prompt count as the budget: a CV that fits in one call
+# is not worth N+1 calls.
+MAP_REDUCE_MIN_TOKENS = int(os.getenv("CV_MATCHER_MAP_REDUCE_TOKENS", str(CV_TOKEN_BUDGET)))
+
+# Token budget of one section chunk, and the most chunks assessed per CV
+SECTION_TOKEN_BUDGET = int(os.getenv("CV_MATCHER_SECTION_TOKEN_BUDGET", "2500"))
+MAX_SECTION_CHUNKS = int(os.getenv("CV_MATCHER_MAX_SECTION_CHUNKS", "8"))
+
+# Sections shorter than this share a chunk with their neighbour rather than get a call of their own
+MIN_SECTION_TOKENS = 300
+
+# Lines above the first heading (name, contact details, profile) kept for the reduce step
+PROFILE_TOKEN_BUDGET = 400
+
+# (section kind, heading words). The first match wins, so "skills and
+# experience" style headings count as skills.
+SECTION_HEADINGS = [
+    ("skills", r"skills?|competenc(?:e|ies)|technolog(?:y|ies)|tools|tech stack|expertise|languages|certifications?"),
+    ("education", r"education|academic|qualifications?|degrees?|training|courses?"),
+    ("experience", r"experience|employment|work history|career|positions?|appointments?|roles?|teaching|"
+                   r"research|projects?|volunteering"),
+    ("other", r"publications?|papers|presentations?|talks|conferences?|grants?|funding|awards?|honou?rs|"
+              r"patents?|memberships?|references?|interests|hobbies|activities|achievements"),
+]
+HEADING_RES = [(kind, re.compile(rf"\b(?:{words})\b", re.I)) for kind, words in SECTION_HEADINGS]
+
+# Words that qualify a heading ("Professional Experience", "Technical Skills")
+HEADING_QUALIFIERS = (r"professional|work|relevant|technical|key|core|selected|other|additional|recent|academic|"
+                      r"industry|previous|computer|it|research|teaching|employment|volunteer|project|further")
+_ANY_HEADING = "|".join(words for _, words in SECTION_HEADINGS)
+_QUALIFIED = rf"(?:(?:{HEADING_QUALIFIERS})\s+)*(?:{_ANY_HEADING})"
+# A line that is nothing but heading vocabulary ("Education & Training")
+HEADING_LINE_RE = re.compile(rf"{_QUALIFIED}(?:\s*(?:,|and|&|/)\s*{_QUALIFIED})*", re.I)
+
+# Headings are short lines; longer lines mentioning "experience" are content
+MAX_HEADING_WORDS = 5
+
+
+def heading_kind(line):
+    """Section kind of a heading line, or None for a content line."""
+    text = line.strip(" \t:-–—•*#|").strip()
+    if not text or len(text.split()) > MAX_HEADING_WORDS or len(text) > 50 or re.search(r"[.,;\d]", text):
+        return None
+    # Job titles and course names ("Data Tools Engineer") use the same words:
+    # a heading is set in capitals, ends with a colon or is only heading words
+    if not (text.isupper() or line.rstrip().endswith(":") or HEADING_LINE_RE.fullmatch(text)):
+        return None
+    for kind, pattern in HEADING_RES:
+        if pattern.search(text):
+            return kind
+    return None
+
+
+def split_cv(text):
+    """Splits a CV into its profile and (kind, text) sections.
+
+    Consecutive sections of the same kind are joined, and each kind keeps
+    the order in which it first appears in the CV.
+    """
+    profile = []
+    sections = {}
+    current = None
+    for line in clean_lines(text):
+        kind = heading_kind(line)
+        if kind is not None:
+            current = sections.setdefault(kind, [])
+        if current is None:
+            profile.append(line)
+        else:
+            current.append(line)
+    return "\n".join(profile), [(kind, "\n".join(lines)) for kind, lines in sections.items()]
+
+
+def _chunks(text, budget):
+    """Splits text into pieces of at most budget tokens on line boundaries."""
+    chunk, used = [], 0
+    for line in text.splitlines():
+        cost = estimate_tokens(line) + 1
+        if chunk and used + cost > budget:
+            yield "\n".join(chunk)
+            chunk, used = [], 0
+        chunk.append(line)
+        used += cost
+    if chunk:
+        yield "\n".join(chunk)
+
+
+def section_chunks(text, budget=SECTION_TOKEN_BUDGET, limit=MAX_SECTION_CHUNKS):
+    """Profile text and the (kind, text) chunks to assess for a long CV.
+
+    Returns None when the CV is short or has too little structure for a
+    section-by-section analysis to help.
+    """
+    if not MAP_REDUCE_MIN_TOKENS:
+        return None
+    if estimate_tokens("\n".join(clean_lines(text))) <= max(MAP_REDUCE_MIN_TOKENS, CV_TOKEN_BUDGET):
+        return None
+    profile, sections = split_cv(text)
+    if len(sections) < 2:
+        return None
+
+    chunks = []
+    for kind, section in sections:
+        for chunk in _chunks(section, budget):
+            tokens = estimate_tokens(chunk)
+            if chunks and tokens < MIN_SECTION_TOKENS and chunks[-1][2] + tokens <= budget:
+                previous_kind, previous, used = chunks[-1]
+                if kind not in previous_kind.split(" and "):
+                    previous_kind = f"{previous_kind} and {kind}"
+                chunks[-1] = (previous_kind, f"{previous}\n{chunk}", used + tokens)
+            else:
+                chunks.append((kind, chunk, tokens))
+    chunks = [(kind, chunk) for kind, chunk, _ in chunks]
+    if len(chunks) > limit:
+        # Publication lists and the like are dropped first; experience and skills are kept
+        chunks.sort(key=lambda chunk: chunk[0].startswith("other"))
+        metrics.annotate(sections_dropped=len(chunks) - limit)
+        chunks = chunks[:limit]
+    return next(_chunks(profile, PROFILE_TOKEN_BUDGET), ""), chunks
+
+
+def _unique(items, limit=None):
+    seen = set()
+    kept = []
+    for item in items:
+        key = item.lower()
+        if key not in seen:
+            seen.add(key)
+            kept.append(item)
+    return kept[:limit] if limit else kept
+
+
+def merge_findings(findings):
+    """Combines per-section findings into the list fields of the result.
+
+    findings is a list of (kind, tokens, finding) where finding follows
+    schema.SECTION_SCHEMA. Quantification is averaged by section size.
+    """
+    hard = _unique(skill for _, _, finding in findings for skill in finding.get("hard_skills", []))
+    soft = _unique(skill for _, _, finding in findings for skill in finding.get("soft_skills", []))
+    weighted = [(tokens, finding["quantification_score"]) for _, tokens, finding in findings
+                if "quantification_score" in finding]
+    total = sum(tokens for tokens, _ in weighted)
+    return {
+        "hard_skills": hard,
+        "soft_skills": soft,
+        "red_flags": _unique(flag for _, _, finding in findings for flag in finding.get("red_flags", [])),
+        "quantification_analysis": {
+            "score": int(round(sum(tokens * score for tokens, score in weighted) / total)) if total else 0,
+            "feedback": _unique((tip for _, _, finding in findings for tip in finding.get("quantification_feedback", [])), 3),
+        },
+    }
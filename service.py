@@ -0,0 +1,544 @@
+"""Headless HTTP API: analyse CV / job pairs without the Streamlit UI.
+
+Submitted analyses go into a bounded queue served by a fixed pool of worker
+threads. Every submission gets a job id that can be polled or streamed:
+
+    POST   /v1/analyses               submit; returns 202 {"id", "status", ...}
+    GET    /v1/analyses/<id>          status, timings and (once done) the result
+    GET    /v1/analyses/<id>/events   server-sent events: status, each field, result
+    DELETE /v1/analyses/<id>          cancel a job that has not finished
+    GET    /healthz                   workers, queue depth, running jobs
+    GET    /metrics                   OpenMetrics (see metrics.py)
+
+A submission is JSON ({"cv_text" | "cv_pdf_base64", "job_url" | "job_text",
+"provider", "api_key", "backup_api_key", "timeout"}), a raw PDF body (Content-Type:
+application/pdf, other fields as query parameters) or a multipart form with
+a "cv" file. Without an api_key the server's GOOGLE_API_KEY /
+ANTHROPIC_API_KEY is used. With CV_MATCHER_HEDGE set, a slow analysis is
+also sent to the other provider (see hedging.py), using backup_api_key or,
+for callers on the server's keys, the server's key for it. Set CV_MATCHER_SERVICE_TOKEN to require
+"Authorization: Bearer <token>".
+
+    python service.py --port 8000 --workers 8
+"""
+import argparse
+import base64
+import email.parser
+import email.policy
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from dotenv import load_dotenv
+
+import hedging
+import metrics
+import utils
+from batch import API_KEY_ENV
+from cache import make_key
+from fetch import UnsafeURL, check_public_url
+from ratelimit import request_context
+from result import is_error, json_default
+
+# Seconds a job may take from submission (queueing included) before it is given up
+DEFAULT_TIMEOUT_SECONDS = float(os.getenv("CV_MATCHER_SERVICE_TIMEOUT", "180"))
+MAX_TIMEOUT_SECONDS = 600
+
+# Finished jobs are kept this long for polling
+RESULT_TTL_SECONDS = int(os.getenv("CV_MATCHER_SERVICE_RESULT_TTL", "3600"))
+
+MAX_BODY_BYTES = int(os.getenv("CV_MATCHER_MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+
+SERVICE_TOKEN = os.getenv("CV_MATCHER_SERVICE_TOKEN", "")
+
+FINISHED = ("done", "error", "timeout", "cancelled")
+
+
+class BadRequest(Exception):
+    """A submission the service cannot run; reported to the client as 400."""
+
+
+class Job:
+    """One submitted analysis and everything a poller or stream needs to see."""
+
+    def __init__(self, request, timeout):
+        self.id = uuid.uuid4().hex
+        self.request = request
+        self.status = "queued"
+        self.created = time.time()
+        self.deadline = time.monotonic() + timeout
+        self.started = None
+        self.finished_at = None
+        self.fields = {}
+        self.result = None
+        self.error = None
+        self.timings = {}
+        # (event name, data) in order, replayed to every stream subscriber
+        self.events = [("status", {"status": "queued"})]
+        self.cond = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.status in FINISHED
+
+    def add_field(self, field, value):
+        with self.cond:
+            self.fields[field] = value
+            self.events.append(("field", {"field": field, "value": value}))
+            self.cond.notify_all()
+
+    def release_inputs(self):
+        # The CV and job text are not needed once the job has run
+        self.request = {"provider": self.request["provider"]}
+
+    def set_status(self, status):
+        with self.cond:
+            if self.finished:
+                return False
+            self.status = status
+            if status == "running":
+                self.started = time.time()
+            self.events.append(("status", {"status": status}))
+            self.cond.notify_all()
+            return True
+
+    def finish(self, status, result=None, error=None):
+        """Marks the job finished; returns False if it already was (e.g. timed out)."""
+        with self.cond:
+            if self.finished:
+                return False
+            self.status = status
+            self.result = result
+            self.error = error
+            self.finished_at = time.time()
+            # The result holds every field; the partial copy is no longer needed
+            self.fields = {}
+            if result is not None:
+                self.events.append(("result", result))
+            else:
+                self.events.append(("error", {"status": status, "error": error}))
+            self.cond.notify_all()
+            return True
+
+    def to_dict(self):
+        with self.cond:
+            data = {
+                "id": self.id,
+                "status": self.status,
+                "provider": self.request["provider"],
+                "created": self.created,
+                "started": self.started,
+                "finished": self.finished_at,
+                "timings": dict(self.timings),
+            }
+            if self.status == "running":
+                data["fields"] = dict(self.fields)
+            if self.result is not None:
+                data["result"] = self.result.to_dict()
+            if self.error is not None:
+                data["error"] = self.error
+            return data
+
+
+class AnalysisService:
+    """A bounded job queue served by a fixed pool of worker threads."""
+
+    def __init__(self, workers=4, queue_size=100, default_timeout=DEFAULT_TIMEOUT_SECONDS,
+                 result_ttl=RESULT_TTL_SECONDS):
+        self.workers = workers
+        self.default_timeout = default_timeout
+        self.result_ttl = result_ttl
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._running = 0
+        self._threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"analysis-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        threading.Thread(target=self._watchdog, name="analysis-watchdog", daemon=True).start()
+        return self
+
+    def submit(self, request):
+        """Queues an analysis; raises queue.Full when the queue is at capacity."""
+        timeout = min(float(request.get("timeout") or self.default_timeout), MAX_TIMEOUT_SECONDS)
+        job = Job(request, timeout)
+        self._purge()
+        with self._lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.id]
+            raise
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None:
+            job.finish("cancelled", error="Cancelled by client")
+        return job
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queued": self._queue.qsize(),
+                "running": self._running,
+                "jobs": len(self._jobs),
+            }
+
+    def _purge(self):
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            for job_id, job in list(self._jobs.items()):
+                if job.finished and job.finished_at < cutoff:
+                    del self._jobs[job_id]
+
+    def _watchdog(self):
+        while True:
+            time.sleep(1)
+            now = time.monotonic()
+            with self._lock:
+                jobs = list(self._jobs.values())
+            for job in jobs:
+                if not job.finished and now > job.deadline:
+                    # The worker notices and stops reading the provider's stream
+                    if job.finish("timeout", error="Analysis timed out"):
+                        print(f"Job {job.id} timed out")
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job.finished or not job.set_status("running"):
+                    continue
+                with self._lock:
+                    self._running += 1
+                try:
+                    self._run(job)
+                except Exception as e:
+                    job.finish("error", error=f"Unexpected error: {e}")
+                finally:
+                    with self._lock:
+                        self._running -= 1
+            finally:
+                job.release_inputs()
+                self._queue.task_done()
+
+    def _run(self, job):
+        request = job.request
+        provider = request["provider"]
+        started = time.perf_counter()
+
+        with metrics.request_log(provider=provider, job_id=job.id, source="service") as log:
+            cv_text = request.get("cv_text")
+            if cv_text is None:
+                pdf = utils.extract_pdf(request["cv_pdf"])
+                job.timings["pdf"] = pdf["seconds"]
+                if pdf.get("error"):
+                    log["error"] = pdf["error"]
+                    job.finish("error", error=pdf["text"])
+                    return
+                cv_text = pdf["text"]
+
+            job_text = request.get("job_text")
+            if not job_text:
+                fetch_started = time.perf_counter()
+                job_text = utils.extract_text_from_url(request["job_url"], public_only=True)
+                job.timings["job"] = time.perf_counter() - fetch_started
+                if job_text.startswith("Error fetching URL:"):
+                    log["error"] = job_text
+                    job.finish("error", error=job_text)
+                    return
+
+            if job.finished:
+                return
+
+            analysis_started = time.perf_counter()
+            result = None
+            api_keys = {provider: request["api_key"],
+                        hedging.other_provider(provider): request.get("backup_api_key")}
+            stream = hedging.analysis_stream(cv_text, job_text, provider, api_keys)
+            # Callers sharing an API key queue fairly against each other in the rate limiter
+            with request_context(request["client_id"]):
+                try:
+                    for field, value in stream:
+                        if job.finished:
+                            # Timed out or cancelled: stop reading the provider's answer
+                            break
+                        if field is None:
+                            result = value
+                            break
+                        job.add_field(field, value)
+                finally:
+                    stream.close()
+
+            job.timings["analysis"] = time.perf_counter() - analysis_started
+            job.timings["total"] = time.perf_counter() - started
+            if result is None:
+                log["error"] = job.error or "Abandoned"
+                return
+            if is_error(result):
+                log["error"] = result["error"]
+                job.finish("error", error=result["error"])
+            else:
+                job.finish("done", result=result)
+
+
+def _multipart(body, content_type):
+    """Fields of a multipart/form-data body: {name: str or bytes (files)}."""
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode() + body
+    )
+    fields = {}
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        if not name:
+            continue
+        payload = part.get_payload(decode=True) or b""
+        fields[name] = payload if part.get_filename() else payload.decode("utf-8", "replace")
+    return fields
+
+
+def parse_submission(body, content_type, query):
+    """Normalises the three submission formats into one request dict."""
+    content_type = content_type or ""
+    if content_type.startswith("application/json"):
+        try:
+            fields = json.loads(body or b"{}")
+        except ValueError as e:
+            raise BadRequest(f"Invalid JSON: {e}")
+        if not isinstance(fields, dict):
+            raise BadRequest("Expected a JSON object")
+    elif content_type.startswith("multipart/form-data"):
+        fields = _multipart(body, content_type)
+    elif content_type.startswith("application/pdf"):
+        fields = {"cv_pdf": body}
+    else:
+        raise BadRequest("Send JSON, a PDF or a multipart form")
+    for name, value in query.items():
+        fields.setdefault(name, value)
+
+    request = {"provider": fields.get("provider") or "gemini"}
+    if request["provider"] not in utils.STREAMING_PROVIDERS:
+        raise BadRequest(f"Unknown provider {request['provider']!r}")
+
+    if fields.get("cv_text"):
+        request["cv_text"] = fields["cv_text"]
+    elif isinstance(fields.get("cv"), bytes) or fields.get("cv_pdf"):
+        request["cv_pdf"] = fields.get("cv_pdf") or fields["cv"]
+    elif fields.get("cv_pdf_base64"):
+        try:
+            request["cv_pdf"] = base64.b64decode(fields["cv_pdf_base64"], validate=True)
+        except ValueError:
+            raise BadRequest("cv_pdf_base64 is not valid base64")
+    else:
+        raise BadRequest("No CV given (cv_text, cv_pdf_base64, a PDF body or a 'cv' file)")
+
+    if fields.get("job_text"):
+        request["job_text"] = fields["job_text"]
+    elif fields.get("job_url"):
+        try:
+            check_public_url(fields["job_url"])
+        except UnsafeURL as e:
+            raise BadRequest(str(e))
+        request["job_url"] = fields["job_url"]
+    else:
+        raise BadRequest("No job given (job_url or job_text)")
+
+    request["api_key"] = fields.get("api_key") or os.getenv(API_KEY_ENV[request["provider"]])
+    if not request["api_key"]:
+        raise BadRequest(f"No API key for {request['provider']} (api_key or {API_KEY_ENV[request['provider']]})")
+    # The server's key for the other provider is only lent to callers already on its keys
+    backup_env = API_KEY_ENV[hedging.other_provider(request["provider"])]
+    request["backup_api_key"] = fields.get("backup_api_key") or (None if fields.get("api_key") else os.getenv(backup_env))
+    if fields.get("timeout"):
+        try:
+            request["timeout"] = float(fields["timeout"])
+        except (TypeError, ValueError):
+            raise BadRequest("timeout must be a number of seconds")
+    # Fair-queueing identity in the rate limiter: the caller's own key, never the key itself
+    request["client_id"] = fields.get("client_id") or make_key(request["api_key"])[:16]
+    return request
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send_json(self, status, data, headers=None):
+            body = json.dumps(data, ensure_ascii=False, default=json_default).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _authorised(self):
+            if not SERVICE_TOKEN or self.headers.get("Authorization") == f"Bearer {SERVICE_TOKEN}":
+                return True
+            self._send_json(401, {"error": "Missing or invalid bearer token"})
+            return False
+
+        def _job(self, job_id):
+            job = service.get(job_id)
+            if job is None:
+                self._send_json(404, {"error": f"No job {job_id}"})
+            return job
+
+        def do_GET(self):
+            path = urlsplit(self.path).path.rstrip("/")
+            if path == "/healthz":
+                self._send_json(200, dict(service.stats(), status="ok"))
+                return
+            if path == "/metrics":
+                body = metrics.render(openmetrics=True).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", metrics.OPENMETRICS_CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+            if not self._authorised():
+                return
+            parts = path.split("/")
+            if len(parts) == 4 and parts[1:3] == ["v1", "analyses"]:
+                job = self._job(parts[3])
+                if job is not None:
+                    self._send_json(200, job.to_dict())
+            elif len(parts) == 5 and parts[1:3] == ["v1", "analyses"] and parts[4] == "events":
+                job = self._job(parts[3])
+                if job is not None:
+                    self._stream(job)
+            else:
+                self._send_json(404, {"error": "Not found"})
+
+        def do_POST(self):
+            if not self._authorised():
+                return
+            url = urlsplit(self.path)
+            if url.path.rstrip("/") != "/v1/analyses":
+                self._send_json(404, {"error": "Not found"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+            except ValueError:
+                length = -1
+            if length < 0:
+                self._send_json(400, {"error": "Invalid Content-Length"})
+                self.close_connection = True
+                return
+            if length > MAX_BODY_BYTES:
+                self._send_json(413, {"error": f"Body larger than {MAX_BODY_BYTES} bytes"})
+                self.close_connection = True
+                return
+            body = self.rfile.read(length)
+            try:
+                request = parse_submission(body, self.headers.get("Content-Type"), dict(parse_qsl(url.query)))
+                job = service.submit(request)
+            except BadRequest as e:
+                self._send_json(400, {"error": str(e)})
+                return
+            except queue.Full:
+                self._send_json(503, {"error": "Too many queued analyses, try again shortly"},
+                                headers={"Retry-After": "5"})
+                return
+            location = f"/v1/analyses/{job.id}"
+            self._send_json(202, {"id": job.id, "status": job.status, "location": location,
+                                  "events": f"{location}/events", "queued": service.stats()["queued"]},
+                            headers={"Location": location})
+
+        def do_DELETE(self):
+            if not self._authorised():
+                return
+            parts = urlsplit(self.path).path.rstrip("/").split("/")
+            if len(parts) == 4 and parts[1:3] == ["v1", "analyses"]:
+                if self._job(parts[3]) is not None:
+                    self._send_json(200, service.cancel(parts[3]).to_dict())
+            else:
+                self._send_json(404, {"error": "Not found"})
+
+        def _stream(self, job):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            sent = 0
+            try:
+                while True:
+                    with job.cond:
+                        if sent == len(job.events) and not job.finished:
+                            job.cond.wait(15)
+                        events = job.events[sent:]
+                        finished = job.finished
+                    if not events:
+                        # Keeps proxies from closing an idle stream
+                        self.wfile.write(b": keep-alive\n\n")
+                    for name, data in events:
+                        self.wfile.write(f"event: {name}\ndata: {json.dumps(data, default=json_default)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                    sent += len(events)
+                    if finished and sent == len(job.events):
+                        return
+            except (BrokenPipeError, ConnectionResetError):
+                return
+
+        def log_message(self, format, *args):
+            print(f"{self.address_string()} {format % args}", file=sys.stderr)
+
+    return Handler
+
+
+def serve(host="127.0.0.1", port=8000, workers=4, queue_size=100, timeout=DEFAULT_TIMEOUT_SECONDS):
+    """Starts the worker pool and returns the (not yet serving) HTTP server."""
+    service = AnalysisService(workers=workers, queue_size=queue_size, default_timeout=timeout).start()
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the CV matcher as an HTTP service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=4, help="Analyses run at the same time")
+    parser.add_argument("--queue-size", type=int, default=100, help="Analyses waiting before new ones get 503")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT_SECONDS,
+                        help="Default seconds per analysis, queueing included")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    utils.prewarm()
+    server = serve(args.host, args.port, args.workers, args.queue_size, args.timeout)
+    print(f"Serving on http://{args.host}:{server.server_address[1]} with {args.workers} workers", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
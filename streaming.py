@@ -0,0 +1,92 @@
+import json
+
+
+class IncrementalJSONParser:
+    """Parses a streamed JSON object and reports each top-level field once it is complete.
+
+    Text before the opening brace (e.g. "Here is the analysis:") is skipped.
+    Call feed() with every chunk as it arrives; it returns the list of
+    (key, value) pairs completed by that chunk.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.fields = {}
+        self.done = False
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._key_start = None
+        self._key = None
+        self._value_start = None
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        completed = []
+        buf = self.buffer
+        while self._pos < len(buf) and not self.done:
+            ch = buf[self._pos]
+
+            if self._depth == 0:
+                # Skip any prose or code fence before the object starts
+                if ch == "{":
+                    self._depth = 1
+                self._pos += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._key_start is not None and self._key is None:
+                        self._key = json.loads(buf[self._key_start:self._pos + 1])
+                self._pos += 1
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                if self._depth == 1 and self._key is None:
+                    self._key_start = self._pos
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._complete_field(buf, completed)
+                    self.done = True
+            elif self._depth == 1:
+                if ch == ":" and self._key is not None and self._value_start is None:
+                    self._value_start = self._pos + 1
+                elif ch == ",":
+                    self._complete_field(buf, completed)
+            self._pos += 1
+        return completed
+
+    def _complete_field(self, buf, completed):
+        if self._key is not None and self._value_start is not None:
+            raw = buf[self._value_start:self._pos].strip()
+            try:
+                value = json.loads(raw)
+            except ValueError:
+                value = None
+            if value is not None or raw == "null":
+                self.fields[self._key] = value
+                completed.append((self._key, value))
+        self._key_start = None
+        self._key = None
+        self._value_start = None
+
+    def result(self):
+        """The whole object parsed from the buffer, or the fields seen so far if it is invalid."""
+        start = self.buffer.find("{")
+        end = self.buffer.rfind("}") + 1
+        if start != -1 and end > start:
+            try:
+                return json.loads(self.buffer[start:end])
+            except ValueError:
+                pass
+        return dict(self.fields)
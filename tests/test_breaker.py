@@ -0,0 +1,22 @@
+from breaker import CircuitBreaker, classify_error
+
+
+def test_caller_errors_never_open_the_circuit():
+    breaker = CircuitBreaker(failure_threshold=1)
+    for _ in range(5):
+        breaker.record_failure(("key-a", "model"), Exception("401 invalid x-api-key"))
+        breaker.record_failure(("key-a", "model"), Exception("429 Quota exceeded"))
+    assert breaker.allow(("key-a", "model"))
+
+
+def test_circuits_are_per_key():
+    breaker = CircuitBreaker()
+    assert breaker.record_failure(("key-a", "model"), Exception("404 model not found")) == "not_found"
+    assert not breaker.allow(("key-a", "model"))
+    assert breaker.allow(("key-b", "model"))
+
+
+def test_classify_error_kinds():
+    assert classify_error(Exception("400 API key not valid. Please pass a valid API key.")) == "auth"
+    assert classify_error(Exception("529 Overloaded")) == "overloaded"
+    assert classify_error(Exception("connection reset")) == "error"
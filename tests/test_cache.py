@@ -0,0 +1,29 @@
+import sqlite3
+
+import pytest
+
+import cache
+from cache import ResultCache
+
+
+def test_disk_operations_close_their_connections(tmp_path, monkeypatch):
+    opened = []
+    connect = sqlite3.connect
+
+    def tracking_connect(*args, **kwargs):
+        opened.append(connect(*args, **kwargs))
+        return opened[-1]
+
+    monkeypatch.setattr(cache.sqlite3, "connect", tracking_connect)
+    store = ResultCache("test", path=str(tmp_path / "cache.sqlite3"), max_disk_bytes=200)
+    for i in range(20):
+        store.set(f"key-{i}", {"value": "x" * 40})
+        store._memory.clear()
+        assert store.get(f"key-{i}") == {"value": "x" * 40}
+    stats = store.stats()
+
+    assert stats["evictions"] > 0
+    assert stats["disk_bytes"] <= 200
+    for conn in opened:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
@@ -0,0 +1,27 @@
+from cassette import Cassette
+
+USAGE = {"input_tokens": 10, "cached_tokens": 0, "cache_write_tokens": 0, "output_tokens": 0}
+
+
+def _refused():
+    """A completion with no text at all."""
+    return dict(USAGE)
+    yield
+
+
+def _drain(stream):
+    chunks = []
+    while True:
+        try:
+            chunks.append(next(stream))
+        except StopIteration as stop:
+            return chunks, stop.value
+
+
+def test_empty_stream_recording_replays(tmp_path):
+    path = str(tmp_path / "cassette.jsonl")
+    recorder = Cassette(path, mode="record")
+    assert _drain(recorder.stream("claude", "model", "system", "prompt", 100, _refused)) == ([], USAGE)
+
+    player = Cassette(path, mode="replay", latency="none")
+    assert _drain(player.stream("claude", "model", "system", "prompt", 100, None)) == ([], USAGE)
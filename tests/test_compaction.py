@@ -0,0 +1,36 @@
+from compaction import compact_job
+from jobpage import extract_job_text
+
+REQUIREMENT_LINES = [
+    "Experience with cookie consent frameworks (OneTrust)",
+    "Sign in with Apple / OAuth flows",
+    "Privacy policy drafting with legal",
+    "You will build consent management tooling used by millions of visitors",
+]
+
+
+def test_pasted_job_text_keeps_requirement_lines_with_chrome_words():
+    text = "Senior Frontend Engineer\nRequirements:\n" + "\n".join(REQUIREMENT_LINES)
+    compacted = compact_job(text).splitlines()
+    for line in REQUIREMENT_LINES:
+        assert line in compacted
+
+
+def test_scraped_page_drops_chrome_lines_but_keeps_requirements():
+    items = "".join(f"<li>{line}</li>" for line in REQUIREMENT_LINES)
+    page = f"""<html><body>
+    <p>Accept all cookies</p>
+    <p>Sign in</p>
+    <div><h1>Senior Frontend Engineer</h1>
+    <p>We are looking for an engineer to own our consent and identity products end to end.</p>
+    <h3>Requirements</h3><ul>{items}</ul></div>
+    <p>Privacy Policy | Terms of Service</p>
+    </body></html>"""
+    text, source = extract_job_text(page)
+    lines = text.splitlines()
+    assert source == "html"
+    assert "Accept all cookies" not in lines
+    assert "Sign in" not in lines
+    assert "Privacy Policy | Terms of Service" not in lines
+    for line in REQUIREMENT_LINES:
+        assert line in lines
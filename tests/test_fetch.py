@@ -0,0 +1,29 @@
+import pytest
+
+from fetch import UnsafeURL, canonical_url, check_public_url
+
+
+@pytest.mark.parametrize("url", [
+    "http://127.0.0.1:8000/admin",
+    "http://localhost/",
+    "http://10.1.2.3/job",
+    "http://192.168.0.10/job",
+    "http://169.254.169.254/latest/meta-data/",
+    "http://[::1]/",
+    "http://[::ffff:127.0.0.1]/",
+    "file:///etc/passwd",
+])
+def test_internal_urls_are_refused(url):
+    with pytest.raises(UnsafeURL):
+        check_public_url(url)
+
+
+def test_public_address_is_allowed():
+    check_public_url("https://93.184.215.14/jobs/123")
+
+
+def test_canonical_url_strips_only_known_trackers():
+    a = canonical_url("https://jobs.example.com/view?from=123&utm_source=x&gclid=abc")
+    b = canonical_url("https://jobs.example.com/view?from=456&fbclid=def")
+    assert a != b
+    assert a == canonical_url("https://jobs.example.com/view/?from=123")
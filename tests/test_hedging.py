@@ -0,0 +1,57 @@
+import asyncio
+import threading
+import time
+
+import hedging
+import utils
+from result import AnalysisResult
+
+
+def _fake_stream(delay, score=70, closed=None, error=None):
+    def stream(cv_text, job_text, api_key):
+        try:
+            time.sleep(delay)
+            if error:
+                yield None, {"error": error}
+                return
+            yield "match_score", score
+            time.sleep(0.05)
+            yield None, AnalysisResult(match_score=score)
+        finally:
+            if closed is not None:
+                closed.set()
+    return stream
+
+
+def _providers(monkeypatch, gemini, claude):
+    monkeypatch.setattr(utils, "STREAMING_PROVIDERS", {"gemini": gemini, "claude": claude})
+
+
+KEYS = {"gemini": "g", "claude": "c"}
+
+
+def test_slow_primary_is_hedged_and_its_stream_closed(monkeypatch):
+    closed = threading.Event()
+    _providers(monkeypatch, _fake_stream(0.5, 10, closed), _fake_stream(0.0, 90))
+    events = list(hedging.stream_hedged("cv", "job", KEYS, primary="gemini", delay=0.1))
+    assert events[0] == ("match_score", 90)
+    assert events[-1][1].match_score == 90
+    assert closed.wait(2)
+
+
+def test_fast_primary_is_not_hedged(monkeypatch):
+    _providers(monkeypatch, _fake_stream(0.0, 10), _fake_stream(0.0, 90))
+    events = list(hedging.stream_hedged("cv", "job", KEYS, primary="gemini", delay=1))
+    assert [value for field, value in events if field] == [10]
+
+
+def test_failed_primary_falls_back_to_backup(monkeypatch):
+    _providers(monkeypatch, _fake_stream(0.0, error="boom"), _fake_stream(0.0, 90))
+    result = asyncio.run(hedging.analyze_hedged("cv", "job", KEYS, primary="gemini", delay=5))
+    assert result.match_score == 90
+
+
+def test_without_backup_key_only_the_primary_runs(monkeypatch):
+    _providers(monkeypatch, _fake_stream(0.0, error="boom"), _fake_stream(0.0, 90))
+    result = asyncio.run(hedging.analyze_hedged("cv", "job", {"gemini": "g"}, primary="gemini", delay=0))
+    assert result == {"error": "boom"}
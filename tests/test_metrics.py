@@ -0,0 +1,15 @@
+import socket
+
+import metrics
+
+
+def test_start_server_logs_bind_failure_once(monkeypatch, capsys):
+    monkeypatch.setattr(metrics, "_server", None)
+    monkeypatch.setattr(metrics, "_server_error", None)
+    with socket.socket() as taken:
+        taken.bind(("127.0.0.1", 0))
+        taken.listen()
+        port = taken.getsockname()[1]
+        for _ in range(3):
+            assert metrics.start_server(port=port, host="127.0.0.1") is None
+    assert capsys.readouterr().out.count("Metrics endpoint not started") == 1
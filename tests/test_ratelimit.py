@@ -0,0 +1,47 @@
+import threading
+import time
+
+import pytest
+
+from ratelimit import FairScheduler, with_backoff
+
+
+def test_slow_on_wait_does_not_block_other_waiters():
+    scheduler = FairScheduler(rpm=60, tpm=1000000)
+    for _ in range(60):
+        scheduler.requests.take(1)
+    in_callback, release = threading.Event(), threading.Event()
+
+    def on_wait(position):
+        in_callback.set()
+        release.wait(5)
+
+    waiter = threading.Thread(target=scheduler.acquire, args=("a",), kwargs={"on_wait": on_wait, "timeout": 5})
+    waiter.start()
+    assert in_callback.wait(2)
+    # The callback is still running; the scheduler must stay usable meanwhile
+    checked = threading.Thread(target=scheduler.queue_length)
+    checked.start()
+    checked.join(1)
+    assert not checked.is_alive()
+    release.set()
+    waiter.join(5)
+
+
+def test_every_retry_takes_a_rate_limit_slot(monkeypatch):
+    monkeypatch.setattr(time, "sleep", lambda seconds: None)
+    calls, slots = [], []
+
+    def call():
+        calls.append(1)
+        if len(calls) < 3:
+            raise Exception("429 Resource has been exhausted (e.g. check quota)")
+        return "ok"
+
+    assert with_backoff(call, acquire=lambda: slots.append(1)) == "ok"
+    assert len(slots) == 2
+
+
+def test_non_quota_errors_are_not_retried():
+    with pytest.raises(ValueError):
+        with_backoff(lambda: (_ for _ in ()).throw(ValueError("bad request")), acquire=lambda: None)
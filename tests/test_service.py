@@ -0,0 +1,38 @@
+import http.client
+import json
+import threading
+
+import pytest
+
+import service
+
+
+@pytest.fixture
+def server():
+    server = service.serve(port=0, workers=1)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+
+
+def _post(server, body, headers):
+    connection = http.client.HTTPConnection(*server.server_address, timeout=5)
+    connection.putrequest("POST", "/v1/analyses")
+    for name, value in headers.items():
+        connection.putheader(name, value)
+    connection.endheaders(body)
+    response = connection.getresponse()
+    return response.status, json.loads(response.read())
+
+
+def test_non_numeric_content_length_is_a_bad_request(server):
+    status, body = _post(server, b"{}", {"Content-Type": "application/json", "Content-Length": "abc"})
+    assert status == 400
+
+
+def test_internal_job_url_is_refused(server):
+    payload = json.dumps({"cv_text": "CV", "job_url": "http://169.254.169.254/latest/meta-data/",
+                          "api_key": "test"}).encode()
+    status, body = _post(server, payload, {"Content-Type": "application/json", "Content-Length": str(len(payload))})
+    assert status == 400
+    assert "non-public" in body["error"]
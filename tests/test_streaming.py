@@ -0,0 +1,23 @@
+import utils
+from result import AnalysisResult
+from streaming import IncrementalJSONParser
+
+MALFORMED = (
+    '{"match_score": "not a number", "ats_keywords": ["python", "sql"], "job_title": "Data Engineer", '
+    '"component_scores": {"skills": "high", "experience": 70}, "hard_skills": "Python", '
+    '"suggested_phrases": ["just text"], "red_flags": null}'
+)
+
+
+def test_malformed_streamed_fields_still_build_a_partial_result():
+    parser = IncrementalJSONParser()
+    fields = {}
+    # Fed a few characters at a time, the way a provider streams
+    for i in range(0, len(MALFORMED), 7):
+        for field, value in utils._valid_fields(parser.feed(MALFORMED[i:i + 7])):
+            fields[field] = value
+            result = AnalysisResult.from_dict(fields)
+    # Unknown and mistyped fields wait for the final (validated, re-asked) result
+    assert set(fields) == {"job_title", "suggested_phrases"}
+    assert result.job_title == "Data Engineer"
+    assert result.suggested_phrases == ()
@@ -1,48 +1,172 @@
-import google.generativeai as genai
-import pypdf
-import requests
-from bs4 import BeautifulSoup
+import asyncio
+import contextvars
+import datetime
+import functools
+import hashlib
+import io
+import importlib
 import json
 import os
-import anthropic
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+import metrics
+from breaker import CircuitBreaker
+from cassette import CASSETTE
+from clients import GEMINI_API_ENDPOINT, anthropic_client, gemini_service
+from cache import PDF_TEXT_CACHE, RESULT_CACHE, URL_TEXT_CACHE, make_key, normalise_text
+from compaction import compact_inputs, compact_job, estimate_tokens
+from fetch import canonical_url, fetch_url
+from jobindex import JOB_INDEX
+from jobpage import extract_job_text
+from keywords import apply_keyword_analysis
+from ratelimit import RateLimitTimeout, throttle, with_backoff
+from result import AnalysisResult, is_error
+from routing import ROUTER
+from schema import (
+    REDUCE_SCHEMA, REQUIRED_FIELDS, RESULT_SCHEMA, SECTION_REQUIRED_FIELDS, SECTION_SCHEMA, load_json, reask_prompt,
+    validate,
+)
+from sections import merge_findings, section_chunks
+from streaming import IncrementalJSONParser
 
-def extract_text_from_pdf(uploaded_file):
-    """Extracts text from a PDF file."""
+# Provider SDKs and parsers are imported on first use, so a worker only pays
+# for the provider and extractors its sessions actually use
+LAZY_MODULES = {
+    "gemini": ("google.generativeai",),
+    "claude": ("anthropic",),
+    "pdf": ("pypdf",),
+    "html": ("bs4", "requests"),
+}
+
+def _genai():
+    import google.generativeai as genai
+    return genai
+
+_prewarm_thread = None
+_prewarm_lock = threading.Lock()
+
+def prewarm(groups=None):
+    """Imports the lazily loaded modules in a background thread.
+
+    groups defaults to CV_MATCHER_PREWARM (comma-separated keys of
+    LAZY_MODULES, or "all"); nothing is loaded when it is empty. Only the
+    first call in a process does anything. Returns the thread, or None.
+    """
+    global _prewarm_thread
+    if groups is None:
+        groups = os.getenv("CV_MATCHER_PREWARM", "")
+    if isinstance(groups, str):
+        groups = list(LAZY_MODULES) if groups.strip() == "all" else [g.strip() for g in groups.split(",") if g.strip()]
+    with _prewarm_lock:
+        if _prewarm_thread is not None or not groups:
+            return None
+
+        def run():
+            for group in groups:
+                started = time.perf_counter()
+                try:
+                    for name in LAZY_MODULES[group]:
+                        importlib.import_module(name)
+                except Exception as e:
+                    print(f"Pre-warm of {group} failed: {e}")
+                    continue
+                print(f"Pre-warmed {group} in {time.perf_counter() - started:.2f}s")
+
+        _prewarm_thread = threading.Thread(target=run, name="cv-matcher-prewarm", daemon=True)
+        _prewarm_thread.start()
+        return _prewarm_thread
+
+def _read_upload(uploaded_file):
+    """Returns the raw bytes of an upload, file object or path."""
+    if isinstance(uploaded_file, (bytes, bytearray)):
+        return bytes(uploaded_file)
+    if isinstance(uploaded_file, str):
+        with open(uploaded_file, "rb") as f:
+            return f.read()
+    if hasattr(uploaded_file, "getvalue"):
+        # Streamlit UploadedFile / BytesIO keep the whole upload in memory
+        return uploaded_file.getvalue()
+    if hasattr(uploaded_file, "seek"):
+        uploaded_file.seek(0)
+    return uploaded_file.read()
+
+def iter_pdf_pages(data):
+    """Yields the text of each page of a PDF one at a time."""
+    import pypdf
+    pdf_reader = pypdf.PdfReader(io.BytesIO(data))
+    for page in pdf_reader.pages:
+        yield page.extract_text() or ""
+
+def extract_pdf(uploaded_file):
+    """Extracts text from a PDF file, with page count and extraction time.
+
+    Text is cached by a hash of the file bytes, so the same CV uploaded again
+    (in any session) is never parsed twice.
+    """
+    started = time.perf_counter()
     try:
-        pdf_reader = pypdf.PdfReader(uploaded_file)
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text()
-        return text
+        data = _read_upload(uploaded_file)
+        digest = hashlib.sha256(data).hexdigest()
+
+        cached = PDF_TEXT_CACHE.get(digest)
+        if cached is not None:
+            cached["cached"] = True
+            cached["seconds"] = time.perf_counter() - started
+            metrics.annotate(pdf_pages=cached["pages"], pdf_cached=True)
+            return cached
+
+        with metrics.stage("pdf_extract"):
+            pages = list(iter_pdf_pages(data))
+        metrics.annotate(pdf_pages=len(pages), pdf_cached=False)
+        result = {
+            "text": "\f".join(pages),
+            "pages": len(pages),
+            "sha256": digest,
+        }
+        PDF_TEXT_CACHE.set(digest, result)
+        result["cached"] = False
+        result["seconds"] = time.perf_counter() - started
+        return result
     except Exception as e:
-        return f"Error reading PDF: {e}"
+        return {
+            "text": f"Error reading PDF: {e}",
+            "error": str(e),
+            "pages": 0,
+            "cached": False,
+            "seconds": time.perf_counter() - started,
+        }
 
-def extract_text_from_url(url):
-    """Extracts text from a job listing URL."""
+def extract_text_from_pdf(uploaded_file):
+    """Extracts text from a PDF file."""
+    return extract_pdf(uploaded_file)["text"]
+
+def extract_text_from_url(url, public_only=False):
+    """Extracts text from a job listing URL (public_only: see fetch.fetch_url)."""
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # Remove script and style elements
-        for script in soup(["script", "style"]):
-            script.decompose()
-            
-        text = soup.get_text()
-        
-        # Break into lines and remove leading/trailing space on each
-        lines = (line.strip() for line in text.splitlines())
-        # Break multi-headlines into a line each
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        # Drop blank lines
-        text = '\n'.join(chunk for chunk in chunks if chunk)
+        key = canonical_url(url)
+        cached = URL_TEXT_CACHE.get(key)
+        if cached is not None:
+            return cached["text"]
         
+        with metrics.stage("url_fetch"):
+            content = fetch_url(url, timeout=10, public_only=public_only)
+        with metrics.stage("html_clean"):
+            # schema.org JobPosting when the page has one, else the page's main content
+            text, source = extract_job_text(content)
+        metrics.annotate(job_source=source)
+        # A page that yielded no text (a JS-only board, a block page) is fetched again next time
+        if text.strip():
+            URL_TEXT_CACHE.set(key, {"text": text, "source": source})
         return text
     except Exception as e:
         return f"Error fetching URL: {e}"
 
 # Shared Prompts
-# Shared Prompts
+# Bump PROMPT_VERSION whenever the prompts change so cached results are not reused
+PROMPT_VERSION = "3"
+
 SYSTEM_PROMPT = """You are an experienced recruiter with 15+ years of hiring experience across multiple industries. Your task is to analyse a CV against a job specification and provide honest, actionable feedback.
 
 ## How Recruiters Actually Review CVs
@@ -142,157 +266,1078 @@ Identify potential concerns:
 - Remember: the goal is to help them get interviews, not to achieve a perfect score.
 """
 
-ANALYSIS_PROMPT_TEMPLATE = """
-**CV Text:**
-{cv_text}
-
-**Job Listing Text:**
-{job_text}
+# Output format and guidelines. Kept free of per-request text so that, together
+# with SYSTEM_PROMPT, it forms a stable prefix the providers can cache.
+ANALYSIS_INSTRUCTIONS = """
+## Output Format
 
-Please analyze the match and provide the output in the following JSON format:
-{{
+Analyse the match and provide the output in the following JSON format:
+{
     "match_score": "Integer between 0 and 100",
     "match_explanation": "Short explanation of the score (max 2 sentences)",
     "response_likelihood": "High, Moderate, or Low",
-    "component_scores": {{
+    "component_scores": {
         "skills": "Integer 0-100",
-        "experience": "Integer 0-100",
-        "keywords": "Integer 0-100"
-    }},
+        "experience": "Integer 0-100"
+    },
     "job_title": "Extracted Job Title",
     "job_level": "Junior, Mid, Senior, Lead, etc.",
-    "ats_keywords": {{
-        "missing": ["List of exact keywords/skills from the job description that are missing from the CV. CRITICAL for ATS."]
-    }},
-    "hard_skills": {{
+    "hard_skills": {
         "present": ["List of hard skills found in CV"],
         "missing": ["List of hard skills required but missing"]
-    }},
-    "soft_skills": {{
+    },
+    "soft_skills": {
         "present": ["List of soft skills found in CV"],
         "missing": ["List of soft skills required but missing"]
-    }},
-    "quantification_analysis": {{
+    },
+    "quantification_analysis": {
         "score": "Integer 0-100 representing how well achievements are quantified",
         "feedback": ["List 3 specific ways to strengthen the CV's impact, even if the score is high. Focus on adding metrics or stronger verbs."]
-    }},
+    },
     "red_flags": ["List of potential red flags (e.g., employment gaps, job hopping, vague dates, formatting issues). Return empty list if none."],
     "cultural_fit": "Summary of cultural fit based on values mentioned in the listing (or 'Not mentioned' if none found)",
     "priority_fixes": ["The Top 3 most critical things to fix FIRST to improve the match score."],
     "suggested_phrases": [
-        {{
+        {
             "context": "Brief context (e.g. 'For the Leadership section')",
             "suggestion": "Draft text the user can adapt (e.g. 'Spearheaded a cross-functional team of 5...')"
-        }}
+        }
     ]
-}}
+}
 
 **Important Guidelines:**
 - Use British English spelling.
 - **Capitalization**: Ensure ALL bullet points (keywords, fixes, feedback) start with a Capital letter.
-- **ATS Focus**: Be ruthless about missing keywords.
+- **ATS Focus**: Keyword coverage is scored separately; focus on whether skills are evidenced, not just listed.
 - **Quantification**: Look for numbers, percentages, and $ amounts. If missing, flag it.
 - **Tone**: Professional, constructive, but direct. Don't sugarcoat red flags.
 - If the CV or Job text is too short or invalid, return a JSON with a score of 0 and an explanation of the error.
 """
 
-def analyze_cv(cv_text, job_text, api_key):
-    """Analyzes CV against Job Description using Gemini API."""
-    
-    genai.configure(api_key=api_key)
-    
-    # Set up the model
-    generation_config = {
-        "temperature": 0.7,
-        "top_p": 1,
-        "top_k": 1,
-        "max_output_tokens": 2048,
-        "response_mime_type": "application/json",
-    }
-    
-    # Construct the full prompt
-    full_prompt = f"{SYSTEM_PROMPT}\n\n{ANALYSIS_PROMPT_TEMPLATE.format(cv_text=cv_text, job_text=job_text)}"
-
-    # Define preferred models in order of priority (Flash models first for speed/cost)
-    preferred_models = [
-        "gemini-1.5-flash",
-        "gemini-1.5-flash-001",
-        "models/gemini-1.5-flash",
-        "models/gemini-1.5-flash-001",
-        "gemini-1.5-pro",
-        "gemini-1.5-pro-001",
-        "models/gemini-1.5-pro",
-        "models/gemini-1.5-pro-001",
-        "gemini-pro",
-        "models/gemini-pro"
+# Static, cacheable part of every request
+PROMPT_PREFIX = f"{SYSTEM_PROMPT}\n{ANALYSIS_INSTRUCTIONS}"
+
+ANALYSIS_PROMPT_TEMPLATE = """
+**CV Text:**
+{cv_text}
+
+**Job Listing Text:**
+{job_text}
+
+Please analyze the match and respond with JSON in the output format described above.
+"""
+
+# Long CVs are assessed section by section (map) and the findings combined
+# by a small final call (reduce), so no single answer outgrows its token limit
+SECTION_PROMPT = """You are an experienced recruiter assessing ONE section of a long CV against a job specification. The other sections are assessed separately, so judge only what this section shows.
+
+## Output Format
+
+Respond with JSON in the following format:
+{
+    "relevance": "Integer 0-100: how strongly this section evidences what the job asks for",
+    "hard_skills": ["Hard skills the job asks for that this section evidences"],
+    "soft_skills": ["Soft skills the job asks for that this section evidences"],
+    "strengths": ["Up to 3 strongest points of this section for this job"],
+    "red_flags": ["Red flags visible in this section (e.g., employment gaps, vague dates). Return empty list if none."],
+    "quantification_score": "Integer 0-100 representing how well achievements in this section are quantified",
+    "quantification_feedback": ["Up to 2 specific ways to strengthen this section with metrics or stronger verbs"]
+}
+
+- Use British English spelling and start every list item with a Capital letter.
+- Keep list items short and do not copy the CV text.
+"""
+
+SECTION_PROMPT_TEMPLATE = """
+**Job Listing Text:**
+{job_text}
+
+**CV Section ({kind}):**
+{section_text}
+
+Assess this section and respond with JSON in the output format described above.
+"""
+
+REDUCE_PROMPT = SYSTEM_PROMPT + """
+The CV was too long to read in one go, so each of its sections has already been assessed against the job. You get the job listing, the top of the CV and the section findings; combine them into the final verdict.
+
+## Output Format
+
+Respond with JSON in the following format:
+{
+    "match_score": "Integer between 0 and 100",
+    "match_explanation": "Short explanation of the score (max 2 sentences)",
+    "response_likelihood": "High, Moderate, or Low",
+    "component_scores": {
+        "skills": "Integer 0-100",
+        "experience": "Integer 0-100"
+    },
+    "job_title": "Extracted Job Title",
+    "job_level": "Junior, Mid, Senior, Lead, etc.",
+    "missing_hard_skills": ["Hard skills the job requires that no section evidences"],
+    "missing_soft_skills": ["Soft skills the job requires that no section evidences"],
+    "cultural_fit": "Summary of cultural fit based on values mentioned in the listing (or 'Not mentioned' if none found)",
+    "priority_fixes": ["The Top 3 most critical things to fix FIRST to improve the match score."],
+    "suggested_phrases": [
+        {
+            "context": "Brief context (e.g. 'For the Leadership section')",
+            "suggestion": "Draft text the user can adapt"
+        }
     ]
-    
-    # Get all available models from the API
-    available_models = []
+}
+
+**Important Guidelines:**
+- Use British English spelling.
+- **Capitalization**: Ensure ALL bullet points start with a Capital letter.
+- **Tone**: Professional, constructive, but direct. Don't sugarcoat red flags.
+"""
+
+REDUCE_PROMPT_TEMPLATE = """
+**Job Listing Text:**
+{job_text}
+
+**Top of the CV:**
+{profile}
+
+**Section Findings:**
+{findings}
+
+Combine the findings and respond with JSON in the output format described above.
+"""
+
+# Models are picked per request by routing.ROUTER from the candidates below
+GEMINI_MODEL = "auto"
+CLAUDE_MODEL = "auto"
+
+# Claude models the router chooses between
+CLAUDE_MODELS = os.getenv("CV_MATCHER_CLAUDE_MODELS", "claude-3-haiku-20240307,claude-3-5-sonnet-20240620").split(",")
+
+# Preferred models in order of priority (Flash models first for speed/cost)
+GEMINI_PREFERRED_MODELS = [
+    "gemini-1.5-flash",
+    "gemini-1.5-flash-001",
+    "models/gemini-1.5-flash",
+    "models/gemini-1.5-flash-001",
+    "gemini-1.5-pro",
+    "gemini-1.5-pro-001",
+    "models/gemini-1.5-pro",
+    "models/gemini-1.5-pro-001",
+    "gemini-pro",
+    "models/gemini-pro"
+]
+
+# How long a discovered model list is trusted before list_models() is called again
+MODEL_REFRESH_SECONDS = 3600
+
+# Failing models are skipped until their cool-down passes, per API key so one
+# user's bad key or outage does not close a model for everyone
+MODEL_BREAKER = CircuitBreaker()
+
+def _breaker_key(api_key, model_name):
+    return make_key(api_key), model_name
+
+# Claude errors that move on to the next model instead of failing the request
+ESCALATE_ERRORS = ("not_found", "overloaded")
+
+# Per API key: {"available": [...], "working": name, "refreshed": timestamp}
+_gemini_models = {}
+_gemini_models_lock = threading.Lock()
+
+def _short_model_name(name):
+    return name[len("models/"):] if name.startswith("models/") else name
+
+def _replaying():
+    """True when provider calls are answered from a cassette (no API, no rate limits)."""
+    return CASSETTE is not None and CASSETTE.replaying
+
+def _discover_gemini_models(api_key):
+    """Lists models supporting generateContent, or None if discovery fails."""
+    if _replaying():
+        # Offline: the models that were recorded are the ones available
+        return CASSETTE.models("gemini") or None
     try:
-        for m in genai.list_models():
-            if 'generateContent' in m.supported_generation_methods:
-                available_models.append(m.name)
+        models = _genai().list_models(client=gemini_service(api_key, "model"))
+        return [m.name for m in models if 'generateContent' in m.supported_generation_methods]
     except Exception as e:
-        # If list_models fails, we'll just rely on the preferred list
-        pass
+        print(f"Model discovery failed: {e}")
+        return None
+
+def _remember_working_model(api_key, model_name):
+    with _gemini_models_lock:
+        entry = _gemini_models.setdefault(make_key(api_key), {"available": None, "refreshed": 0})
+        entry["working"] = model_name
+
+def _working_model(api_key):
+    """The last Gemini model that answered for this key, which the router keeps first in its tier."""
+    with _gemini_models_lock:
+        return (_gemini_models.get(make_key(api_key)) or {}).get("working")
+
+def gemini_candidates(api_key):
+    """Ordered Gemini models to try, resolved once per process and refresh interval.
+
+    The last model that worked comes first, names that discovery says do not
+    exist are dropped, and models with an open circuit are skipped.
+    """
+    key = make_key(api_key)
+    with _gemini_models_lock:
+        entry = _gemini_models.get(key)
+        stale = entry is None or time.time() - entry["refreshed"] > MODEL_REFRESH_SECONDS
+
+    if stale:
+        available = _discover_gemini_models(api_key)
+        with _gemini_models_lock:
+            entry = _gemini_models.setdefault(key, {})
+            entry["available"] = available
+            entry["refreshed"] = time.time()
+
+    available = entry.get("available")
+    working = entry.get("working")
 
     candidates = []
+    seen = set()
+
+    def add(name):
+        short = _short_model_name(name)
+        if short not in seen:
+            seen.add(short)
+            candidates.append(name)
+
+    if working:
+        add(working)
+
+    if available:
+        # Only keep preferred names the API actually serves, then any other available model
+        available_short = {_short_model_name(name) for name in available}
+        for pref in GEMINI_PREFERRED_MODELS:
+            if _short_model_name(pref) in available_short:
+                add(pref)
+        for avail in available:
+            add(avail)
+    else:
+        # If list_models fails, we'll just rely on the preferred list
+        for pref in GEMINI_PREFERRED_MODELS:
+            add(pref)
+
+    if _replaying():
+        return candidates
+    allowed = [name for name in candidates if MODEL_BREAKER.allow(_breaker_key(api_key, name))]
+    # If every circuit is open, still try the full list rather than failing outright
+    return allowed or candidates
+
+def result_cache_key(cv_text, job_text, provider, model):
+    """Cache key for an analysis: normalised inputs, provider, model and prompt version."""
+    return make_key(normalise_text(cv_text), normalise_text(job_text), provider, model, PROMPT_VERSION)
+
+# Follow-up requests for fields missing from a truncated / malformed answer
+MAX_REASKS = 1
+
+# Output limits of the sectioned analysis calls, and how many sections are assessed at once
+SECTION_MAX_OUTPUT_TOKENS = 1024
+REDUCE_MAX_OUTPUT_TOKENS = 2048
+SECTION_WORKERS = int(os.getenv("CV_MATCHER_SECTION_WORKERS", "4"))
+
+# Gemini generation settings
+GEMINI_GENERATION_CONFIG = {
+    "temperature": 0.7,
+    "top_p": 1,
+    "top_k": 1,
+    "max_output_tokens": 2048,
+    "response_mime_type": "application/json",
+}
+
+# Lifetime of Gemini explicit prompt caches. Models that refuse one (e.g. the
+# prefix is below their minimum cacheable size) are not asked again until then.
+GEMINI_PROMPT_CACHE_TTL_SECONDS = 3600
+
+# (api key, model, prompt version) -> {"model": GenerativeModel, "expires": timestamp}
+_gemini_prompt_caches = {}
+_gemini_prompt_caches_lock = threading.Lock()
+_gemini_configure_lock = threading.Lock()
+
+# Provider -> accumulated prompt-cache usage
+_prompt_cache_stats = {}
+_prompt_cache_stats_lock = threading.Lock()
+
+def _configure_gemini(api_key):
+    options = {"api_key": api_key}
+    if GEMINI_API_ENDPOINT:
+        options["client_options"] = {"api_endpoint": GEMINI_API_ENDPOINT}
+        options["transport"] = "rest"
+    _genai().configure(**options)
+
+def _create_gemini_prompt_cache(api_key, model_name):
+    """Creates a Gemini cached content holding PROMPT_PREFIX, or None if the model refuses."""
+    # CachedContent only uses the SDK's global client, so configure it under a lock
+    with _gemini_configure_lock:
+        try:
+            _configure_gemini(api_key)
+            return _genai().caching.CachedContent.create(
+                model=model_name,
+                system_instruction=PROMPT_PREFIX,
+                ttl=datetime.timedelta(seconds=GEMINI_PROMPT_CACHE_TTL_SECONDS),
+            )
+        except Exception as e:
+            print(f"Gemini prompt cache unavailable for {model_name}: {e}")
+            return None
+
+def _gemini_model(api_key, model_name):
+    """GenerativeModel whose PROMPT_PREFIX is served from a Gemini cached content if possible.
+
+    Falls back to sending the prefix as the system instruction, which keeps it
+    a stable prefix for the provider's implicit caching. Models are reused
+    until the cache TTL; the key's shared client is attached on every call
+    (see _gemini_generate).
+    """
+    key = make_key(api_key, model_name, PROMPT_VERSION)
+    now = time.time()
+    with _gemini_prompt_caches_lock:
+        entry = _gemini_prompt_caches.get(key)
+    if entry is not None and entry["expires"] > now:
+        return entry["model"]
+
+    genai = _genai()
+    cached_content = _create_gemini_prompt_cache(api_key, model_name)
+    if cached_content is not None:
+        model = genai.GenerativeModel.from_cached_content(cached_content, generation_config=GEMINI_GENERATION_CONFIG)
+    else:
+        model = genai.GenerativeModel(
+            model_name=model_name,
+            generation_config=GEMINI_GENERATION_CONFIG,
+            system_instruction=PROMPT_PREFIX,
+        )
+    # Renew a little before the provider expires the cache
+    with _gemini_prompt_caches_lock:
+        _gemini_prompt_caches[key] = {"model": model, "expires": now + GEMINI_PROMPT_CACHE_TTL_SECONDS - 60}
+    return model
+
+def _claude_system(system=PROMPT_PREFIX):
+    """System blocks for Claude with the static prefix marked for prompt caching."""
+    return [{"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}]
+
+def gemini_usage(usage_metadata):
+    """Token usage of a Gemini response in provider-neutral form."""
+    prompt_tokens = getattr(usage_metadata, "prompt_token_count", 0) or 0
+    cached_tokens = getattr(usage_metadata, "cached_content_token_count", 0) or 0
+    return {
+        "input_tokens": prompt_tokens - cached_tokens,
+        "cached_tokens": cached_tokens,
+        "cache_write_tokens": 0,
+        "output_tokens": getattr(usage_metadata, "candidates_token_count", 0) or 0,
+    }
+
+def claude_usage(usage):
+    """Token usage of a Claude response in provider-neutral form."""
+    return {
+        "input_tokens": getattr(usage, "input_tokens", 0) or 0,
+        "cached_tokens": getattr(usage, "cache_read_input_tokens", 0) or 0,
+        "cache_write_tokens": getattr(usage, "cache_creation_input_tokens", 0) or 0,
+        "output_tokens": getattr(usage, "output_tokens", 0) or 0,
+    }
+
+def _record_usage(provider, usage):
+    with _prompt_cache_stats_lock:
+        totals = _prompt_cache_stats.setdefault(provider, {
+            "requests": 0, "cache_hits": 0, "input_tokens": 0,
+            "cached_tokens": 0, "cache_write_tokens": 0, "output_tokens": 0,
+        })
+        totals["requests"] += 1
+        totals["cache_hits"] += 1 if usage["cached_tokens"] else 0
+        for field in ("input_tokens", "cached_tokens", "cache_write_tokens", "output_tokens"):
+            totals[field] += usage[field]
+    metrics.record_tokens(provider, usage)
+
+def prompt_cache_stats():
+    """Accumulated prompt-cache usage per provider (requests, cache hits, token counts)."""
+    with _prompt_cache_stats_lock:
+        return {provider: dict(totals) for provider, totals in _prompt_cache_stats.items()}
+
+# Static prefix size, counted against the per-minute token budget of every call
+PROMPT_PREFIX_TOKENS = estimate_tokens(PROMPT_PREFIX)
+
+# Every provider call goes through _complete / _stream with a send function
+# doing the actual SDK call, so a cassette (see cassette.py) can record or
+# replay it instead
+
+def _complete(provider, model_name, system, prompt, max_tokens, send):
+    """Runs send() -> (text, usage) and records the usage; returns the text."""
+    if CASSETTE is not None:
+        text, usage = CASSETTE.call(provider, model_name, system, prompt, max_tokens, send)
+    else:
+        text, usage = send()
+    _record_usage(provider, usage)
+    return text
+
+def _stream(provider, model_name, system, prompt, max_tokens, send):
+    """Streaming counterpart of _complete: send() yields text chunks and returns the usage."""
+    if CASSETTE is not None:
+        chunks = CASSETTE.stream(provider, model_name, system, prompt, max_tokens, send)
+    else:
+        chunks = send()
+    usage = yield from chunks
+    _record_usage(provider, usage)
+
+def _gemini_generate(api_key, model, prompt, **kwargs):
+    """model.generate_content through the key's shared client.
+
+    The client is looked up on every call: the SDK would otherwise use its
+    process-wide client configured with whichever key came last, and the
+    registry closes and replaces clients that sat idle.
+    """
+    model._client = gemini_service(api_key, "generative")
+    return model.generate_content(prompt, **kwargs)
+
+def _gemini_send(api_key, model_name, prompt, max_tokens=None, model=None, stream=False):
+    """Send function for a Gemini call (the analysis model unless another one is given)."""
+    # Overrides the model's own output limit for this call only
+    config = {"max_output_tokens": max_tokens} if max_tokens else None
+
+    def retry_slot():
+        _throttle("gemini", api_key, prompt)
+
+    def send():
+        response = with_backoff(lambda: _gemini_generate(api_key, model or _gemini_model(api_key, model_name),
+                                                         prompt, generation_config=config), acquire=retry_slot)
+        return response.text, gemini_usage(response.usage_metadata)
+
+    def send_stream():
+        response = with_backoff(lambda: _gemini_generate(api_key, model or _gemini_model(api_key, model_name),
+                                                         prompt, generation_config=config, stream=True),
+                                acquire=retry_slot)
+        for chunk in response:
+            yield chunk.text
+        return gemini_usage(response.usage_metadata)
+
+    return send_stream if stream else send
+
+def _claude_send(api_key, model_name, prompt, max_tokens, system=PROMPT_PREFIX, stream=False):
+    """Send function for a Claude call."""
+    request = dict(
+        model=model_name,
+        max_tokens=max_tokens,
+        temperature=0.7,
+        system=_claude_system(system),
+        messages=[
+            {"role": "user", "content": prompt}
+        ],
+    )
+
+    def send():
+        message = with_backoff(lambda: anthropic_client(api_key).messages.create(**request),
+                               acquire=lambda: _throttle("claude", api_key, prompt))
+        return message.content[0].text, claude_usage(message.usage)
+
+    def send_stream():
+        # The SDK's own retries (max_retries) already back off on 429 when opening a stream
+        with anthropic_client(api_key).messages.stream(**request) as stream:
+            yield from stream.text_stream
+            return claude_usage(stream.get_final_message().usage)
+
+    return send_stream if stream else send
+
+def _record_attempt(provider, model_name, outcome, seconds):
+    """Records a model attempt in the metrics and, if it succeeded, its latency for the router."""
+    metrics.record_attempt(provider, model_name, outcome, seconds)
+    if outcome == "ok":
+        ROUTER.observe(model_name, seconds)
+
+def claude_candidates(api_key):
+    """Claude models to route between; models with an open circuit are skipped unless all are."""
+    if _replaying():
+        return CLAUDE_MODELS
+    allowed = [name for name in CLAUDE_MODELS if MODEL_BREAKER.allow(_breaker_key(api_key, name))]
+    return allowed or CLAUDE_MODELS
+
+def _throttle(provider, api_key, user_prompt):
+    """Waits for a rate-limit slot for this API key (fair across sessions)."""
+    if _replaying():
+        # Replayed answers cost nothing; offline load tests must not queue behind 15 RPM
+        return
+    with metrics.stage("queue"):
+        throttle(provider, api_key, PROMPT_PREFIX_TOKENS + estimate_tokens(user_prompt))
+
+def _busy_error(error):
+    return {"error": f"The service is busy right now. Please try again in a minute. ({error})"}
+
+def near_duplicate_job(job_text):
+    """Text of the indexed posting this job text is a near-duplicate of, or None.
+
+    Only used to find cached analyses of a repost (same job under another
+    URL or with small edits); the prompt always gets the job text as given.
+    """
+    with metrics.stage("job_dedupe"):
+        job_id, canonical, score = JOB_INDEX.canonical(job_text)
+    duplicate = canonical != job_text
+    metrics.record_job_dedupe(job_id, duplicate, score)
+    return canonical if duplicate else None
+
+def _cache_keys(cv_text, job_text, duplicate, provider, model):
+    """Result cache keys to look up: the inputs' own, then the near-duplicate posting's."""
+    keys = [result_cache_key(cv_text, job_text, provider, model)]
+    if duplicate is not None:
+        keys.append(result_cache_key(cv_text, compact_job(duplicate), provider, model))
+    return keys
+
+def _prepare_inputs(cv_text, job_text, provider, model):
+    """Compacts the inputs and works out the result cache keys (see _cache_keys)."""
+    duplicate = near_duplicate_job(job_text)
+    with metrics.stage("compaction"):
+        cv_text, job_text, compaction = compact_inputs(cv_text, job_text)
+    metrics.annotate(tokens_saved=compaction["tokens_saved"])
+    return cv_text, job_text, _cache_keys(cv_text, job_text, duplicate, provider, model)
+
+def _finish_result(result, cv_text, job_text, cache_keys):
+    """Adds the local keyword analysis, builds the AnalysisResult and caches it packed."""
+    with metrics.stage("keywords"):
+        result = AnalysisResult.from_dict(apply_keyword_analysis(result, cv_text, job_text))
+    RESULT_CACHE.set(cache_keys[0], result.pack())
+    return result
+
+def _cached_result(cache_keys, provider):
+    cached = None
+    for cache_key in cache_keys:
+        cached = RESULT_CACHE.get(cache_key)
+        if cached is None:
+            continue
+        try:
+            cached = AnalysisResult.load(cached)
+            break
+        except (ValueError, TypeError) as e:
+            # Packed with an older layout; analyse again and overwrite it
+            print(f"Ignoring cached result {cache_key[:12]}: {e}")
+            cached = None
+    metrics.record_cache_lookup(provider, cached is not None)
+    return cached
+
+def _parse_result(provider, content, fields=None, schema=RESULT_SCHEMA):
+    """Parses and validates model output against the result schema (or another one).
+
+    Returns (result, missing) with the top-level fields that are absent or
+    invalid; raises ValueError if no JSON object can be recovered at all.
+    """
+    with metrics.stage("json_parse"):
+        try:
+            data, repaired = load_json(content)
+        except ValueError:
+            metrics.record_parse_failure(provider)
+            raise
+        if repaired:
+            metrics.record_repair(provider, "syntax")
+        return validate(data, fields, schema)
+
+def _complete_result(provider, content, reask, schema=RESULT_SCHEMA, required=REQUIRED_FIELDS):
+    """Turns model output into a schema-valid result, re-asking only for what is missing.
+
+    reask(suffix) must send the original prompt with suffix appended and
+    return the response text. Raises ValueError if there is still no match
+    score afterwards; other missing fields are left out.
+    """
+    result, missing = _parse_result(provider, content, schema=schema)
+    for _ in range(MAX_REASKS):
+        if not missing:
+            break
+        print(f"{provider} answer incomplete, asking again for: {', '.join(missing)}")
+        metrics.record_repair(provider, "reask", missing)
+        try:
+            extra, missing = _parse_result(provider, reask(reask_prompt(missing)), fields=missing, schema=schema)
+        except RateLimitTimeout:
+            raise
+        except Exception as e:
+            print(f"Re-ask failed: {e}")
+            break
+        result.update(extra)
     
-    # Add preferred models first
-    for pref in preferred_models:
-        candidates.append(pref)
-        
-    # Add other available models if they aren't already in the list
-    for avail in available_models:
-        if avail not in candidates and "models/" + avail not in candidates:
-            candidates.append(avail)
+    if missing:
+        print(f"{provider} answer still missing: {', '.join(missing)}")
+        if any(field in missing for field in required):
+            raise ValueError(f"Response has no usable {', '.join(f for f in missing if f in required)}")
+    return result
+
+def _valid_fields(fields):
+    """Streamed (field, value) pairs coerced to the schema; invalid ones wait for the final result.
+
+    Keys outside the schema (such as an ats_keywords the model made up; the
+    real one is computed locally) are dropped, so partial results can always
+    be built from what is yielded.
+    """
+    for key, value in fields:
+        if key not in RESULT_SCHEMA:
+            continue
+        checked, missing = validate({key: value}, [key])
+        if not missing:
+            yield key, checked[key]
+
+def _gemini_reask(api_key, model_name, max_tokens, user_prompt):
+    def reask(suffix):
+        prompt = user_prompt + suffix
+        _throttle("gemini", api_key, prompt)
+        return _complete("gemini", model_name, PROMPT_PREFIX, prompt, max_tokens,
+                         _gemini_send(api_key, model_name, prompt, max_tokens))
+    return reask
+
+def _claude_reask(api_key, model_name, max_tokens, user_message):
+    def reask(suffix):
+        content = user_message + suffix
+        _throttle("claude", api_key, content)
+        return _complete("claude", model_name, PROMPT_PREFIX, content, max_tokens,
+                         _claude_send(api_key, model_name, content, max_tokens))
+    return reask
+
+@functools.lru_cache(maxsize=64)
+def _gemini_section_model(key, model_name, system):
+    """GenerativeModel for one section prompt, reused across calls with the same key (hash)."""
+    return _genai().GenerativeModel(
+        model_name=model_name,
+        generation_config=GEMINI_GENERATION_CONFIG,
+        system_instruction=system,
+    )
+
+def _gemini_caller(api_key, model_name):
+    """call(system, prompt, max_tokens) -> response text, for the sectioned analysis."""
+    def call(system, prompt, max_tokens):
+        def send():
+            model = _gemini_section_model(make_key(api_key), model_name, system)
+            return _gemini_send(api_key, model_name, prompt, max_tokens, model=model)()
+
+        _throttle("gemini", api_key, prompt)
+        return _complete("gemini", model_name, system, prompt, max_tokens, send)
+    return call
+
+def _claude_caller(api_key, model_name):
+    """Claude counterpart of _gemini_caller; the system prompt is marked for prompt caching."""
+    def call(system, prompt, max_tokens):
+        _throttle("claude", api_key, prompt)
+        return _complete("claude", model_name, system, prompt, max_tokens,
+                         _claude_send(api_key, model_name, prompt, max_tokens, system))
+    return call
+
+def _sectioned_inputs(cv_text, job_text, provider, model):
+    """(plan, job_text, cache_keys) when the CV is long enough to assess by section, else None.
+
+    The CV is split instead of trimmed to CV_TOKEN_BUDGET; the job text is
+    compacted as usual since every section is assessed against it.
+    """
+    plan = section_chunks(cv_text)
+    if plan is None:
+        return None
+    duplicate = near_duplicate_job(job_text)
+    with metrics.stage("compaction"):
+        job_text = compact_job(job_text)
+    metrics.annotate(sections=len(plan[1]))
+    return plan, job_text, _cache_keys(cv_text, job_text, duplicate, provider, f"{model}/sections")
+
+def _assess_section(provider, call, kind, text, job_text):
+    prompt = SECTION_PROMPT_TEMPLATE.format(job_text=job_text, kind=kind, section_text=text)
+    def ask(suffix=""):
+        return call(SECTION_PROMPT, prompt + suffix, SECTION_MAX_OUTPUT_TOKENS)
+    return _complete_result(provider, ask(), ask, SECTION_SCHEMA, SECTION_REQUIRED_FIELDS)
+
+def _map_sections(provider, call, chunks, job_text):
+    """Assesses the CV section chunks in parallel.
+
+    Returns [(kind, tokens, finding)]; sections that fail are left out
+    unless they all do.
+    """
+    findings = []
+    last_error = None
+    with metrics.stage("section_map"), ThreadPoolExecutor(max_workers=min(len(chunks), SECTION_WORKERS)) as pool:
+        # Each worker keeps the request log and rate-limit client of this request
+        futures = [
+            (kind, text, pool.submit(contextvars.copy_context().run, _assess_section, provider, call, kind, text, job_text))
+            for kind, text in chunks
+        ]
+        for kind, text, future in futures:
+            try:
+                findings.append((kind, estimate_tokens(text), future.result()))
+            except RateLimitTimeout:
+                raise
+            except Exception as e:
+                last_error = e
+                print(f"{provider} assessment of the {kind} section failed: {e}")
+    if not findings:
+        raise last_error
+    if len(findings) < len(chunks):
+        metrics.annotate(sections_failed=len(chunks) - len(findings))
+    return findings
+
+def _reduce_sections(provider, call, profile, findings, job_text):
+    """Merges the section findings and asks for the overall verdict in the result schema."""
+    merged = merge_findings(findings)
+    summary = [
+        {"section": kind, **{k: v for k, v in finding.items() if k != "quantification_feedback"}}
+        for kind, _, finding in findings
+    ]
+    prompt = REDUCE_PROMPT_TEMPLATE.format(job_text=job_text, profile=profile or "(none)", findings=json.dumps(summary, indent=1))
+    def ask(suffix=""):
+        return call(REDUCE_PROMPT, prompt + suffix, REDUCE_MAX_OUTPUT_TOKENS)
+    with metrics.stage("section_reduce"):
+        verdict = _complete_result(provider, ask(), ask, REDUCE_SCHEMA)
+
+    result = {k: v for k, v in verdict.items() if not k.startswith("missing_")}
+    for field in ("hard_skills", "soft_skills"):
+        present = merged[field]
+        evidenced = {skill.lower() for skill in present}
+        missing = [skill for skill in verdict.get(f"missing_{field}", []) if skill.lower() not in evidenced]
+        result[field] = {"present": present, "missing": missing}
+    result["red_flags"] = merged["red_flags"]
+    result["quantification_analysis"] = merged["quantification_analysis"]
+    return result
+
+def _analyze_sections(provider, call, plan, job_text):
+    profile, chunks = plan
+    findings = _map_sections(provider, call, chunks, job_text)
+    return _reduce_sections(provider, call, profile, findings, job_text)
+
+def _section_input_tokens(plan, job_text):
+    """Input size of the largest section call, which the router plans the sectioned analysis for."""
+    return max(estimate_tokens(text) for _, text in plan[1]) + estimate_tokens(job_text)
+
+def analyze_cv_sections(cv_text, api_key, plan, job_text, cache_keys):
+    """Sectioned (map-reduce) variant of analyze_cv for long CVs; see _sectioned_inputs."""
+    cached = _cached_result(cache_keys, "gemini")
+    if cached is not None:
+        return cached
+
+    last_error = None
+    route = ROUTER.plan(gemini_candidates(api_key), _section_input_tokens(plan, job_text), _working_model(api_key))
+    for model_name, _ in route:
+        started = time.perf_counter()
+        try:
+            result = _analyze_sections("gemini", _gemini_caller(api_key, model_name), plan, job_text)
+            _record_attempt("gemini", model_name, "ok", time.perf_counter() - started)
+            MODEL_BREAKER.record_success(_breaker_key(api_key, model_name))
+            _remember_working_model(api_key, model_name)
+            return _finish_result(result, cv_text, job_text, cache_keys)
+        except RateLimitTimeout as e:
+            return _busy_error(e)
+        except Exception as e:
+            last_error = e
+            kind = MODEL_BREAKER.record_failure(_breaker_key(api_key, model_name), e)
+            _record_attempt("gemini", model_name, kind, time.perf_counter() - started)
+            print(f"Model {model_name} failed ({kind}): {e}")
+
+    return {"error": f"All models failed. Please check your API key and Quota. Last error: {str(last_error)}"}
+
+def analyze_cv_claude_sections(cv_text, api_key, plan, job_text, cache_keys):
+    """Sectioned (map-reduce) variant of analyze_cv_claude for long CVs."""
+    cached = _cached_result(cache_keys, "claude")
+    if cached is not None:
+        return cached
+
+    last_error = None
+    for model_name, _ in ROUTER.plan(claude_candidates(api_key), _section_input_tokens(plan, job_text)):
+        started = time.perf_counter()
+        try:
+            result = _analyze_sections("claude", _claude_caller(api_key, model_name), plan, job_text)
+            _record_attempt("claude", model_name, "ok", time.perf_counter() - started)
+            MODEL_BREAKER.record_success(_breaker_key(api_key, model_name))
+            return _finish_result(result, cv_text, job_text, cache_keys)
+        except RateLimitTimeout as e:
+            return _busy_error(e)
+        except ValueError as e:
+            last_error = e
+            _record_attempt("claude", model_name, "invalid", time.perf_counter() - started)
+            print(f"Model {model_name} gave no usable answer: {e}")
+        except Exception as e:
+            kind = MODEL_BREAKER.record_failure(_breaker_key(api_key, model_name), e)
+            _record_attempt("claude", model_name, kind, time.perf_counter() - started)
+            if kind not in ESCALATE_ERRORS:
+                return {"error": f"Claude API Error: {e}"}
+            last_error = e
+            print(f"Model {model_name} failed ({kind}): {e}")
+
+    return {"error": f"Claude API Error: {last_error}"}
+
+def _stream_result(result):
+    """Streaming protocol for a result computed in one go (cached or sectioned)."""
+    if not is_error(result):
+        yield from result.to_dict().items()
+    yield None, result
+
+def analyze_cv(cv_text, job_text, api_key):
+    """Analyzes CV against Job Description using Gemini API."""
+    
+    sectioned = _sectioned_inputs(cv_text, job_text, "gemini", GEMINI_MODEL)
+    if sectioned is not None:
+        return analyze_cv_sections(cv_text, api_key, *sectioned)
+
+    cv_text, job_text, cache_keys = _prepare_inputs(cv_text, job_text, "gemini", GEMINI_MODEL)
+    cached = _cached_result(cache_keys, "gemini")
+    if cached is not None:
+        return cached
+    
+    # The static prefix travels as cached content / system instruction
+    user_prompt = ANALYSIS_PROMPT_TEMPLATE.format(cv_text=cv_text, job_text=job_text)
+
+    # Models in routing order: fast tier for short prompts, escalating when an answer fails
+    route = ROUTER.plan(gemini_candidates(api_key), PROMPT_PREFIX_TOKENS + estimate_tokens(user_prompt),
+                        _working_model(api_key))
             
     last_error = None
     
     # Iterate through candidates and try to generate content
-    for model_name in candidates:
+    for model_name, max_tokens in route:
+        started = None
         try:
-            model = genai.GenerativeModel(model_name=model_name, generation_config=generation_config)
-            response = model.generate_content(full_prompt)
-            return json.loads(response.text)
+            _throttle("gemini", api_key, user_prompt)
+            started = time.perf_counter()
+            text = _complete("gemini", model_name, PROMPT_PREFIX, user_prompt, max_tokens,
+                             _gemini_send(api_key, model_name, user_prompt, max_tokens))
+            result = _complete_result("gemini", text, _gemini_reask(api_key, model_name, max_tokens, user_prompt))
+            _record_attempt("gemini", model_name, "ok", time.perf_counter() - started)
+            MODEL_BREAKER.record_success(_breaker_key(api_key, model_name))
+            _remember_working_model(api_key, model_name)
+            return _finish_result(result, cv_text, job_text, cache_keys)
+        except RateLimitTimeout as e:
+            return _busy_error(e)
         except Exception as e:
             last_error = e
-            print(f"Model {model_name} failed: {e}")
+            kind = MODEL_BREAKER.record_failure(_breaker_key(api_key, model_name), e)
+            if started is not None:
+                _record_attempt("gemini", model_name, kind, time.perf_counter() - started)
+            print(f"Model {model_name} failed ({kind}): {e}")
             continue
             
     return {"error": f"All models failed. Please check your API key and Quota. Last error: {str(last_error)}"}
 
 def analyze_cv_claude(cv_text, job_text, api_key):
-    """Analyzes CV against Job Description using Anthropic Claude API."""
+    """Analyzes CV against Job Description using Anthropic Claude API.
+
+    Starts on the model the router picks and escalates to the next one only
+    when an answer cannot be used or the model is gone or overloaded; other
+    API errors are returned as they are.
+    """
+    
+    sectioned = _sectioned_inputs(cv_text, job_text, "claude", CLAUDE_MODEL)
+    if sectioned is not None:
+        return analyze_cv_claude_sections(cv_text, api_key, *sectioned)
+
+    cv_text, job_text, cache_keys = _prepare_inputs(cv_text, job_text, "claude", CLAUDE_MODEL)
+    cached = _cached_result(cache_keys, "claude")
+    if cached is not None:
+        return cached
     
-    client = anthropic.Anthropic(api_key=api_key)
     user_message = ANALYSIS_PROMPT_TEMPLATE.format(cv_text=cv_text, job_text=job_text)
+    route = ROUTER.plan(claude_candidates(api_key), PROMPT_PREFIX_TOKENS + estimate_tokens(user_message))
     
-    try:
-        message = client.messages.create(
-            model="claude-3-5-sonnet-20240620",
-            max_tokens=4096,
-            temperature=0.7,
-            system=SYSTEM_PROMPT,
-            messages=[
-                {"role": "user", "content": user_message}
-            ]
-        )
-        
-        # Extract JSON from response
-        content = message.content[0].text
-        
-        # Find JSON start/end in case of extra text
-        start = content.find('{')
-        end = content.rfind('}') + 1
-        
-        if start != -1 and end != -1:
-            json_str = content[start:end]
-            return json.loads(json_str)
-        else:
-            # Fallback: try to parse the whole thing if curly braces aren't found (unlikely)
-            return json.loads(content)
+    last_error = None
+    for model_name, max_tokens in route:
+        started = None
+        try:
+            _throttle("claude", api_key, user_message)
+            started = time.perf_counter()
+            text = _complete("claude", model_name, PROMPT_PREFIX, user_message, max_tokens,
+                             _claude_send(api_key, model_name, user_message, max_tokens))
             
-    except Exception as e:
-        return {"error": f"Claude API Error: {e}"}
+            # Extract JSON from response, repairing it or re-asking for missing fields
+            result = _complete_result("claude", text, _claude_reask(api_key, model_name, max_tokens, user_message))
+            _record_attempt("claude", model_name, "ok", time.perf_counter() - started)
+            MODEL_BREAKER.record_success(_breaker_key(api_key, model_name))
+            return _finish_result(result, cv_text, job_text, cache_keys)
+                
+        except RateLimitTimeout as e:
+            return _busy_error(e)
+        except ValueError as e:
+            # No usable answer even after the re-ask: escalate to the next model
+            last_error = e
+            _record_attempt("claude", model_name, "invalid", time.perf_counter() - started)
+            print(f"Model {model_name} gave no usable answer: {e}")
+        except Exception as e:
+            kind = MODEL_BREAKER.record_failure(_breaker_key(api_key, model_name), e)
+            if started is not None:
+                _record_attempt("claude", model_name, kind, time.perf_counter() - started)
+            if kind not in ESCALATE_ERRORS:
+                return {"error": f"Claude API Error: {e}"}
+            last_error = e
+            print(f"Model {model_name} failed ({kind}): {e}")
+
+    return {"error": f"Claude API Error: {last_error}"}
+
+def analyze_cv_stream(cv_text, job_text, api_key):
+    """Streaming variant of analyze_cv.
+
+    Yields (field, value) for each top-level field of the result as soon as
+    it is complete, then (None, result) with the full result or an error.
+    Long CVs take the sectioned analysis, whose fields all arrive at the end.
+    """
+    sectioned = _sectioned_inputs(cv_text, job_text, "gemini", GEMINI_MODEL)
+    if sectioned is not None:
+        yield from _stream_result(analyze_cv_sections(cv_text, api_key, *sectioned))
+        return
+
+    cv_text, job_text, cache_keys = _prepare_inputs(cv_text, job_text, "gemini", GEMINI_MODEL)
+    cached = _cached_result(cache_keys, "gemini")
+    if cached is not None:
+        yield from _stream_result(cached)
+        return
+    
+    user_prompt = ANALYSIS_PROMPT_TEMPLATE.format(cv_text=cv_text, job_text=job_text)
+    route = ROUTER.plan(gemini_candidates(api_key), PROMPT_PREFIX_TOKENS + estimate_tokens(user_prompt),
+                        _working_model(api_key))
+    
+    last_error = None
+    for model_name, max_tokens in route:
+        parser = IncrementalJSONParser()
+        started = None
+        try:
+            _throttle("gemini", api_key, user_prompt)
+            started = time.perf_counter()
+            # Closing this generator (a hedged loser, a client gone) closes the provider's stream
+            with closing(_stream("gemini", model_name, PROMPT_PREFIX, user_prompt, max_tokens,
+                                 _gemini_send(api_key, model_name, user_prompt, max_tokens, stream=True))) as chunks:
+                for text in chunks:
+                    yield from _valid_fields(parser.feed(text))
+            result = _complete_result("gemini", parser.buffer, _gemini_reask(api_key, model_name, max_tokens, user_prompt))
+            _record_attempt("gemini", model_name, "ok", time.perf_counter() - started)
+            MODEL_BREAKER.record_success(_breaker_key(api_key, model_name))
+            _remember_working_model(api_key, model_name)
+            yield None, _finish_result(result, cv_text, job_text, cache_keys)
+            return
+        except RateLimitTimeout as e:
+            yield None, _busy_error(e)
+            return
+        except Exception as e:
+            last_error = e
+            kind = MODEL_BREAKER.record_failure(_breaker_key(api_key, model_name), e)
+            if started is not None:
+                _record_attempt("gemini", model_name, kind, time.perf_counter() - started)
+            print(f"Model {model_name} failed ({kind}): {e}")
+            if parser.fields:
+                # Sections were already shown; switching models now would mix two answers
+                break
+    
+    yield None, {"error": f"All models failed. Please check your API key and Quota. Last error: {str(last_error)}"}
+
+def analyze_cv_claude_stream(cv_text, job_text, api_key):
+    """Streaming variant of analyze_cv_claude (same protocol as analyze_cv_stream)."""
+    sectioned = _sectioned_inputs(cv_text, job_text, "claude", CLAUDE_MODEL)
+    if sectioned is not None:
+        yield from _stream_result(analyze_cv_claude_sections(cv_text, api_key, *sectioned))
+        return
+
+    cv_text, job_text, cache_keys = _prepare_inputs(cv_text, job_text, "claude", CLAUDE_MODEL)
+    cached = _cached_result(cache_keys, "claude")
+    if cached is not None:
+        yield from _stream_result(cached)
+        return
+    
+    user_message = ANALYSIS_PROMPT_TEMPLATE.format(cv_text=cv_text, job_text=job_text)
+    route = ROUTER.plan(claude_candidates(api_key), PROMPT_PREFIX_TOKENS + estimate_tokens(user_message))
+    
+    last_error = None
+    for model_name, max_tokens in route:
+        parser = IncrementalJSONParser()
+        started = None
+        try:
+            _throttle("claude", api_key, user_message)
+            started = time.perf_counter()
+            # Closing this generator (a hedged loser, a client gone) closes the provider's stream
+            with closing(_stream("claude", model_name, PROMPT_PREFIX, user_message, max_tokens,
+                                 _claude_send(api_key, model_name, user_message, max_tokens, stream=True))) as chunks:
+                for text in chunks:
+                    yield from _valid_fields(parser.feed(text))
+            result = _complete_result("claude", parser.buffer, _claude_reask(api_key, model_name, max_tokens, user_message))
+            _record_attempt("claude", model_name, "ok", time.perf_counter() - started)
+            MODEL_BREAKER.record_success(_breaker_key(api_key, model_name))
+        except RateLimitTimeout as e:
+            yield None, _busy_error(e)
+            return
+        except ValueError as e:
+            last_error = e
+            _record_attempt("claude", model_name, "invalid", time.perf_counter() - started)
+            print(f"Model {model_name} gave no usable answer: {e}")
+            if parser.fields:
+                # Sections were already shown; switching models now would mix two answers
+                break
+            continue
+        except Exception as e:
+            kind = MODEL_BREAKER.record_failure(_breaker_key(api_key, model_name), e)
+            if started is not None:
+                _record_attempt("claude", model_name, kind, time.perf_counter() - started)
+            if kind not in ESCALATE_ERRORS or parser.fields:
+                yield None, {"error": f"Claude API Error: {e}"}
+                return
+            last_error = e
+            print(f"Model {model_name} failed ({kind}): {e}")
+            continue
+        
+        yield None, _finish_result(result, cv_text, job_text, cache_keys)
+        return
+
+    yield None, {"error": f"Claude API Error: {last_error}"}
+
+# Provider name -> blocking analysis function
+PROVIDERS = {
+    "gemini": analyze_cv,
+    "claude": analyze_cv_claude,
+}
+
+# Provider name -> streaming analysis generator
+STREAMING_PROVIDERS = {
+    "gemini": analyze_cv_stream,
+    "claude": analyze_cv_claude_stream,
+}
+
+async def extract_pdf_async(uploaded_file):
+    """Async variant of extract_pdf (runs pypdf in a worker thread)."""
+    return await asyncio.to_thread(extract_pdf, uploaded_file)
+
+async def extract_text_from_url_async(url):
+    """Async variant of extract_text_from_url."""
+    return await asyncio.to_thread(extract_text_from_url, url)
+
+async def analyze_cv_async(cv_text, job_text, api_key):
+    """Async variant of analyze_cv."""
+    return await asyncio.to_thread(analyze_cv, cv_text, job_text, api_key)
+
+async def analyze_cv_claude_async(cv_text, job_text, api_key):
+    """Async variant of analyze_cv_claude."""
+    return await asyncio.to_thread(analyze_cv_claude, cv_text, job_text, api_key)
+
+async def _timed(timings, stage, coro):
+    started = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        timings[stage] = time.perf_counter() - started
+
+async def _job_text(job_url, job_text):
+    if job_url:
+        return await extract_text_from_url_async(job_url)
+    return job_text
+
+async def ingest(uploaded_cv, job_url=None, job_text=None, timings=None):
+    """Extracts the CV and fetches the job text concurrently.
+
+    Returns (pdf, job_text); stage timings are recorded into timings if given.
+    """
+    timings = {} if timings is None else timings
+    return await _timed(timings, "ingest", asyncio.gather(
+        _timed(timings, "pdf", extract_pdf_async(uploaded_cv)),
+        _timed(timings, "job", _job_text(job_url, job_text)),
+    ))
+
+async def run_analysis(uploaded_cv, api_key, provider="gemini", job_url=None, job_text=None):
+    """Runs the full pipeline: PDF extraction and job fetch overlap, then the LLM call.
+
+    Returns {"result", "cv_text", "job_text", "pdf", "timings"} where timings
+    holds seconds per stage (pdf, job, ingest, analysis, total).
+    """
+    timings = {}
+    started = time.perf_counter()
+
+    with metrics.request_log(provider=provider, source="url" if job_url else "text") as log:
+        pdf, job_text = await ingest(uploaded_cv, job_url, job_text, timings)
+
+        analyze = analyze_cv_async if provider == "gemini" else analyze_cv_claude_async
+        result = await _timed(timings, "analysis", analyze(pdf["text"], job_text, api_key))
+        if is_error(result):
+            log["error"] = result["error"]
+
+    timings["total"] = time.perf_counter() - started
+    return {
+        "result": result,
+        "cv_text": pdf["text"],
+        "job_text": job_text,
+        "pdf": pdf,
+        "timings": timings,
+    }